@@ -1,11 +1,29 @@
 from django.contrib import admin
-from .models import Attendance
+from .models import Attendance, StudentCourseAttendance, StudentMonthlyAttendance
 
 
 @admin.register(Attendance)
 class AttendanceAdmin(admin.ModelAdmin):
     """考勤管理"""
-    list_display = ['schedule', 'student', 'status', 'check_in_time', 'created_at']
-    list_filter = ['status', 'created_at']
+    list_display = ['schedule', 'student', 'status', 'is_makeup', 'check_in_time', 'created_at']
+    list_filter = ['status', 'is_makeup', 'created_at']
     search_fields = ['student__real_name', 'schedule__course__name']
     list_editable = ['status']
+
+
+@admin.register(StudentCourseAttendance)
+class StudentCourseAttendanceAdmin(admin.ModelAdmin):
+    """学员课程考勤汇总（由考勤自动维护，只读）"""
+    list_display = ['student', 'course', 'present', 'late', 'absent', 'leave',
+                    'current_streak', 'best_streak', 'last_session_at']
+    search_fields = ['student__real_name', 'course__name']
+    readonly_fields = [f.name for f in StudentCourseAttendance._meta.fields]
+
+
+@admin.register(StudentMonthlyAttendance)
+class StudentMonthlyAttendanceAdmin(admin.ModelAdmin):
+    """学员月度考勤汇总（由考勤自动维护，只读）"""
+    list_display = ['student', 'month', 'present', 'late', 'absent', 'leave']
+    list_filter = ['month']
+    search_fields = ['student__real_name']
+    readonly_fields = [f.name for f in StudentMonthlyAttendance._meta.fields]
@@ -0,0 +1,383 @@
+"""
+留存与流失分析
+
+- 同期群留存：学员按首次报名月份（可再按舞种或班型级别分组）归入同期群，
+  统计此后第 N 个月仍有出勤的学员比例，并汇总为各分组的流失曲线；
+- 连续缺勤预警：在读学员在某课程最近连续缺勤（请假不计入也不中断）达到阈值；
+- 教师续报率：学员在已结课课程之后是否再次报名，以及各教师课次的出勤率。
+
+报名、课次、考勤按主键分批读取为 NumPy 整数数组（每批一条 pk > 上批末尾 ORDER BY pk LIMIT 的查询，
+MySQL 驱动的游标会把整个结果集读入内存；状态、月份在读取时编码，考勤直接走游标），
+之后的分组、去重与计数全部用数组运算完成，不在 Python 中逐行循环。
+结果按参数缓存 ANALYTICS_CACHE_TTL 秒，compute_analytics 命令可预先计算写入缓存。
+"""
+
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+
+from apps.attendance.models import Attendance
+from apps.classes.models import ClassSchedule, ClassType, Course, DanceType, Enrollment
+from apps.students.models import Student
+from apps.teachers.models import Teacher
+
+GROUP_BY = ('all', 'dance_type', 'level')
+
+# 状态编码
+ATTENDANCE_CODES = {'present': 1, 'late': 2, 'absent': 3, 'leave': 4}
+ATTENDED_CODES = (1, 2)
+ENROLLMENT_CODES = {'paid': 1, 'refunding': 2, 'refunded': 3}
+LEVEL_CODES = {level: code for code, (level, _) in enumerate(ClassType.LEVEL_CHOICES, start=1)}
+# 曾支付的报名计入同期群；在读报名参与缺勤预警
+PAID_CODES = (1, 2, 3)
+ACTIVE_CODE = 1
+# 同期群编码 = 分组 * MONTH_STRIDE + 月份序号
+MONTH_STRIDE = 100000
+
+
+def month_index(value):
+    """本地时区的月份序号（年 * 12 + 月 - 1）"""
+    value = timezone.localtime(value)
+    return value.year * 12 + value.month - 1
+
+
+def month_label(index):
+    return f'{index // 12}-{index % 12 + 1:02d}'
+
+
+def parse_month(value):
+    """'YYYY-MM' 转月份序号"""
+    year, month = value.split('-')
+    if not 1 <= int(month) <= 12:
+        raise ValueError(value)
+    return int(year) * 12 + int(month) - 1
+
+
+def _pk_batch(queryset, fields, last_pk, chunk_size):
+    """主键大于 last_pk 的下一批 (pk, *fields)，按主键排序（不使用模型的默认排序）"""
+    return queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', *fields)[:chunk_size]
+
+
+def _stream(queryset, fields, converters, chunk_size):
+    """按主键分批读取 values_list，每列经转换函数编码后拼接为数组"""
+    chunks = [[] for _ in fields]
+    last_pk = 0
+    while True:
+        block = list(_pk_batch(queryset, fields, last_pk, chunk_size))
+        if not block:
+            break
+        columns = list(zip(*block))
+        for chunk, values, convert in zip(chunks, columns[1:], converters):
+            chunk.append(convert(values))
+        if len(block) < chunk_size:
+            break
+        last_pk = block[-1][0]
+    return [np.concatenate(chunk) if chunk else np.empty(0, dtype=np.int64) for chunk in chunks]
+
+
+def _stream_ints(queryset, fields, chunk_size):
+    """整数列直接用游标按主键分批读取为二维数组，跳过 ORM 的逐行转换（用于考勤这类大表）"""
+    chunks = []
+    last_pk = 0
+    with connection.cursor() as cursor:
+        while True:
+            sql, params = _pk_batch(queryset, fields, last_pk, chunk_size).query.sql_with_params()
+            cursor.execute(sql, params)
+            block = cursor.fetchall()
+            if not block:
+                break
+            chunks.append(np.array(block, dtype=np.int64)[:, 1:])
+            if len(block) < chunk_size:
+                break
+            last_pk = block[-1][0]
+    rows = np.concatenate(chunks) if chunks else np.empty((0, len(fields)), dtype=np.int64)
+    return [rows[:, index] for index in range(len(fields))]
+
+
+def _ints(values):
+    return np.fromiter((value or 0 for value in values), dtype=np.int64, count=len(values))
+
+
+def _codes(mapping):
+    def convert(values):
+        return np.fromiter((mapping.get(value, 0) for value in values), dtype=np.int8, count=len(values))
+    return convert
+
+
+def _months(values):
+    return np.fromiter((month_index(value) for value in values), dtype=np.int64, count=len(values))
+
+
+def _timestamps(values):
+    return np.fromiter((value.timestamp() for value in values), dtype=np.float64, count=len(values))
+
+
+def _positions(sorted_pks, values):
+    """主键转为数组下标，找不到的为 -1"""
+    positions = np.searchsorted(sorted_pks, values)
+    positions[positions == len(sorted_pks)] = 0
+    found = sorted_pks[positions] == values if len(sorted_pks) else np.zeros(len(values), dtype=bool)
+    return np.where(found, positions, -1)
+
+
+class AnalyticsData:
+    """分析用的列式数据（课程、课次、报名、考勤）"""
+
+    def __init__(self, chunk_size=50000):
+        (self.course_pk, course_dance_type, course_level, self.course_teacher,
+         course_status) = _stream(
+            Course.objects.all(),
+            ('pk', 'class_type__dance_type_id', 'class_type__level', 'teacher_id', 'status'),
+            (_ints, _ints, _codes(LEVEL_CODES), _ints, _codes({'completed': 1, 'enrolling': 2, 'ongoing': 2})),
+            chunk_size,
+        )
+        self.course_group = {'all': np.zeros(len(self.course_pk), dtype=np.int64),
+                             'dance_type': course_dance_type, 'level': course_level.astype(np.int64)}
+        self.course_completed = course_status == 1
+        self.course_active = course_status == 2
+
+        schedule_pk, schedule_course, self.schedule_teacher, self.schedule_month, self.schedule_ts = _stream(
+            ClassSchedule.objects.all(),
+            ('pk', 'course_id', 'teacher_id', 'start_time', 'start_time'),
+            (_ints, _ints, _ints, _months, _timestamps),
+            chunk_size,
+        )
+        self.schedule_pk = schedule_pk
+        self.schedule_course = _positions(self.course_pk, schedule_course)
+
+        student, course, self.enrollment_month, self.enrollment_status = _stream(
+            Enrollment.objects.filter(status__in=ENROLLMENT_CODES),
+            ('student_id', 'course_id', 'enrollment_date', 'status'),
+            (_ints, _ints, _months, _codes(ENROLLMENT_CODES)),
+            chunk_size,
+        )
+        self.enrollment_student = student
+        self.enrollment_course = _positions(self.course_pk, course)
+
+        # 状态在数据库中编码为整数
+        student, schedule, status = _stream_ints(
+            Attendance.objects.annotate(code=Case(
+                *[When(status=status, then=Value(code)) for status, code in ATTENDANCE_CODES.items()],
+                default=Value(0), output_field=IntegerField(),
+            )),
+            ('student_id', 'schedule_id', 'code'),
+            chunk_size,
+        )
+        schedule = _positions(self.schedule_pk, schedule)
+        valid = (schedule >= 0) & (self.schedule_course[schedule] >= 0)
+        self.attendance_student = student[valid]
+        self.attendance_schedule = schedule[valid]
+        self.attendance_status = status[valid].astype(np.int8)
+
+        self.student_stride = int(max(student.max(initial=0), self.enrollment_student.max(initial=0))) + 1
+        self.current_month = month_index(timezone.now())
+
+
+def cohort_retention(data, by='all', max_offset=12, since=None):
+    """
+    同期群留存矩阵
+
+    同期群为 (分组, 首次报名月份)；第 N 个月留存 = 首次报名后第 N 个月在该分组有出勤的学员数 / 同期群人数。
+    """
+    width = max_offset + 1
+    group = data.course_group[by]
+
+    paid = np.isin(data.enrollment_status, PAID_CODES) & (data.enrollment_course >= 0)
+    keys = group[data.enrollment_course[paid]] * data.student_stride + data.enrollment_student[paid]
+    months = data.enrollment_month[paid]
+    # 每个 (分组, 学员) 的首次报名月份
+    order = np.lexsort((months, keys))
+    keys, first = np.unique(keys[order], return_index=True)
+    starts = months[order][first]
+
+    result = {'by': by, 'max_offset': max_offset, 'cohorts': [], 'curves': []}
+    if not len(keys):
+        return result
+
+    attended = np.isin(data.attendance_status, ATTENDED_CODES)
+    schedule = data.attendance_schedule[attended]
+    active_keys = (group[data.schedule_course[schedule]] * data.student_stride
+                   + data.attendance_student[attended])
+    positions = _positions(keys, active_keys)
+    offsets = data.schedule_month[schedule] - starts[positions]
+    valid = (positions >= 0) & (offsets >= 0) & (offsets < width)
+    # 同一学员同一月份多次出勤只计一次
+    active = np.unique(positions[valid] * width + offsets[valid])
+
+    cohort_codes = (keys // data.student_stride) * MONTH_STRIDE + starts
+    cohorts, cohort_of_key = np.unique(cohort_codes, return_inverse=True)
+    sizes = np.bincount(cohort_of_key, minlength=len(cohorts))
+    counts = np.bincount(cohort_of_key[active // width] * width + active % width,
+                         minlength=len(cohorts) * width).reshape(len(cohorts), width)
+    cohort_groups = cohorts // MONTH_STRIDE
+    cohort_starts = cohorts % MONTH_STRIDE
+    # 尚未到达的月份不计入
+    elapsed = np.arange(width)[None, :] <= (data.current_month - cohort_starts)[:, None]
+
+    selected = cohort_starts >= since if since is not None else np.ones(len(cohorts), dtype=bool)
+    labels = _group_labels(by, cohort_groups[selected])
+    for index in np.flatnonzero(selected):
+        months = int(elapsed[index].sum())
+        result['cohorts'].append({
+            'group_id': int(cohort_groups[index]),
+            'group': labels.get(int(cohort_groups[index])),
+            'start_month': month_label(int(cohort_starts[index])),
+            'size': int(sizes[index]),
+            'active': counts[index, :months].tolist(),
+            'retention': np.round(counts[index, :months] / sizes[index], 4).tolist(),
+        })
+
+    # 各分组的流失曲线：按同期群人数加权，只计已到达该月份的同期群
+    groups, group_of_cohort = np.unique(cohort_groups[selected], return_inverse=True)
+    weighted_sizes = sizes[selected][:, None] * elapsed[selected]
+    totals = np.zeros((len(groups), width), dtype=np.int64)
+    actives = np.zeros((len(groups), width), dtype=np.int64)
+    np.add.at(totals, group_of_cohort, weighted_sizes)
+    np.add.at(actives, group_of_cohort, counts[selected] * elapsed[selected])
+    for index, group_id in enumerate(groups):
+        reached = totals[index] > 0
+        result['curves'].append({
+            'group_id': int(group_id),
+            'group': labels.get(int(group_id)),
+            'students': int(totals[index, 0]),
+            'retention': np.round(actives[index][reached] / totals[index][reached], 4).tolist(),
+        })
+    return result
+
+
+def _group_labels(by, group_ids):
+    if by == 'dance_type':
+        return dict(DanceType.objects.filter(pk__in=set(group_ids.tolist())).values_list('pk', 'name'))
+    if by == 'level':
+        names = dict(ClassType.LEVEL_CHOICES)
+        return {code: names[level] for level, code in LEVEL_CODES.items()}
+    return {0: '全部'}
+
+
+def absence_risks(data, threshold=3, limit=200):
+    """在读学员各课程最近的连续缺勤次数达到阈值的名单，按缺勤次数倒序"""
+    active = (data.enrollment_status == ACTIVE_CODE) & (data.enrollment_course >= 0)
+    active &= data.course_active[np.maximum(data.enrollment_course, 0)]
+    active_keys = np.unique(data.enrollment_course[active] * data.student_stride
+                            + data.enrollment_student[active])
+
+    # 只保留在读 (课程, 学员) 的非请假考勤
+    schedule = data.attendance_schedule
+    keys = data.schedule_course[schedule] * data.student_stride + data.attendance_student
+    counted = (data.attendance_status != ATTENDANCE_CODES['leave']) & (_positions(active_keys, keys) >= 0)
+    keys, schedule = keys[counted], schedule[counted]
+    absent = data.attendance_status[counted] == ATTENDANCE_CODES['absent']
+    if not len(keys):
+        return []
+
+    # 按 (课程, 学员, 课次时间次序) 排序：组合为一个整数键只排一次
+    rank = np.empty(len(data.schedule_ts), dtype=np.int64)
+    rank[np.argsort(data.schedule_ts, kind='stable')] = np.arange(len(data.schedule_ts))
+    order = np.argsort(keys * len(rank) + rank[schedule])
+    keys, schedule, absent = keys[order], schedule[order], absent[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+    # 每组末尾往前的连续缺勤数 = 组末位置 - 组内最后一次非缺勤的位置
+    last_attended = np.maximum.accumulate(np.where(absent, -1, np.arange(len(keys))))
+    streaks = ends - np.maximum(last_attended[ends], starts - 1)
+
+    flagged = np.flatnonzero(streaks >= threshold)
+    flagged = flagged[np.argsort(-streaks[flagged], kind='stable')][:limit]
+    flagged_keys = keys[starts[flagged]]
+    students = (flagged_keys % data.student_stride).tolist()
+    courses = data.course_pk[flagged_keys // data.student_stride].tolist()
+    last_sessions = data.schedule_ts[schedule[ends[flagged]]].tolist()
+
+    names = dict(Student.objects.filter(pk__in=students).values_list('pk', 'real_name'))
+    course_names = dict(Course.objects.filter(pk__in=courses).values_list('pk', 'name'))
+    risks = []
+    for student_id, course_id, last_session, absences in zip(students, courses, last_sessions,
+                                                               streaks[flagged].tolist()):
+        risks.append({
+            'student_id': student_id,
+            'student_name': names.get(student_id),
+            'course_id': course_id,
+            'course_name': course_names.get(course_id),
+            'absences': absences,
+            'last_session_at': timezone.localtime(
+                datetime.fromtimestamp(last_session, tz=dt_timezone.utc)).isoformat(),
+        })
+    return risks
+
+
+def teacher_retention(data):
+    """
+    教师续报率与出勤率
+
+    续报率：在该教师已结课课程报名的学员中，此后月份又有报名的比例；
+    出勤率：该教师授课课次的 (出勤 + 迟到) / (出勤 + 迟到 + 缺勤)。
+    """
+    paid = np.isin(data.enrollment_status, PAID_CODES) & (data.enrollment_course >= 0)
+    students = data.enrollment_student[paid]
+    months = data.enrollment_month[paid]
+    latest = np.full(data.student_stride, -1, dtype=np.int64)
+    np.maximum.at(latest, students, months)
+
+    courses = data.enrollment_course[paid]
+    teachers = data.course_teacher[courses]
+    finished = data.course_completed[courses] & (teachers > 0)
+    pair_keys = teachers[finished] * data.student_stride + students[finished]
+    pairs, pair_of_row = np.unique(pair_keys, return_inverse=True)
+    pair_latest = np.full(len(pairs), -1, dtype=np.int64)
+    np.maximum.at(pair_latest, pair_of_row, months[finished])
+    pair_teachers = pairs // data.student_stride
+    renewed = latest[pairs % data.student_stride] > pair_latest
+
+    schedule_teachers = data.schedule_teacher[data.attendance_schedule]
+    attended = np.isin(data.attendance_status, ATTENDED_CODES)
+    absent = data.attendance_status == ATTENDANCE_CODES['absent']
+
+    size = int(max(pair_teachers.max(initial=0), schedule_teachers.max(initial=0))) + 1
+    taught = np.bincount(pair_teachers, minlength=size)
+    renewals = np.bincount(pair_teachers, weights=renewed, minlength=size).astype(np.int64)
+    present = np.bincount(schedule_teachers, weights=attended, minlength=size).astype(np.int64)
+    missed = np.bincount(schedule_teachers, weights=absent, minlength=size).astype(np.int64)
+
+    teacher_ids = np.flatnonzero((taught > 0) | (present + missed > 0))
+    teacher_ids = teacher_ids[teacher_ids > 0]
+    names = dict(Teacher.objects.filter(pk__in=teacher_ids.tolist()).values_list('pk', 'real_name'))
+    result = []
+    for teacher_id in teacher_ids:
+        checked = present[teacher_id] + missed[teacher_id]
+        result.append({
+            'teacher_id': int(teacher_id),
+            'teacher_name': names.get(int(teacher_id)),
+            'students': int(taught[teacher_id]),
+            'renewed': int(renewals[teacher_id]),
+            'renewal_rate': round(float(renewals[teacher_id] / taught[teacher_id]), 4)
+            if taught[teacher_id] else None,
+            'attendance_rate': round(float(present[teacher_id] / checked), 4) if checked else None,
+        })
+    result.sort(key=lambda row: (row['renewal_rate'] is None, -(row['renewal_rate'] or 0)))
+    return result
+
+
+REPORTS = {
+    'retention': cohort_retention,
+    'absence_risks': absence_risks,
+    'teacher_retention': teacher_retention,
+}
+
+
+def _cache_key(report, params):
+    return 'attendance:analytics:' + report + ''.join(f':{key}={value}' for key, value in sorted(params.items()))
+
+
+def get_report(report, data=None, refresh=False, **params):
+    """读取缓存的分析结果，未命中时计算并缓存"""
+    key = _cache_key(report, params)
+    result = None if refresh else cache.get(key)
+    if result is None:
+        result = REPORTS[report](data or AnalyticsData(), **params)
+        cache.set(key, result, settings.ANALYTICS_CACHE_TTL)
+    return result
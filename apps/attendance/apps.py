@@ -5,3 +5,6 @@ class AttendanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.attendance'
     verbose_name = '考勤管理'
+    
+    def ready(self):
+        from apps.attendance import rollups, signals  # noqa: F401
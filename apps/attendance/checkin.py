@@ -0,0 +1,210 @@
+"""
+扫码签到（写后缓冲）
+
+前台签到机扫码时只把 (课次, 学员, 扫码时间) 追加到缓冲区即返回，不访问数据库：
+USE_REDIS 时写入 Redis 列表，多个 worker 共享，由 flush_checkins 命令常驻落库；
+否则写入进程内队列，由进程内的后台线程定时落库（进程退出时未落库的扫码会丢失，
+生产环境应开启 Redis）。
+
+落库时按批取出扫码，内存中合并同一学员的重复扫码（保留最早一次），
+查询校验课次与报名并排除已有考勤记录，bulk_create(ignore_conflicts=True) 写入，
+并发写入撞上 (schedule, student) 唯一约束的由数据库跳过，最后一条UPDATE重算出勤人数。
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from apps.attendance.models import Attendance
+from apps.attendance.recording import refresh_actual_students
+from apps.attendance.signals import attendance_changed
+from apps.classes.models import ClassSchedule, Enrollment
+from apps.classes.seats import SEAT_STATUSES_CANCELLABLE
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = 'attendance:checkin:scans'
+
+
+class MemoryScanBuffer:
+    """进程内扫码缓冲"""
+
+    def __init__(self):
+        self._scans = deque()
+
+    def push(self, scan):
+        self._scans.append(scan)
+
+    def pop_batch(self, size):
+        batch = []
+        while len(batch) < size:
+            try:
+                batch.append(self._scans.popleft())
+            except IndexError:
+                break
+        return batch
+
+    def requeue(self, scans):
+        self._scans.extendleft(reversed(scans))
+
+    def __len__(self):
+        return len(self._scans)
+
+
+class RedisScanBuffer:
+    """Redis 列表扫码缓冲，多进程共享"""
+
+    def __init__(self, key=REDIS_KEY):
+        from django_redis import get_redis_connection
+        self.key = key
+        self.redis = get_redis_connection('default')
+
+    def push(self, scan):
+        self.redis.rpush(self.key, json.dumps(scan))
+
+    def pop_batch(self, size):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.lrange(self.key, 0, size - 1)
+        pipe.ltrim(self.key, size, -1)
+        items, _ = pipe.execute()
+        return [json.loads(item) for item in items]
+
+    def requeue(self, scans):
+        if scans:
+            self.redis.lpush(self.key, *[json.dumps(scan) for scan in reversed(scans)])
+
+    def __len__(self):
+        return self.redis.llen(self.key)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+_flusher = None
+
+
+def get_buffer():
+    """当前进程使用的扫码缓冲"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = RedisScanBuffer() if settings.USE_REDIS else MemoryScanBuffer()
+    return _buffer
+
+
+def record_scan(schedule_id, student_id, scanned_at=None):
+    """记录一次扫码（只写缓冲）"""
+    scanned_at = scanned_at or timezone.now()
+    buffer = get_buffer()
+    buffer.push({'schedule': int(schedule_id), 'student': int(student_id),
+                 'ts': scanned_at.timestamp()})
+    if isinstance(buffer, MemoryScanBuffer):
+        start_flusher()
+
+
+def flush_scans(batch_size=None, buffer=None):
+    """
+    取出一批扫码落库
+
+    返回 (取出扫码数, 新增考勤记录数)；写库失败时扫码放回缓冲并抛出异常。
+    """
+    buffer = buffer or get_buffer()
+    scans = buffer.pop_batch(batch_size or settings.CHECKIN_BATCH_SIZE)
+    if not scans:
+        return 0, 0
+    try:
+        created = _persist(scans)
+    except Exception:
+        buffer.requeue(scans)
+        raise
+    return len(scans), created
+
+
+def _persist(scans):
+    # 重复扫码保留最早一次
+    earliest = {}
+    for scan in scans:
+        key = (scan['schedule'], scan['student'])
+        if key not in earliest or scan['ts'] < earliest[key]:
+            earliest[key] = scan['ts']
+
+    schedules = {
+        pk: (course_id, start_time)
+        for pk, course_id, start_time in ClassSchedule.objects.filter(
+            pk__in={schedule_id for schedule_id, _ in earliest}
+        ).exclude(status='cancelled').values_list('pk', 'course_id', 'start_time')
+    }
+    enrolled = set(
+        Enrollment.objects.filter(
+            course_id__in={course_id for course_id, _ in schedules.values()},
+            student_id__in={student_id for _, student_id in earliest},
+            status__in=SEAT_STATUSES_CANCELLABLE,
+        ).values_list('course_id', 'student_id')
+    )
+
+    late_after = timedelta(minutes=settings.CHECKIN_LATE_MINUTES)
+    objs = []
+    for (schedule_id, student_id), ts in earliest.items():
+        if schedule_id not in schedules:
+            logger.warning(f"扫码签到忽略：课次 {schedule_id} 不存在或已取消")
+            continue
+        course_id, start_time = schedules[schedule_id]
+        if (course_id, student_id) not in enrolled:
+            logger.warning(f"扫码签到忽略：学员 {student_id} 未报名课次 {schedule_id}")
+            continue
+        scanned_at = datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+        objs.append(Attendance(
+            schedule_id=schedule_id, student_id=student_id, check_in_time=scanned_at,
+            status='late' if scanned_at > start_time + late_after else 'present',
+        ))
+    if not objs:
+        return 0
+
+    touched = {obj.schedule_id for obj in objs}
+    with transaction.atomic():
+        existing = set(
+            Attendance.objects.filter(schedule_id__in=touched,
+                                      student_id__in={obj.student_id for obj in objs})
+            .values_list('schedule_id', 'student_id')
+        )
+        objs = [obj for obj in objs if (obj.schedule_id, obj.student_id) not in existing]
+        # 并发落库时仍可能撞上唯一约束，由数据库跳过
+        Attendance.objects.bulk_create(objs, ignore_conflicts=True)
+        pairs = {(obj.schedule_id, obj.student_id) for obj in objs}
+        attendance_changed.send(sender=Attendance, attendance_ids=[
+            pk for pk, schedule_id, student_id in Attendance.objects.filter(
+                schedule_id__in=touched, student_id__in={student_id for _, student_id in pairs}
+            ).values_list('pk', 'schedule_id', 'student_id')
+            if (schedule_id, student_id) in pairs
+        ])
+        refresh_actual_students(touched)
+    return len(objs)
+
+
+def _flush_forever():
+    while True:
+        time.sleep(settings.CHECKIN_FLUSH_INTERVAL)
+        try:
+            while flush_scans()[0]:
+                pass
+        except Exception as e:
+            logger.error(f"扫码签到落库失败: {e}")
+        finally:
+            close_old_connections()
+
+
+def start_flusher():
+    """启动进程内落库线程（仅进程内缓冲需要）"""
+    global _flusher
+    if _flusher is None:
+        with _buffer_lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_forever, name='checkin-flusher', daemon=True)
+                _flusher.start()
@@ -0,0 +1,136 @@
+"""
+补课匹配
+
+学员请假后，为其查找同班型、时间靠近且还有空位的其他课次。
+每个进程缓存一份未来课次的占用索引：一次查询取出所有未来课次及其教室容量、
+课程已报名人数，再用一次分组查询统计各课次的补课人数，按班型分组、按开始时间排序。
+查询时只在内存中按班型二分定位和排序，不再逐个课次统计考勤。
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.attendance.models import Attendance
+from apps.classes.models import ClassSchedule, Enrollment
+
+_lock = threading.Lock()
+_cache = {'index': None, 'built_at': 0.0}
+
+
+class OccupancyIndex:
+    """未来课次占用索引"""
+
+    FIELDS = ('pk', 'course_id', 'course__name', 'course__class_type_id', 'course__class_type__level',
+              'course__class_type__dance_type_id', 'teacher_id', 'teacher__real_name',
+              'classroom__name', 'classroom__capacity', 'course__enrolled_count',
+              'start_time', 'end_time')
+
+    def __init__(self, rows, makeup_counts):
+        self.sessions = {}
+        by_class_type = defaultdict(list)
+        by_level = defaultdict(list)
+        for row in rows:
+            session = dict(zip(self.FIELDS, row))
+            session['free_seats'] = (session['classroom__capacity'] - session['course__enrolled_count']
+                                     - makeup_counts.get(session['pk'], 0))
+            self.sessions[session['pk']] = session
+            by_class_type[session['course__class_type_id']].append(session)
+            by_level[(session['course__class_type__dance_type_id'],
+                      session['course__class_type__level'])].append(session)
+        self.by_class_type = {key: self._sorted(items) for key, items in by_class_type.items()}
+        self.by_level = {key: self._sorted(items) for key, items in by_level.items()}
+
+    @staticmethod
+    def _sorted(items):
+        items.sort(key=lambda session: session['start_time'])
+        return [session['start_time'] for session in items], items
+
+    @classmethod
+    def build(cls, since=None):
+        """加载 since 之后的未取消课次，两次查询"""
+        since = since or timezone.now()
+        schedules = ClassSchedule.objects.filter(start_time__gte=since).exclude(status='cancelled')
+        rows = schedules.values_list(*cls.FIELDS).iterator(chunk_size=5000)
+        makeup_counts = dict(
+            Attendance.objects.filter(is_makeup=True, schedule__start_time__gte=since)
+            .values('schedule_id').annotate(n=Count('id')).values_list('schedule_id', 'n')
+        )
+        return cls(rows, makeup_counts)
+
+    def upcoming(self, group, after):
+        """某分组内 after 之后开始的课次"""
+        if not group:
+            return []
+        starts, items = group
+        return items[bisect_left(starts, after):]
+
+
+def get_index():
+    """获取进程内缓存的占用索引，超过 MAKEUP_INDEX_TTL 秒后重建"""
+    with _lock:
+        if _cache['index'] is None or time.monotonic() - _cache['built_at'] > settings.MAKEUP_INDEX_TTL:
+            _cache['index'] = OccupancyIndex.build()
+            _cache['built_at'] = time.monotonic()
+        return _cache['index']
+
+
+def find_makeup_sessions(student_id, missed, limit=10, index=None):
+    """
+    为学员的缺课课次查找补课候选，按匹配度排序
+
+    同班型优先于同舞种同级别；同一授课教师优先；时间越接近缺课课次越靠前。
+    排除学员本人已报名课程的课次、与其已有课次时间冲突的课次和已满员的课次。
+    """
+    index = index or get_index()
+    missed_class_type = missed.course.class_type
+    now = timezone.now()
+
+    busy = list(
+        ClassSchedule.objects.filter(
+            course__in=Enrollment.objects.filter(student_id=student_id, status__in=['pending', 'paid'])
+            .values('course_id'),
+            start_time__gte=now,
+        ).exclude(status='cancelled').values_list('start_time', 'end_time')
+    )
+    own_courses = set(
+        Enrollment.objects.filter(student_id=student_id).values_list('course_id', flat=True)
+    ) | {missed.course_id}
+
+    candidates = {}
+    groups = (
+        (0, index.by_class_type.get(missed_class_type.pk)),
+        (1, index.by_level.get((missed_class_type.dance_type_id, missed_class_type.level))),
+    )
+    for tier, group in groups:
+        for session in index.upcoming(group, now):
+            if (session['pk'] in candidates or session['free_seats'] <= 0
+                    or session['course_id'] in own_courses):
+                continue
+            if any(start < session['end_time'] and end > session['start_time'] for start, end in busy):
+                continue
+            distance = abs((session['start_time'] - missed.start_time).total_seconds()) / 86400
+            score = (tier, 0 if session['teacher_id'] == missed.teacher_id else 1, round(distance, 2))
+            candidates[session['pk']] = (score, session)
+
+    ranked = sorted(candidates.values(), key=lambda item: item[0])[:limit]
+    return [
+        {
+            'schedule_id': session['pk'],
+            'course_id': session['course_id'],
+            'course_name': session['course__name'],
+            'teacher_name': session['teacher__real_name'],
+            'classroom_name': session['classroom__name'],
+            'start_time': session['start_time'],
+            'end_time': session['end_time'],
+            'free_seats': session['free_seats'],
+            'same_class_type': score[0] == 0,
+            'same_teacher': score[1] == 0,
+        }
+        for score, session in ranked
+    ]
@@ -0,0 +1,153 @@
+"""
+扫码签到压测
+
+模拟多个班级同一时刻开课、签到机并发扫码（含一定比例的重复扫码），
+统计签到接口的应答延迟与持续落库吞吐量，并校验考勤记录与实际出勤人数。
+
+    python manage.py benchmark_checkin --classes 20 --students 25 --concurrency 32
+"""
+
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.attendance.checkin import MemoryScanBuffer, flush_scans, get_buffer
+from apps.attendance.models import Attendance
+from apps.attendance.views import AttendanceViewSet
+from apps.classes.management.commands.benchmark_enrollment import percentile
+from apps.classes.models import ClassRoom, ClassSchedule, ClassType, Course, DanceType, Enrollment
+from apps.students.models import ClassCreditEntry, Student
+from apps.teachers.models import Teacher
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = '扫码签到压测：统计应答延迟与持续落库吞吐量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classes', type=int, default=20, help='同时开课的班级数')
+        parser.add_argument('--students', type=int, default=25, help='每班学员数')
+        parser.add_argument('--duplicates', type=float, default=0.1, help='重复扫码比例')
+        parser.add_argument('--concurrency', type=int, default=32, help='并发扫码线程数')
+        parser.add_argument('--batch-size', type=int, default=500, help='落库批大小')
+        parser.add_argument('--keep', action='store_true', help='保留压测数据')
+
+    def handle(self, *args, **options):
+        tag = f'scan-{uuid.uuid4().hex[:8]}'
+        fixture = self._create_fixture(tag, options['classes'], options['students'])
+        pairs = [(schedule.pk, student.pk) for schedule, students in fixture['classes']
+                 for student in students]
+        scans = pairs + random.sample(pairs, int(len(pairs) * options['duplicates']))
+        random.shuffle(scans)
+
+        buffer = get_buffer()
+        view = AttendanceViewSet.as_view({'post': 'scan'})
+        factory = APIRequestFactory()
+
+        def scan_one(pair):
+            request = factory.post('/api/attendance/scan/', {'schedule': pair[0], 'student': pair[1]},
+                                   format='json')
+            force_authenticate(request, user=fixture['user'])
+            begin = time.perf_counter()
+            response = view(request)
+            return response.status_code, time.perf_counter() - begin
+
+        self.stdout.write(f'开始压测：{options["classes"]} 个班级，{len(scans)} 次扫码'
+                          f'（重复 {len(scans) - len(pairs)}），{options["concurrency"]} 并发')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(scan_one, scans))
+        accepted = time.perf_counter() - started
+
+        # 进程内缓冲由后台落库线程写入，这里只等待；Redis 缓冲由本命令（以及在运行的 flush_checkins）落库
+        schedule_ids = [schedule.pk for schedule, _ in fixture['classes']]
+        in_process = isinstance(buffer, MemoryScanBuffer)
+        deadline = time.perf_counter() + 30
+        while time.perf_counter() < deadline:
+            if not in_process and flush_scans(options['batch_size'], buffer)[0]:
+                continue
+            if not len(buffer) and (Attendance.objects.filter(schedule_id__in=schedule_ids).count()
+                                    >= len(pairs)):
+                break
+            time.sleep(0.01)
+        drained = time.perf_counter() - started
+
+        latencies = sorted(elapsed for _, elapsed in results)
+        self.stdout.write(f'应答：{sum(code == 202 for code, _ in results)}/{len(results)} 成功，'
+                          f'{len(results) / accepted:.0f} 次/秒，'
+                          f'p50 {percentile(latencies, 50) * 1000:.2f}ms，'
+                          f'p99 {percentile(latencies, 99) * 1000:.2f}ms')
+        recorded = Attendance.objects.filter(schedule_id__in=schedule_ids).count()
+        self.stdout.write(f'落库：{len(scans)} 次扫码 → 考勤 {recorded} 条，缓冲清空耗时 {drained:.2f}s，'
+                          f'持续吞吐 {len(scans) / drained:.0f} 次/秒')
+        actual = sum(ClassSchedule.objects.filter(pk__in=schedule_ids)
+                     .values_list('actual_students', flat=True))
+        if recorded == actual == len(pairs):
+            self.stdout.write(self.style.SUCCESS(f'校验通过：考勤 {recorded} 条，无重复，出勤人数一致'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f'校验失败：预期 {len(pairs)}，考勤 {recorded}，出勤人数合计 {actual}'))
+
+        if not options['keep']:
+            self._cleanup(fixture)
+        connection.close()
+
+    def _create_fixture(self, tag, class_count, student_count):
+        user = User.objects.create(username=f'{tag}-kiosk', is_staff=True)
+        teacher = Teacher.objects.create(user=User.objects.create(username=f'{tag}-teacher'),
+                                         teacher_no=tag, real_name=tag, specialty='-',
+                                         join_date=date.today())
+        dance_type = DanceType.objects.create(name=tag)
+        class_type = ClassType.objects.create(name=tag, dance_type=dance_type, level='beginner',
+                                              age_range='-', max_students=student_count)
+        users = User.objects.bulk_create(
+            User(username=f'{tag}-{i}') for i in range(class_count * student_count)
+        )
+        if not users or users[0].pk is None:
+            users = list(User.objects.filter(username__regex=rf'^{tag}-\d+$').order_by('pk'))
+        Student.objects.bulk_create(
+            Student(user=u, student_no=f'{tag[-8:]}{i:06d}', real_name=u.username)
+            for i, u in enumerate(users)
+        )
+        students = list(Student.objects.filter(student_no__startswith=tag[-8:]).order_by('pk'))
+        start_time = timezone.now()
+        classes = []
+        for index in range(class_count):
+            course = Course.objects.create(
+                class_type=class_type, name=f'{tag}-{index}', term=tag, status='ongoing',
+                start_date=date.today(), end_date=date.today() + timedelta(days=90),
+                max_students=student_count, enrolled_count=student_count, teacher=teacher,
+            )
+            room = ClassRoom.objects.create(name=f'{tag}-{index}', capacity=student_count, location='-')
+            schedule = ClassSchedule.objects.create(
+                course=course, session_no=1, classroom=room, teacher=teacher,
+                start_time=start_time, end_time=start_time + timedelta(hours=1),
+            )
+            members = students[index * student_count:(index + 1) * student_count]
+            Enrollment.objects.bulk_create(
+                Enrollment(course=course, student=student, status='paid') for student in members
+            )
+            classes.append((schedule, members))
+        return {'user': user, 'teacher': teacher, 'class_type': class_type, 'classes': classes}
+
+    def _cleanup(self, fixture):
+        courses = [schedule.course for schedule, _ in fixture['classes']]
+        rooms = [schedule.classroom_id for schedule, _ in fixture['classes']]
+        students = [student for _, members in fixture['classes'] for student in members]
+        Enrollment.objects.filter(course__in=courses).delete()
+        ClassSchedule.objects.filter(course__in=courses).delete()
+        ClassCreditEntry.objects.filter(student__in=students).delete()
+        Course.objects.filter(pk__in=[course.pk for course in courses]).delete()
+        ClassRoom.objects.filter(pk__in=rooms).delete()
+        fixture['class_type'].delete()
+        fixture['class_type'].dance_type.delete()
+        fixture['teacher'].delete()
+        User.objects.filter(pk__in=[s.user_id for s in students]
+                            + [fixture['user'].pk, fixture['teacher'].user_id]).delete()
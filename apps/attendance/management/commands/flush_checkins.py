@@ -0,0 +1,45 @@
+"""
+扫码签到落库
+
+从 Redis 签到缓冲中按批取出扫码写入考勤记录（USE_REDIS 开启时使用）。
+未开启 Redis 时扫码由 Web 进程内的后台线程落库，无需运行本命令。
+
+    python manage.py flush_checkins
+    python manage.py flush_checkins --loop --interval 1
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.attendance.checkin import flush_scans, get_buffer
+
+
+class Command(BaseCommand):
+    help = '批量落库扫码签到缓冲'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.CHECKIN_BATCH_SIZE,
+                            help='每批取出的扫码数量')
+        parser.add_argument('--loop', action='store_true', help='常驻循环执行')
+        parser.add_argument('--interval', type=float, default=settings.CHECKIN_FLUSH_INTERVAL,
+                            help='缓冲为空时的等待间隔（秒）')
+
+    def handle(self, *args, **options):
+        buffer = get_buffer()
+        while True:
+            started = time.perf_counter()
+            scans = created = 0
+            while True:
+                popped, inserted = flush_scans(options['batch_size'], buffer)
+                if not popped:
+                    break
+                scans += popped
+                created += inserted
+            if scans or not options['loop']:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'处理扫码 {scans} 条，新增考勤 {created} 条，耗时 {elapsed:.2f}s')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
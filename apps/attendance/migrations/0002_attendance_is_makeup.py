@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='is_makeup',
+            field=models.BooleanField(default=False, help_text='非本课程学员来此课次补课', verbose_name='补课'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_attendance_is_makeup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['-created_at', '-id'], name='attendances_created_965764_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['status', '-created_at'], name='attendances_status_ae7449_idx'),
+        ),
+    ]
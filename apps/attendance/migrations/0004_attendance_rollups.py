@@ -0,0 +1,58 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0005_cursor_pagination_indexes'),
+        ('students', '0003_opening_credit_entries'),
+        ('attendance', '0003_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentMonthlyAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='当月1日', verbose_name='月份')),
+                ('present', models.IntegerField(default=0, verbose_name='出勤')),
+                ('absent', models.IntegerField(default=0, verbose_name='缺勤')),
+                ('leave', models.IntegerField(default=0, verbose_name='请假')),
+                ('late', models.IntegerField(default=0, verbose_name='迟到')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_attendance', to='students.student', verbose_name='学员')),
+            ],
+            options={
+                'verbose_name': '学员月度考勤汇总',
+                'verbose_name_plural': '学员月度考勤汇总',
+                'db_table': 'attendance_monthly_rollups',
+                'ordering': ['-month'],
+                'unique_together': {('student', 'month')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentCourseAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('present', models.IntegerField(default=0, verbose_name='出勤')),
+                ('absent', models.IntegerField(default=0, verbose_name='缺勤')),
+                ('leave', models.IntegerField(default=0, verbose_name='请假')),
+                ('late', models.IntegerField(default=0, verbose_name='迟到')),
+                ('current_streak', models.IntegerField(default=0, verbose_name='当前连续出勤')),
+                ('best_streak', models.IntegerField(default=0, verbose_name='最长连续出勤')),
+                ('last_session_at', models.DateTimeField(blank=True, null=True, verbose_name='最近课次时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='classes.course', verbose_name='课程')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_attendance', to='students.student', verbose_name='学员')),
+            ],
+            options={
+                'verbose_name': '学员课程考勤汇总',
+                'verbose_name_plural': '学员课程考勤汇总',
+                'db_table': 'attendance_course_rollups',
+                'unique_together': {('student', 'course')},
+            },
+        ),
+    ]
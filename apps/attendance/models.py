@@ -1,6 +1,6 @@
 from django.db import models
 from apps.students.models import Student
-from apps.classes.models import ClassSchedule
+from apps.classes.models import ClassSchedule, Course
 
 
 class Attendance(models.Model):
@@ -18,6 +18,7 @@ class Attendance(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, verbose_name='学员')
     status = models.CharField('考勤状态', max_length=20, choices=STATUS_CHOICES)
     check_in_time = models.DateTimeField('签到时间', null=True, blank=True)
+    is_makeup = models.BooleanField('补课', default=False, help_text='非本课程学员来此课次补课')
     notes = models.TextField('备注', null=True, blank=True)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
     updated_at = models.DateTimeField('更新时间', auto_now=True)
@@ -29,6 +30,61 @@ class Attendance(models.Model):
         ordering = ['-created_at']
         unique_together = ['schedule', 'student']
         app_label = 'attendance'
+        indexes = [
+            # 游标分页：ORDER BY created_at DESC, id DESC
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['status', '-created_at']),
+        ]
     
     def __str__(self):
         return f"{self.student.real_name} - {self.schedule} - {self.get_status_display()}"
+
+
+class StudentCourseAttendance(models.Model):
+    """学员课程考勤汇总"""
+    
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='course_attendance',
+                                verbose_name='学员')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+', verbose_name='课程')
+    present = models.IntegerField('出勤', default=0)
+    absent = models.IntegerField('缺勤', default=0)
+    leave = models.IntegerField('请假', default=0)
+    late = models.IntegerField('迟到', default=0)
+    current_streak = models.IntegerField('当前连续出勤', default=0)
+    best_streak = models.IntegerField('最长连续出勤', default=0)
+    last_session_at = models.DateTimeField('最近课次时间', null=True, blank=True)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+    
+    class Meta:
+        verbose_name = '学员课程考勤汇总'
+        verbose_name_plural = verbose_name
+        db_table = 'attendance_course_rollups'
+        unique_together = ['student', 'course']
+        app_label = 'attendance'
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.course_id}"
+
+
+class StudentMonthlyAttendance(models.Model):
+    """学员月度考勤汇总"""
+    
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='monthly_attendance',
+                                verbose_name='学员')
+    month = models.DateField('月份', help_text='当月1日')
+    present = models.IntegerField('出勤', default=0)
+    absent = models.IntegerField('缺勤', default=0)
+    leave = models.IntegerField('请假', default=0)
+    late = models.IntegerField('迟到', default=0)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+    
+    class Meta:
+        verbose_name = '学员月度考勤汇总'
+        verbose_name_plural = verbose_name
+        db_table = 'attendance_monthly_rollups'
+        unique_together = ['student', 'month']
+        ordering = ['-month']
+        app_label = 'attendance'
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.month:%Y-%m}"
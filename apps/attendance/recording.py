@@ -0,0 +1,117 @@
+"""
+课次点名
+
+点名名单一次查询取出：课程的有效报名学员 LEFT JOIN 本课次考勤记录。
+整班考勤一次提交，按 (schedule, student) 唯一约束单条 upsert 写入
+（MySQL 为 INSERT ... ON DUPLICATE KEY UPDATE，PostgreSQL/SQLite 为 ON CONFLICT），
+并在同一事务内回写课次的实际出勤人数 actual_students。
+"""
+
+from django.db import connection, transaction
+from django.db.models import Count, FilteredRelation, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.attendance.models import Attendance
+from apps.attendance.signals import attendance_changed
+from apps.classes.models import ClassSchedule, Enrollment
+from apps.classes.seats import SEAT_STATUSES_CANCELLABLE
+from apps.students.models import Student
+
+# 计入实际出勤人数的考勤状态
+ATTENDED_STATUSES = ('present', 'late')
+
+
+def get_roster(schedule):
+    """课次点名名单：报名学员及其本课次考勤状态（一次查询）"""
+    rows = (
+        Enrollment.objects.filter(course_id=schedule.course_id, status__in=SEAT_STATUSES_CANCELLABLE)
+        .annotate(record=FilteredRelation(
+            'student__attendance', condition=Q(student__attendance__schedule_id=schedule.pk)))
+        .order_by('student__student_no')
+        .values('student_id', 'student__student_no', 'student__real_name', 'status',
+                'record__id', 'record__status', 'record__check_in_time', 'record__notes')
+    )
+    return [
+        {
+            'student_id': row['student_id'],
+            'student_no': row['student__student_no'],
+            'student_name': row['student__real_name'],
+            'enrollment_status': row['status'],
+            'attendance_id': row['record__id'],
+            'status': row['record__status'],
+            'check_in_time': row['record__check_in_time'],
+            'notes': row['record__notes'],
+        }
+        for row in rows
+    ]
+
+
+def upsert_attendance(schedule, records):
+    """
+    整班考勤写入
+
+    records: [{'student_id', 'status', 'is_makeup'(可选), 'notes'(可选)}]
+    非本课程学员需标记 is_makeup；已签到学员重复提交时保留原签到时间，未提交备注时保留原备注。
+    返回更新后的实际出勤人数。
+    """
+    records = {record['student_id']: record for record in records}
+    with transaction.atomic():
+        # 锁定课次行，同一课次的并发提交依次执行，出勤人数与考勤记录一致
+        schedule = ClassSchedule.objects.select_for_update().get(pk=schedule.pk)
+        if schedule.status == 'cancelled':
+            raise ValueError('课次已取消，不能点名')
+
+        enrolled = set(
+            Enrollment.objects.filter(course_id=schedule.course_id, student_id__in=records,
+                                      status__in=SEAT_STATUSES_CANCELLABLE)
+            .values_list('student_id', flat=True)
+        )
+        makeup_ids = {pk for pk in records if pk not in enrolled}
+        invalid = sorted(pk for pk in makeup_ids if not records[pk].get('is_makeup'))
+        if invalid:
+            raise ValueError(f'学员不在本课次名单中: {invalid}')
+        missing = makeup_ids - set(Student.objects.filter(pk__in=makeup_ids).values_list('pk', flat=True))
+        if missing:
+            raise ValueError(f'学员不存在: {sorted(missing)}')
+
+        existing = {
+            student_id: (check_in_time, notes)
+            for student_id, check_in_time, notes in Attendance.objects.filter(
+                schedule=schedule, student_id__in=records
+            ).values_list('student_id', 'check_in_time', 'notes')
+        }
+        now = timezone.now()
+        objs = []
+        for student_id, record in records.items():
+            check_in_time, notes = existing.get(student_id, (None, None))
+            attended = record['status'] in ATTENDED_STATUSES
+            objs.append(Attendance(
+                schedule=schedule, student_id=student_id, status=record['status'],
+                check_in_time=(check_in_time or now) if attended else None,
+                is_makeup=student_id in makeup_ids,
+                notes=record['notes'] if record.get('notes') is not None else notes,
+            ))
+
+        options = {'update_conflicts': True,
+                   'update_fields': ['status', 'check_in_time', 'is_makeup', 'notes', 'updated_at']}
+        if connection.features.supports_update_conflicts_with_target:
+            options['unique_fields'] = ['schedule', 'student']
+        Attendance.objects.bulk_create(objs, **options)
+        attendance_changed.send(sender=Attendance, attendance_ids=list(
+            Attendance.objects.filter(schedule=schedule, student_id__in=records).values_list('pk', flat=True)
+        ))
+
+        refresh_actual_students([schedule.pk])
+        return ClassSchedule.objects.values_list('actual_students', flat=True).get(pk=schedule.pk)
+
+
+def refresh_actual_students(schedule_ids):
+    """按考勤记录重算课次的实际出勤人数（一条UPDATE）"""
+    attended = (
+        Attendance.objects.filter(schedule=OuterRef('pk'), status__in=ATTENDED_STATUSES)
+        .order_by().values('schedule').annotate(total=Count('pk')).values('total')
+    )
+    ClassSchedule.objects.filter(pk__in=list(schedule_ids)).update(
+        actual_students=Coalesce(Subquery(attended), Value(0))
+    )
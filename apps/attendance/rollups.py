@@ -0,0 +1,175 @@
+"""
+考勤汇总
+
+按 (学员, 课程) 和 (学员, 月份) 预先汇总出勤/缺勤/请假/迟到次数，出勤率报表与
+连续出勤查询只读汇总表的一行，不再扫描考勤表关联排课表。
+
+考勤写入后（attendance_changed 信号）只重算受影响的 (学员, 课程) 与 (学员, 月份)：
+取这些键下的考勤行一次汇总，按唯一约束 upsert，键下已无考勤的汇总行删除。
+历史数据由 backfill_attendance_rollups 按学员分块重建。
+
+连续出勤按课次时间顺序计算：出勤、迟到计入，缺勤中断，请假既不计入也不中断。
+"""
+
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.db import connection, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.attendance.models import Attendance, StudentCourseAttendance, StudentMonthlyAttendance
+from apps.attendance.recording import ATTENDED_STATUSES
+from apps.attendance.signals import attendance_changed
+from apps.classes.models import ClassSchedule
+from apps.students.models import Student
+
+COUNTED_STATUSES = ('present', 'absent', 'leave', 'late')
+ROW_FIELDS = ('student_id', 'schedule__course_id', 'schedule__start_time', 'status')
+
+
+def month_of(value):
+    """课次所在月份（本地时区当月1日）"""
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def _month_range(month):
+    """月份对应的 [开始, 结束) 时间"""
+    next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    tz = timezone.get_current_timezone()
+    return (timezone.make_aware(datetime.combine(month, datetime.min.time()), tz),
+            timezone.make_aware(datetime.combine(next_month, datetime.min.time()), tz))
+
+
+def _empty_counts():
+    return dict.fromkeys(COUNTED_STATUSES, 0)
+
+
+def build_rollups(rows):
+    """
+    由考勤行 (student_id, course_id, start_time, status) 汇总
+
+    返回 ({(student_id, course_id): {...计数, 连续出勤}}, {(student_id, month): {...计数}})
+    """
+    by_course = defaultdict(list)
+    by_month = defaultdict(_empty_counts)
+    for student_id, course_id, start_time, status in rows:
+        by_course[(student_id, course_id)].append((start_time, status))
+        by_month[(student_id, month_of(start_time))][status] += 1
+
+    course_rollups = {}
+    for key, sessions in by_course.items():
+        sessions.sort()
+        counts = _empty_counts()
+        streak = best = 0
+        for _, status in sessions:
+            counts[status] += 1
+            if status in ATTENDED_STATUSES:
+                streak += 1
+                best = max(best, streak)
+            elif status == 'absent':
+                streak = 0
+        counts.update(current_streak=streak, best_streak=best, last_session_at=sessions[-1][0])
+        course_rollups[key] = counts
+    return course_rollups, dict(by_month)
+
+
+def _upsert(model, unique_fields, update_fields, objs):
+    if not objs:
+        return
+    options = {'update_conflicts': True, 'update_fields': [*update_fields, 'updated_at']}
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = unique_fields
+    model.objects.bulk_create(objs, batch_size=1000, **options)
+
+
+def save_rollups(course_rollups, month_rollups):
+    """写入汇总（按唯一约束 upsert）"""
+    course_objs = [
+        StudentCourseAttendance(student_id=student_id, course_id=course_id, **values)
+        for (student_id, course_id), values in course_rollups.items()
+    ]
+    month_objs = [
+        StudentMonthlyAttendance(student_id=student_id, month=month, **values)
+        for (student_id, month), values in month_rollups.items()
+    ]
+    _upsert(StudentCourseAttendance, ['student', 'course'],
+            [*COUNTED_STATUSES, 'current_streak', 'best_streak', 'last_session_at'], course_objs)
+    _upsert(StudentMonthlyAttendance, ['student', 'month'], COUNTED_STATUSES, month_objs)
+
+
+def refresh_rollups(course_keys, month_keys):
+    """重算指定的 (学员, 课程) 与 (学员, 月份) 汇总"""
+    course_keys, month_keys = set(course_keys), set(month_keys)
+    course_rollups, month_rollups = {}, {}
+    if course_keys:
+        rows = Attendance.objects.filter(
+            student_id__in={student_id for student_id, _ in course_keys},
+            schedule__course_id__in={course_id for _, course_id in course_keys},
+        ).values_list(*ROW_FIELDS)
+        course_rollups = build_rollups(row for row in rows if (row[0], row[1]) in course_keys)[0]
+    if month_keys:
+        months = {month for _, month in month_keys}
+        start, end = _month_range(min(months))[0], _month_range(max(months))[1]
+        rows = Attendance.objects.filter(
+            student_id__in={student_id for student_id, _ in month_keys},
+            schedule__start_time__gte=start, schedule__start_time__lt=end,
+        ).values_list(*ROW_FIELDS)
+        month_rollups = build_rollups(row for row in rows if (row[0], month_of(row[2])) in month_keys)[1]
+
+    with transaction.atomic():
+        save_rollups(course_rollups, month_rollups)
+        for student_id, course_id in course_keys - set(course_rollups):
+            StudentCourseAttendance.objects.filter(student_id=student_id, course_id=course_id).delete()
+        for student_id, month in month_keys - set(month_rollups):
+            StudentMonthlyAttendance.objects.filter(student_id=student_id, month=month).delete()
+
+
+@receiver(attendance_changed)
+def _on_attendance_changed(sender, attendance_ids, deleted=(), **kwargs):
+    pairs = set(Attendance.objects.filter(pk__in=attendance_ids).values_list('student_id', 'schedule_id'))
+    pairs.update(deleted)
+    schedules = dict(
+        (pk, (course_id, start_time)) for pk, course_id, start_time in ClassSchedule.objects.filter(
+            pk__in={schedule_id for _, schedule_id in pairs}
+        ).values_list('pk', 'course_id', 'start_time')
+    )
+    course_keys, month_keys = set(), set()
+    for student_id, schedule_id in pairs:
+        if schedule_id in schedules:
+            course_id, start_time = schedules[schedule_id]
+            course_keys.add((student_id, course_id))
+            month_keys.add((student_id, month_of(start_time)))
+    refresh_rollups(course_keys, month_keys)
+
+
+def backfill_rollups(chunk_size=500, progress=None):
+    """按学员分块从全部考勤重建汇总表，返回 (学员数, 课程汇总数, 月度汇总数)"""
+    students = course_total = month_total = 0
+    last_student = 0
+    while True:
+        student_ids = list(Student.objects.filter(pk__gt=last_student).order_by('pk')
+                           .values_list('pk', flat=True)[:chunk_size])
+        if not student_ids:
+            break
+        rows = (Attendance.objects.filter(student_id__in=student_ids)
+                .values_list(*ROW_FIELDS).iterator(chunk_size=5000))
+        course_rollups, month_rollups = build_rollups(rows)
+        with transaction.atomic():
+            StudentCourseAttendance.objects.filter(student_id__in=student_ids).delete()
+            StudentMonthlyAttendance.objects.filter(student_id__in=student_ids).delete()
+            save_rollups(course_rollups, month_rollups)
+        students += len(student_ids)
+        course_total += len(course_rollups)
+        month_total += len(month_rollups)
+        last_student = student_ids[-1]
+        if progress:
+            progress(students, course_total, month_total)
+    return students, course_total, month_total
+
+
+def attendance_rate(counts):
+    """出勤率：(出勤 + 迟到) / (出勤 + 迟到 + 缺勤)，请假不计入分母"""
+    attended = counts['present'] + counts['late']
+    total = attended + counts['absent']
+    return round(attended / total, 4) if total else None
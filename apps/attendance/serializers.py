@@ -8,3 +8,11 @@ class AttendanceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Attendance
         fields = '__all__'
+
+
+class RosterEntrySerializer(serializers.Serializer):
+    """整班考勤提交项"""
+    student_id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Attendance.STATUS_CHOICES)
+    is_makeup = serializers.BooleanField(default=False)
+    notes = serializers.CharField(required=False, allow_null=True, allow_blank=True)
@@ -0,0 +1,25 @@
+"""
+考勤信号
+
+attendance_changed 在考勤状态写入（含批量点名、扫码落库）后发送，
+参数 attendance_ids 为变动的考勤记录ID；删除的记录同样会发送，
+并通过 deleted=[(student_id, schedule_id)] 带上已删除记录的学员和课次。
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from apps.attendance.models import Attendance
+
+attendance_changed = Signal()
+
+
+@receiver(post_save, sender=Attendance)
+def _attendance_saved(sender, instance, **kwargs):
+    attendance_changed.send(sender=Attendance, attendance_ids=[instance.pk])
+
+
+@receiver(post_delete, sender=Attendance)
+def _attendance_deleted(sender, instance, **kwargs):
+    attendance_changed.send(sender=Attendance, attendance_ids=[instance.pk],
+                            deleted=[(instance.student_id, instance.schedule_id)])
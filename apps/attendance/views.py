@@ -1,6 +1,16 @@
-from rest_framework import viewsets
-from apps.attendance.models import Attendance
-from .serializers import AttendanceSerializer
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from apps.attendance.analytics import GROUP_BY, get_report, parse_month
+from apps.attendance.checkin import record_scan
+from apps.attendance.makeup import find_makeup_sessions
+from apps.attendance.models import Attendance, StudentCourseAttendance, StudentMonthlyAttendance
+from apps.attendance.recording import get_roster, upsert_attendance
+from apps.attendance.rollups import COUNTED_STATUSES, attendance_rate
+from apps.classes.models import ClassSchedule
+from water_cube_studio.pagination import HybridPagination
+from .serializers import AttendanceSerializer, RosterEntrySerializer
 
 
 class AttendanceViewSet(viewsets.ModelViewSet):
@@ -8,3 +18,130 @@ class AttendanceViewSet(viewsets.ModelViewSet):
     queryset = Attendance.objects.select_related('student', 'schedule').all()
     serializer_class = AttendanceSerializer
     filterset_fields = ['status', 'student', 'schedule']
+    pagination_class = HybridPagination
+    cursor_ordering = ('-created_at', '-id')
+    
+    @action(detail=False, methods=['get'])
+    def makeup(self, request):
+        """补课推荐：?student=学员ID&schedule=缺课课次ID&limit=10"""
+        try:
+            student_id = int(request.query_params.get('student'))
+            missed = ClassSchedule.objects.select_related('course__class_type').get(
+                pk=request.query_params.get('schedule'))
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except (TypeError, ValueError):
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        except ClassSchedule.DoesNotExist:
+            return Response({'error': '课次不存在'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(find_makeup_sessions(student_id, missed, limit=limit))
+    
+    @action(detail=False, methods=['get'])
+    def roster(self, request):
+        """课次点名名单：?schedule=课次ID"""
+        try:
+            schedule = ClassSchedule.objects.get(pk=request.query_params.get('schedule'))
+        except (TypeError, ValueError):
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        except ClassSchedule.DoesNotExist:
+            return Response({'error': '课次不存在'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'schedule': schedule.pk,
+            'actual_students': schedule.actual_students,
+            'students': get_roster(schedule),
+        })
+    
+    @action(detail=False, methods=['post'])
+    def bulk_upsert(self, request):
+        """整班考勤提交：{"schedule": 课次ID, "records": [{"student_id", "status", "notes"}]}"""
+        try:
+            schedule = ClassSchedule.objects.get(pk=request.data.get('schedule'))
+        except (TypeError, ValueError):
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        except ClassSchedule.DoesNotExist:
+            return Response({'error': '课次不存在'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = RosterEntrySerializer(data=request.data.get('records') or [], many=True)
+        serializer.is_valid(raise_exception=True)
+        try:
+            actual = upsert_attendance(schedule, serializer.validated_data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'schedule': schedule.pk,
+            'recorded': len({record['student_id'] for record in serializer.validated_data}),
+            'actual_students': actual,
+        })
+    
+    @action(detail=False, methods=['post'])
+    def scan(self, request):
+        """扫码签到：{"schedule": 课次ID, "student": 学员ID}，写入缓冲后立即返回"""
+        try:
+            record_scan(int(request.data.get('schedule')), int(request.data.get('student')))
+        except (TypeError, ValueError):
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'queued': True}, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=False, methods=['get'])
+    def rates(self, request):
+        """出勤率与连续出勤：?student=学员ID&course=课程ID(可选)&months=12"""
+        try:
+            student_id = int(request.query_params.get('student'))
+            months = min(int(request.query_params.get('months', 12)), 60)
+            course_id = int(request.query_params['course']) if request.query_params.get('course') else None
+        except (TypeError, ValueError):
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        courses = StudentCourseAttendance.objects.filter(student_id=student_id).select_related('course')
+        if course_id is not None:
+            courses = courses.filter(course_id=course_id)
+        monthly = StudentMonthlyAttendance.objects.filter(student_id=student_id).order_by('-month')[:months]
+        return Response({
+            'student': student_id,
+            'courses': [
+                {
+                    'course_id': rollup.course_id,
+                    'course_name': rollup.course.name,
+                    **{name: getattr(rollup, name) for name in COUNTED_STATUSES},
+                    'rate': attendance_rate(vars(rollup)),
+                    'current_streak': rollup.current_streak,
+                    'best_streak': rollup.best_streak,
+                    'last_session_at': rollup.last_session_at,
+                }
+                for rollup in courses
+            ],
+            'monthly': [
+                {
+                    'month': rollup.month.strftime('%Y-%m'),
+                    **{name: getattr(rollup, name) for name in COUNTED_STATUSES},
+                    'rate': attendance_rate(vars(rollup)),
+                }
+                for rollup in monthly
+            ],
+        })
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def retention(self, request):
+        """同期群留存：?by=all|dance_type|level&months=12&since=2025-01"""
+        by = request.query_params.get('by', 'all')
+        try:
+            max_offset = min(int(request.query_params.get('months', 12)), 36)
+            since = request.query_params.get('since')
+            since = parse_month(since) if since else None
+        except ValueError:
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        if by not in GROUP_BY or max_offset < 0:
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_report('retention', by=by, max_offset=max_offset, since=since))
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def absence_risks(self, request):
+        """连续缺勤预警：?threshold=3&limit=200"""
+        try:
+            threshold = max(int(request.query_params.get('threshold', 3)), 1)
+            limit = min(int(request.query_params.get('limit', 200)), 1000)
+        except ValueError:
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_report('absence_risks', threshold=threshold, limit=limit))
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def teacher_retention(self, request):
+        """教师续报率与出勤率"""
+        return Response(get_report('teacher_retention'))
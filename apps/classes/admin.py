@@ -1,5 +1,8 @@
+from django import forms
 from django.contrib import admin
-from .models import DanceType, ClassType, Course, ClassRoom, ClassSchedule, Enrollment
+from .conflicts import describe_conflict, find_conflicts
+from .models import (DanceType, ClassType, Course, ClassRoom, ClassSchedule, Enrollment, SeatHold,
+                     WaitlistEntry)
 
 
 @admin.register(DanceType)
@@ -39,9 +42,34 @@ class ClassRoomAdmin(admin.ModelAdmin):
     search_fields = ['name', 'location']
 
 
+class ClassScheduleAdminForm(forms.ModelForm):
+    """排课表单：保存前检测教室、教师冲突"""
+    
+    class Meta:
+        model = ClassSchedule
+        fields = '__all__'
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        classroom, teacher = cleaned_data.get('classroom'), cleaned_data.get('teacher')
+        start_time, end_time = cleaned_data.get('start_time'), cleaned_data.get('end_time')
+        if not all([classroom, teacher, start_time, end_time]) or cleaned_data.get('status') == 'cancelled':
+            return cleaned_data
+        if start_time >= end_time:
+            raise forms.ValidationError('结束时间必须晚于开始时间')
+        conflicts = find_conflicts([{
+            'id': self.instance.pk, 'classroom_id': classroom.pk, 'teacher_id': teacher.pk,
+            'start_time': start_time, 'end_time': end_time,
+        }])
+        if conflicts:
+            raise forms.ValidationError([describe_conflict(c) for c in conflicts])
+        return cleaned_data
+
+
 @admin.register(ClassSchedule)
 class ClassScheduleAdmin(admin.ModelAdmin):
     """排课管理"""
+    form = ClassScheduleAdminForm
     list_display = ['course', 'session_no', 'classroom', 'teacher', 'start_time', 
                    'status', 'actual_students']
     list_filter = ['status', 'start_time', 'classroom']
@@ -56,3 +84,32 @@ class EnrollmentAdmin(admin.ModelAdmin):
     list_filter = ['status', 'source', 'enrollment_date']
     search_fields = ['student__real_name', 'course__name']
     list_editable = ['status']
+    
+    actions = ['request_refund']
+    
+    def request_refund(self, request, queryset):
+        """为选中的已支付报名申请退款，由 process_refunds 批量提交网关"""
+        from apps.payment.refunds import request_refunds
+        count = request_refunds(list(queryset.values_list('pk', flat=True)), reason='后台申请', user=request.user)
+        self.message_user(request, f'已为 {count} 条已支付报名申请退款')
+    request_refund.short_description = '申请退款（已支付的报名）'
+
+
+@admin.register(SeatHold)
+class SeatHoldAdmin(admin.ModelAdmin):
+    """名额保留管理"""
+    list_display = ['enrollment', 'course', 'payment_record', 'status', 'expires_at', 'created_at']
+    list_filter = ['status', 'expires_at']
+    search_fields = ['enrollment__student__real_name', 'course__name']
+    raw_id_fields = ['enrollment', 'payment_record']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    """候补名单管理"""
+    list_display = ['student', 'course', 'status', 'created_at', 'promoted_at', 'notified_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['student__real_name', 'course__name']
+    raw_id_fields = ['student', 'enrollment']
+    readonly_fields = ['created_at', 'promoted_at', 'notified_at']
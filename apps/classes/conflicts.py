@@ -0,0 +1,162 @@
+"""
+排课冲突检测
+
+从排课表一次性加载时间窗口内的课次，按教室、教师分别建立按开始时间排序的区间数组，
+并附带“前缀最大结束时间”数组。检测一个候选课次时：
+
+    k  = bisect(starts, 候选结束时间)      # 之后的区间开始得太晚，不可能重叠
+    j0 = bisect(prefix_max_end, 候选开始时间)  # 之前的区间结束得太早，不可能重叠
+
+只需检查 [j0, k) 之间的区间，复杂度 O(log n + 冲突数)。候选课次之间的冲突
+按资源排序后一次扫描得出。后台、API 和批量排课共用 find_conflicts。
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import accumulate
+
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.classes.models import ClassSchedule
+
+RESOURCES = ('classroom', 'teacher')
+
+
+class ScheduleConflict(ValueError):
+    """排课冲突"""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__(f'发现 {len(conflicts)} 处排课冲突')
+
+
+def as_interval(obj):
+    """候选课次统一为 (pk, classroom_id, teacher_id, start_time, end_time)"""
+    if isinstance(obj, dict):
+        return (obj.get('id') or obj.get('pk'), obj.get('classroom_id'), obj.get('teacher_id'),
+                obj['start_time'], obj['end_time'])
+    return obj.pk, obj.classroom_id, obj.teacher_id, obj.start_time, obj.end_time
+
+
+class _IntervalArray:
+    """单个资源（教室或教师）的有序区间数组"""
+
+    def __init__(self, intervals):
+        intervals.sort()
+        self.starts = [start for start, _, _ in intervals]
+        self.ends = [end for _, end, _ in intervals]
+        self.ids = [pk for _, _, pk in intervals]
+        self.max_ends = list(accumulate(self.ends, max))
+
+    def overlapping(self, start, end):
+        """与 [start, end) 重叠的课次 (pk, start, end)"""
+        upper = bisect_left(self.starts, end)
+        lower = bisect_right(self.max_ends, start, 0, upper)
+        return [
+            (self.ids[i], self.starts[i], self.ends[i])
+            for i in range(lower, upper) if self.ends[i] > start
+        ]
+
+
+class ScheduleIndex:
+    """排课区间索引（按教室、按教师）"""
+
+    def __init__(self, intervals=()):
+        grouped = {resource: defaultdict(list) for resource in RESOURCES}
+        for pk, classroom_id, teacher_id, start, end in intervals:
+            grouped['classroom'][classroom_id].append((start, end, pk))
+            grouped['teacher'][teacher_id].append((start, end, pk))
+        self._arrays = {
+            resource: {key: _IntervalArray(items) for key, items in by_key.items()}
+            for resource, by_key in grouped.items()
+        }
+
+    @classmethod
+    def from_db(cls, start=None, end=None, exclude_ids=(), queryset=None):
+        """从排课表加载 [start, end) 时间窗口内未取消的课次，一次查询"""
+        queryset = queryset if queryset is not None else ClassSchedule.objects.all()
+        queryset = queryset.exclude(status='cancelled')
+        if start is not None:
+            queryset = queryset.filter(end_time__gt=start)
+        if end is not None:
+            queryset = queryset.filter(start_time__lt=end)
+        if exclude_ids:
+            queryset = queryset.exclude(pk__in=list(exclude_ids))
+        return cls(queryset.values_list('pk', 'classroom_id', 'teacher_id', 'start_time', 'end_time')
+                   .iterator(chunk_size=5000))
+
+    @classmethod
+    def for_candidates(cls, candidates, exclude_ids=(), queryset=None):
+        """按候选课次覆盖的时间窗口和涉及的教室/教师建立索引"""
+        intervals = [as_interval(candidate) for candidate in candidates]
+        if not intervals:
+            return cls()
+        queryset = queryset if queryset is not None else ClassSchedule.objects.all()
+        classroom_ids = {interval[1] for interval in intervals}
+        teacher_ids = {interval[2] for interval in intervals}
+        queryset = queryset.filter(Q(classroom_id__in=classroom_ids) | Q(teacher_id__in=teacher_ids))
+        exclude_ids = set(exclude_ids) | {interval[0] for interval in intervals if interval[0]}
+        return cls.from_db(min(i[3] for i in intervals), max(i[4] for i in intervals),
+                           exclude_ids, queryset)
+
+    def overlapping(self, resource, key, start, end):
+        array = self._arrays[resource].get(key)
+        return array.overlapping(start, end) if array else []
+
+    def find_conflicts(self, candidates):
+        """
+        检测候选课次与已有排课、以及候选课次之间的冲突
+
+        返回冲突列表，每项包含候选序号、资源类型与ID、冲突对象（已有课次ID或另一候选序号）。
+        """
+        intervals = [as_interval(candidate) for candidate in candidates]
+        conflicts = []
+        for index, (_, classroom_id, teacher_id, start, end) in enumerate(intervals):
+            for resource, key in (('classroom', classroom_id), ('teacher', teacher_id)):
+                for pk, other_start, other_end in self.overlapping(resource, key, start, end):
+                    conflicts.append({
+                        'candidate': index, 'resource': resource, 'resource_id': key,
+                        'schedule_id': pk, 'start_time': other_start, 'end_time': other_end,
+                    })
+        conflicts.extend(_candidate_conflicts(intervals))
+        return conflicts
+
+
+def _candidate_conflicts(intervals):
+    """候选课次之间的冲突：按资源分组排序后一次扫描"""
+    conflicts = []
+    for position, resource in ((1, 'classroom'), (2, 'teacher')):
+        grouped = defaultdict(list)
+        for index, interval in enumerate(intervals):
+            grouped[interval[position]].append((interval[3], interval[4], index))
+        for key, items in grouped.items():
+            items.sort()
+            active = []
+            for start, end, index in items:
+                active = [item for item in active if item[1] > start]
+                for other_start, other_end, other_index in active:
+                    conflicts.append({
+                        'candidate': index, 'resource': resource, 'resource_id': key,
+                        'other_candidate': other_index, 'start_time': other_start, 'end_time': other_end,
+                    })
+                active.append((start, end, index))
+    return conflicts
+
+
+def find_conflicts(candidates, exclude_ids=()):
+    """检测候选课次的冲突（按需加载索引）"""
+    candidates = list(candidates)
+    return ScheduleIndex.for_candidates(candidates, exclude_ids).find_conflicts(candidates)
+
+
+def describe_conflict(conflict):
+    """冲突的可读描述"""
+    resource = '教室' if conflict['resource'] == 'classroom' else '教师'
+    start = timezone.localtime(conflict['start_time']).strftime('%Y-%m-%d %H:%M')
+    end = timezone.localtime(conflict['end_time']).strftime('%H:%M')
+    if 'schedule_id' in conflict:
+        target = f"已有排课#{conflict['schedule_id']}"
+    else:
+        target = f"候选课次#{conflict['other_candidate'] + 1}"
+    return f"{resource}#{conflict['resource_id']} 在 {start}-{end} 与{target}冲突"
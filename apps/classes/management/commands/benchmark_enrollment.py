@@ -0,0 +1,114 @@
+"""
+并发报名压测
+
+对同一门课程并发发起大量报名请求，统计吞吐量与延迟分位数，
+并校验最终报名人数没有超过招生名额。
+
+    python manage.py benchmark_enrollment --requests 500 --concurrency 50 --capacity 100
+"""
+
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.classes.models import DanceType, ClassType, Course, Enrollment
+from apps.classes.seats import SeatUnavailable, enroll_student
+from apps.students.models import Student
+from apps.users.models import User
+
+
+def percentile(sorted_values, pct):
+    """取已排序序列的分位数"""
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = '并发报名压测：统计吞吐量、p99延迟并校验不超卖'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='报名请求总数')
+        parser.add_argument('--concurrency', type=int, default=50, help='并发线程数')
+        parser.add_argument('--capacity', type=int, default=100, help='课程招生名额')
+        parser.add_argument('--keep', action='store_true', help='保留压测数据')
+
+    def handle(self, *args, **options):
+        tag = f'bench-{uuid.uuid4().hex[:8]}'
+        course, students = self._create_fixture(tag, options['requests'], options['capacity'])
+        latencies = []
+        results = {'ok': 0, 'rejected': 0}
+
+        def enroll_one(student):
+            course_obj = Course.objects.get(pk=course.pk)
+            begin = time.perf_counter()
+            try:
+                enroll_student(course_obj, student, source='压测')
+                outcome = 'ok'
+            except SeatUnavailable:
+                outcome = 'rejected'
+            finally:
+                connection.close()
+            return outcome, time.perf_counter() - begin
+
+        self.stdout.write(f'开始压测：{len(students)} 个请求，{options["concurrency"]} 并发，'
+                          f'名额 {options["capacity"]}')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for outcome, elapsed in pool.map(enroll_one, students):
+                results[outcome] += 1
+                latencies.append(elapsed)
+        total = time.perf_counter() - started
+
+        course.refresh_from_db()
+        enrolled = Enrollment.objects.filter(course=course).count()
+        latencies.sort()
+        self.stdout.write(f'成功报名: {results["ok"]}，满员拒绝: {results["rejected"]}')
+        self.stdout.write(f'吞吐量: {len(latencies) / total:.1f} 请求/秒，总耗时 {total:.2f}s')
+        self.stdout.write(f'延迟 p50: {percentile(latencies, 50) * 1000:.1f}ms，'
+                          f'p99: {percentile(latencies, 99) * 1000:.1f}ms，'
+                          f'max: {latencies[-1] * 1000:.1f}ms')
+
+        if course.enrolled_count == enrolled <= course.max_students:
+            self.stdout.write(self.style.SUCCESS(
+                f'校验通过：已报名 {enrolled}/{course.max_students}，计数与报名记录一致'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f'校验失败：计数 {course.enrolled_count}，报名记录 {enrolled}，名额 {course.max_students}'))
+
+        if not options['keep']:
+            self._cleanup(course, students)
+
+    def _create_fixture(self, tag, count, capacity):
+        dance_type = DanceType.objects.create(name=tag)
+        class_type = ClassType.objects.create(name=tag, dance_type=dance_type, level='beginner',
+                                              age_range='-', max_students=capacity)
+        course = Course.objects.create(
+            class_type=class_type, name=tag, term=tag, status='enrolling',
+            start_date=date.today(), end_date=date.today() + timedelta(days=90),
+            max_students=capacity,
+        )
+        users = User.objects.bulk_create(
+            User(username=f'{tag}-{i}') for i in range(count)
+        )
+        if not users or users[0].pk is None:
+            users = list(User.objects.filter(username__startswith=f'{tag}-'))
+        Student.objects.bulk_create(
+            Student(user=user, student_no=f'{tag[-8:]}{i:06d}', real_name=user.username)
+            for i, user in enumerate(users)
+        )
+        students = list(Student.objects.filter(user__username__startswith=f'{tag}-'))
+        return course, students
+
+    def _cleanup(self, course, students):
+        class_type = course.class_type
+        Enrollment.objects.filter(course=course).delete()
+        course.delete()
+        class_type.delete()
+        class_type.dance_type.delete()
+        User.objects.filter(pk__in=[s.user_id for s in students]).delete()
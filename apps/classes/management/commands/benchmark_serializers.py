@@ -0,0 +1,93 @@
+"""
+列表序列化压测
+
+对比同一批数据在三种读取方式下每1000行的耗时与内存峰值：
+完整序列化（全部字段）、稀疏字段（?fields=）、values() 快速路径。
+
+    python manage.py benchmark_serializers --model enrollment --rows 5000
+    python manage.py benchmark_serializers --model course --fields id,name,term,teacher_name
+"""
+
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.classes.models import ClassSchedule, Course, Enrollment
+from apps.classes.serializers import ClassScheduleSerializer, CourseSerializer, EnrollmentSerializer
+from apps.students.models import Student
+from apps.students.serializers import StudentSerializer
+from water_cube_studio.fieldsets import flat_lookups, parse_fields, serialize_rows
+
+TARGETS = {
+    'enrollment': (Enrollment.objects.select_related('student', 'course'), EnrollmentSerializer,
+                   'id,status,enrollment_date,course,course_name'),
+    'course': (Course.objects.select_related('class_type', 'teacher'), CourseSerializer,
+               'id,name,term,status,start_date,teacher_name'),
+    'schedule': (ClassSchedule.objects.select_related('course', 'teacher', 'classroom'),
+                 ClassScheduleSerializer, 'id,course_name,start_time,end_time,classroom_name'),
+    'student': (Student.objects.select_related('user', 'user__profile'), StudentSerializer,
+                'id,student_no,real_name,status'),
+}
+
+
+class Command(BaseCommand):
+    help = '列表序列化压测：对比完整序列化、稀疏字段与 values() 快速路径'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(TARGETS), default='enrollment', help='压测的数据类型')
+        parser.add_argument('--rows', type=int, default=1000, help='读取行数上限')
+        parser.add_argument('--fields', help='稀疏字段，逗号分隔（默认按数据类型取常用列）')
+        parser.add_argument('--repeat', type=int, default=3, help='每种方式重复次数，取最快一次')
+
+    def handle(self, *args, **options):
+        queryset, serializer_class, default_fields = TARGETS[options['model']]
+        fields = parse_fields(options['fields'] or default_fields)
+        pks = list(queryset.model.objects.order_by('pk').values_list('pk', flat=True)[:options['rows']])
+        if not pks:
+            raise CommandError('没有可用于压测的数据')
+        queryset = queryset.filter(pk__in=pks)
+        serializer = serializer_class(fields=fields)
+        lookups = flat_lookups(serializer)
+
+        cases = [
+            ('完整序列化', lambda: serializer_class(queryset.all(), many=True).data),
+            ('稀疏字段', lambda: serializer_class(queryset.all(), many=True, fields=fields).data),
+        ]
+        if lookups:
+            columns = {lookup for _, lookup, _ in lookups}
+            cases.append(('values快速路径',
+                          lambda: serialize_rows(serializer, queryset.values(*columns), lookups)))
+        else:
+            self.stdout.write(self.style.WARNING('请求的字段包含非平铺字段，跳过 values() 快速路径'))
+
+        self.stdout.write(f'{options["model"]}：{len(pks)} 行，稀疏字段 {",".join(fields)}')
+        baseline = None
+        for label, run in cases:
+            elapsed, peak = self._measure(run, options['repeat'])
+            per_thousand = elapsed / len(pks) * 1000
+            peak_per_thousand = peak / len(pks) * 1000
+            line = f'{label:<12} {per_thousand * 1000:8.1f}ms/千行  内存峰值 {peak_per_thousand / 1024:8.1f}KB/千行'
+            if baseline:
+                line += (f'  节省CPU {1 - per_thousand / baseline[0]:.0%}'
+                         f'，节省内存 {1 - peak_per_thousand / baseline[1]:.0%}')
+            else:
+                baseline = (per_thousand, peak_per_thousand)
+            self.stdout.write(line)
+
+    @staticmethod
+    def _measure(run, repeat):
+        """返回 (最快一次耗时秒数, 该方式的内存峰值字节数)"""
+        best = None
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return best, peak
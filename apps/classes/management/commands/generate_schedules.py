@@ -0,0 +1,95 @@
+"""
+批量排课
+
+为单门课程或整期课程按每周规律生成全部课次；也可按节假日或教师请假顺延课次。
+
+    python manage.py generate_schedules --course 12 --pattern "0@19:00,3@19:00" --classroom 2
+    python manage.py generate_schedules --term 第3期 --pattern "5@10:00" --classroom 1 \\
+        --holidays 2026-10-01,2026-10-02
+    python manage.py generate_schedules --course 12 --shift-from 2026-10-01 --holidays 2026-10-01
+    python manage.py generate_schedules --teacher 5 --absent 2026-11-03,2026-11-05
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.classes.conflicts import ScheduleConflict, describe_conflict
+from apps.classes.models import ClassRoom, Course
+from apps.classes.scheduling import (generate_term_sessions, parse_dates, parse_weekly_pattern,
+                                     shift_for_teacher_absence, shift_sessions)
+from apps.teachers.models import Teacher
+
+
+class Command(BaseCommand):
+    help = '按每周规律批量生成课次，或按节假日/教师请假顺延课次'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, help='课程ID')
+        parser.add_argument('--term', help='期次，为该期全部课程排课')
+        parser.add_argument('--pattern', help='每周上课规律，如 "0@19:00,3@19:00"（0表示周一）')
+        parser.add_argument('--classroom', type=int, help='教室ID')
+        parser.add_argument('--teacher', type=int, help='教师ID（默认使用课程的授课教师）')
+        parser.add_argument('--holidays', default='', help='节假日，逗号分隔的 YYYY-MM-DD')
+        parser.add_argument('--replace', action='store_true', help='先删除未上课的正常课次再生成')
+        parser.add_argument('--shift-from', help='自该日期起顺延课程课次（避开 --holidays）')
+        parser.add_argument('--absent', default='', help='教师请假日期，配合 --teacher 顺延其课程')
+
+    def handle(self, *args, **options):
+        try:
+            self._handle(options)
+        except ScheduleConflict as e:
+            for conflict in e.conflicts:
+                self.stderr.write(describe_conflict(conflict))
+            raise CommandError(str(e))
+        except ValueError as e:
+            raise CommandError(str(e))
+
+    def _handle(self, options):
+        holidays = parse_dates(options['holidays'])
+        teacher = Teacher.objects.filter(pk=options['teacher']).first() if options['teacher'] else None
+
+        if options['absent']:
+            if teacher is None:
+                raise CommandError('--absent 需要同时指定 --teacher')
+            result = shift_for_teacher_absence(teacher, parse_dates(options['absent']))
+            self.stdout.write(self.style.SUCCESS(
+                f'顺延课程 {len(result)} 门，共调整课次 {sum(result.values())} 个'))
+            return
+
+        courses = self._get_courses(options)
+        if options['shift_from']:
+            from_date = min(parse_dates([options['shift_from']]))
+            with transaction.atomic():
+                shifted = sum(shift_sessions(course, from_date, holidays) for course in courses)
+            self.stdout.write(self.style.SUCCESS(f'共调整课次 {shifted} 个'))
+            return
+
+        if not options['pattern'] or not options['classroom']:
+            raise CommandError('生成课次需要 --pattern 和 --classroom')
+        try:
+            classroom = ClassRoom.objects.get(pk=options['classroom'])
+            pattern = parse_weekly_pattern(options['pattern'])
+            plans = [{'course': course, 'pattern': pattern, 'classroom': classroom, 'teacher': teacher}
+                     for course in courses]
+            sessions = generate_term_sessions(plans, holidays=holidays, replace=options['replace'])
+        except ClassRoom.DoesNotExist:
+            raise CommandError('教室不存在')
+        except ScheduleConflict:
+            raise
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'为 {len(plans)} 门课程生成课次 {len(sessions)} 个'))
+
+    def _get_courses(self, options):
+        queryset = Course.objects.select_related('class_type', 'teacher')
+        if options['course']:
+            queryset = queryset.filter(pk=options['course'])
+        elif options['term']:
+            queryset = queryset.filter(term=options['term']).exclude(status='cancelled')
+        else:
+            raise CommandError('请指定 --course 或 --term')
+        courses = list(queryset)
+        if not courses:
+            raise CommandError('未找到课程')
+        return courses
@@ -0,0 +1,44 @@
+"""
+课程报名人数校正
+
+Course.enrolled_count 是冗余计数，报名在后台被改状态、取消或退款后可能出现偏差。
+本命令按报名记录重新统计并只修正有偏差的课程，可定时执行或使用 --loop 常驻运行。
+
+    python manage.py reconcile_enrollment_counts --dry-run
+    python manage.py reconcile_enrollment_counts --loop --interval 600
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.classes.seats import reconcile_enrolled_counts
+
+
+class Command(BaseCommand):
+    help = '按报名记录校正课程已报名人数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='只报告偏差，不修正')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每条UPDATE修正的课程数')
+        parser.add_argument('--loop', action='store_true', help='常驻循环执行')
+        parser.add_argument('--interval', type=int, default=600, help='循环间隔（秒）')
+        parser.add_argument('--verbose-drift', action='store_true', help='逐条输出偏差明细')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            drifted = reconcile_enrolled_counts(batch_size=options['batch_size'],
+                                                dry_run=options['dry_run'])
+            elapsed = time.perf_counter() - started
+            if options['verbose_drift']:
+                for course_id, count, expected in drifted:
+                    self.stdout.write(f'课程#{course_id}: 计数 {count} → 实际 {expected}')
+            total_drift = sum(abs(count - expected) for _, count, expected in drifted)
+            action = '发现' if options['dry_run'] else '已修正'
+            self.stdout.write(
+                f'{action}偏差课程 {len(drifted)} 门，累计偏差 {total_drift} 人，耗时 {elapsed:.2f}s'
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,40 @@
+"""
+名额保留过期清理
+
+释放超时未支付的名额保留，取消对应的待支付报名并归还课程名额，
+归还的名额随即转给候补名单队首。
+可由 cron / K8s CronJob 定时执行，或使用 --loop 常驻运行。
+
+    python manage.py release_seat_holds --batch-size 1000
+    python manage.py release_seat_holds --loop --interval 60
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.classes.seats import release_expired_holds
+from apps.classes.waitlist import promote_waitlists
+
+
+class Command(BaseCommand):
+    help = '批量释放过期的名额保留'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批处理的保留数量')
+        parser.add_argument('--loop', action='store_true', help='常驻循环执行')
+        parser.add_argument('--interval', type=int, default=60, help='循环间隔（秒）')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            freed = release_expired_holds(batch_size=options['batch_size'])
+            promoted = promote_waitlists(freed)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'释放名额 {sum(freed.values())} 个，涉及课程 {len(freed)} 门，'
+                f'候补转正 {promoted} 人，耗时 {elapsed:.2f}s'
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+"""
+候补转正通知发送
+
+按批次发送候补转正通知邮件，可定时执行或使用 --loop 常驻运行。
+
+    python manage.py send_waitlist_notifications --batch-size 200
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.classes.waitlist import send_promotion_notifications
+
+
+class Command(BaseCommand):
+    help = '批量发送候补转正通知'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='每批发送数量')
+        parser.add_argument('--loop', action='store_true', help='常驻循环执行')
+        parser.add_argument('--interval', type=int, default=30, help='循环间隔（秒）')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = send_promotion_notifications(batch_size=options['batch_size'])
+            self.stdout.write(f'已处理转正通知 {sent} 条')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,58 @@
+"""
+整期课表自动排课
+
+为期次内尚未排课的课程分配每周上课时段和教室，默认只输出方案，--apply 写入排课表。
+
+    python manage.py solve_timetable --term 第3期
+    python manage.py solve_timetable --term 第3期 --apply --holidays 2026-10-01,2026-10-02
+    python manage.py solve_timetable --term 第3期 --max-nodes 5000000 --time-limit 600
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.classes.conflicts import ScheduleConflict, describe_conflict
+from apps.classes.scheduling import parse_dates
+from apps.classes.timetable import solve_term
+
+WEEKDAY_NAMES = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+
+
+class Command(BaseCommand):
+    help = '为期次自动求解课表（教室、时段），可选写入排课表'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--term', required=True, help='期次')
+        parser.add_argument('--apply', action='store_true', help='把求解结果写入排课表')
+        parser.add_argument('--holidays', default='', help='节假日，逗号分隔的 YYYY-MM-DD')
+        parser.add_argument('--max-nodes', type=int, default=200000, help='搜索节点上限')
+        parser.add_argument('--time-limit', type=float, help='求解时长上限（秒），默认不限')
+
+    def handle(self, *args, **options):
+        def progress(placed, total, nodes):
+            self.stdout.write(f'  搜索节点 {nodes}，已排课节 {placed}/{total}')
+
+        try:
+            result = solve_term(options['term'], holidays=parse_dates(options['holidays']),
+                                apply=options['apply'], max_nodes=options['max_nodes'],
+                                time_limit=options['time_limit'], progress=progress)
+        except ScheduleConflict as e:
+            for conflict in e.conflicts:
+                self.stderr.write(describe_conflict(conflict))
+            raise CommandError(str(e))
+
+        for item in result['assignments']:
+            slots = '、'.join(f"{WEEKDAY_NAMES[p['weekday']]} {p['start']}" for p in item['pattern'])
+            self.stdout.write(f"{item['course_name']}: 教室#{item['classroom_id']} {slots}")
+        for course_id, reason in result['unassigned'].items():
+            self.stdout.write(self.style.WARNING(f'课程#{course_id} 未排课：{reason}'))
+
+        stats = result['stats']
+        if stats['infeasible']:
+            self.stdout.write(self.style.WARNING(f"无法全部排上：{stats['infeasible']}"))
+        elif stats['timed_out']:
+            self.stdout.write(self.style.WARNING('达到求解时长上限，输出已找到的最优方案'))
+        self.stdout.write(self.style.SUCCESS(
+            f"课程 {stats['courses']} 门，课节 {stats['placed']}/{stats['meetings']}，"
+            f"搜索节点 {stats['nodes']}，回溯 {stats['backtracks']}，耗时 {stats['elapsed']}s"
+            + (f"，写入课次 {result['created']} 个" if options['apply'] else '')
+        ))
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0001_initial'),
+        ('classes', '0002_enrollment_amount_enrollment_payment_record_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('active', '保留中'), ('confirmed', '已确认'), ('released', '已释放')], default='active', max_length=20, verbose_name='状态')),
+                ('expires_at', models.DateTimeField(verbose_name='过期时间')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to='classes.course', verbose_name='课程')),
+                ('enrollment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='seat_hold', to='classes.enrollment', verbose_name='报名记录')),
+                ('payment_record', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='payment.paymentrecord', verbose_name='支付记录')),
+            ],
+            options={
+                'verbose_name': '名额保留',
+                'verbose_name_plural': '名额保留',
+                'db_table': 'seat_holds',
+                'ordering': ['expires_at'],
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='seat_holds_status_713635_idx')],
+            },
+        ),
+    ]
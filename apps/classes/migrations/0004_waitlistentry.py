@@ -0,0 +1,36 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0001_initial'),
+        ('classes', '0003_seathold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('waiting', '候补中'), ('promoted', '已转正'), ('cancelled', '已取消')], default='waiting', max_length=20, verbose_name='状态')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='加入时间')),
+                ('promoted_at', models.DateTimeField(blank=True, null=True, verbose_name='转正时间')),
+                ('notified_at', models.DateTimeField(blank=True, null=True, verbose_name='通知时间')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='classes.course', verbose_name='课程')),
+                ('enrollment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='classes.enrollment', verbose_name='转正报名')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='students.student', verbose_name='学员')),
+            ],
+            options={
+                'verbose_name': '候补名单',
+                'verbose_name_plural': '候补名单',
+                'db_table': 'waitlist_entries',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['course', 'status', 'id'], name='waitlist_en_course__734cf2_idx'), models.Index(fields=['status', 'notified_at'], name='waitlist_en_status_83b4e2_idx')],
+                'unique_together': {('course', 'student')},
+            },
+        ),
+    ]
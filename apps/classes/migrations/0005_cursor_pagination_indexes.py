@@ -0,0 +1,21 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0004_waitlistentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['-enrollment_date', '-id'], name='enrollments_enrollm_f30702_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['status', '-enrollment_date'], name='enrollments_status_2c2693_idx'),
+        ),
+    ]
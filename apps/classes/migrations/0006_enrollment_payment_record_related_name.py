@@ -0,0 +1,20 @@
+# Generated by Django 4.2.9 on 2026-10-18 15:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0006_refund_requests'),
+        ('classes', '0005_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='enrollment',
+            name='payment_record',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='payment.paymentrecord', verbose_name='支付记录'),
+        ),
+    ]
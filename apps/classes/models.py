@@ -166,7 +166,8 @@ class Enrollment(models.Model):
     price_policy = models.ForeignKey('finance.PricePolicy', on_delete=models.SET_NULL, 
                                     null=True, blank=True, verbose_name='价格策略')
     amount = models.DecimalField('应付金额', max_digits=10, decimal_places=2, default=0)
-    payment_record = models.ForeignKey('payment.PaymentRecord', on_delete=models.SET_NULL,
+    # 当前订单；支付记录到报名的关联（含重新下单前的旧订单）为 PaymentRecord.enrollment
+    payment_record = models.ForeignKey('payment.PaymentRecord', on_delete=models.SET_NULL, related_name='+',
                                       null=True, blank=True, verbose_name='支付记录')
     notes = models.TextField('备注', null=True, blank=True)
     
@@ -180,6 +181,9 @@ class Enrollment(models.Model):
         indexes = [
             models.Index(fields=['student', 'status']),
             models.Index(fields=['course', 'status']),
+            # 游标分页：ORDER BY enrollment_date DESC, id DESC
+            models.Index(fields=['-enrollment_date', '-id']),
+            models.Index(fields=['status', '-enrollment_date']),
         ]
     
     def __str__(self):
@@ -190,3 +194,73 @@ class Enrollment(models.Model):
         if self.status == 'paid':
             return None
         return f"/api/payment/create/?enrollment_id={self.pk}"
+
+
+class SeatHold(models.Model):
+    """名额保留（待支付期间的限时占位）"""
+    
+    STATUS_CHOICES = (
+        ('active', '保留中'),
+        ('confirmed', '已确认'),
+        ('released', '已释放'),
+    )
+    
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='seat_holds',
+                              verbose_name='课程')
+    enrollment = models.OneToOneField(Enrollment, on_delete=models.CASCADE, related_name='seat_hold',
+                                     verbose_name='报名记录')
+    payment_record = models.ForeignKey('payment.PaymentRecord', on_delete=models.SET_NULL,
+                                      null=True, blank=True, verbose_name='支付记录')
+    status = models.CharField('状态', max_length=20, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField('过期时间')
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+    
+    class Meta:
+        verbose_name = '名额保留'
+        verbose_name_plural = verbose_name
+        db_table = 'seat_holds'
+        ordering = ['expires_at']
+        app_label = 'classes'
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.enrollment} 保留至 {self.expires_at:%Y-%m-%d %H:%M}"
+
+
+class WaitlistEntry(models.Model):
+    """候补名单"""
+    
+    STATUS_CHOICES = (
+        ('waiting', '候补中'),
+        ('promoted', '已转正'),
+        ('cancelled', '已取消'),
+    )
+    
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='waitlist',
+                              verbose_name='课程')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, verbose_name='学员')
+    status = models.CharField('状态', max_length=20, choices=STATUS_CHOICES, default='waiting')
+    enrollment = models.OneToOneField(Enrollment, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='waitlist_entry', verbose_name='转正报名')
+    created_at = models.DateTimeField('加入时间', auto_now_add=True)
+    promoted_at = models.DateTimeField('转正时间', null=True, blank=True)
+    notified_at = models.DateTimeField('通知时间', null=True, blank=True)
+    
+    class Meta:
+        verbose_name = '候补名单'
+        verbose_name_plural = verbose_name
+        db_table = 'waitlist_entries'
+        ordering = ['id']
+        unique_together = ['course', 'student']
+        app_label = 'classes'
+        indexes = [
+            # 队首查询：WHERE course_id=? AND status='waiting' ORDER BY id LIMIT 1
+            models.Index(fields=['course', 'status', 'id']),
+            models.Index(fields=['status', 'notified_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.student.real_name} 候补 {self.course.name}"
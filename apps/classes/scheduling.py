@@ -0,0 +1,224 @@
+"""
+批量排课
+
+按每周上课规律（星期几 + 开始时间）、教室、教师和节假日列表，为课程一次性生成
+全部 total_sessions 个课次，单个事务内 bulk_create 写入；整期多门课程同样只写一次。
+遇到节假日或教师请假时，shift_sessions 把受影响日期之后尚未上课的课次顺延到后续上课时段，
+一次 bulk_update 完成，顺延后的时段同样检测教室/教师冲突。
+
+每周规律格式：[(weekday, 'HH:MM'), ...]，weekday 0 表示周一；
+字符串形式 '0@19:00,3@18:30' 可由 parse_weekly_pattern 解析。
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.classes.conflicts import ScheduleConflict, find_conflicts
+from apps.classes.models import ClassSchedule, Course
+
+
+def parse_weekly_pattern(value):
+    """解析每周上课规律，支持 '0@19:00,3@18:30' 字符串或 [(0, '19:00')] / [{'weekday': 0, 'start': '19:00'}]"""
+    if isinstance(value, str):
+        value = [item.split('@') for item in value.split(',') if item.strip()]
+    pattern = []
+    for item in value:
+        if isinstance(item, dict):
+            weekday, start = item['weekday'], item['start']
+        else:
+            weekday, start = item
+        weekday = int(weekday)
+        if not 0 <= weekday <= 6:
+            raise ValueError(f'星期取值应为0-6：{weekday}')
+        pattern.append((weekday, datetime.strptime(str(start).strip(), '%H:%M').time()))
+    if not pattern:
+        raise ValueError('每周上课规律不能为空')
+    return sorted(set(pattern))
+
+
+def parse_dates(values):
+    """解析日期列表，支持 'YYYY-MM-DD,YYYY-MM-DD' 字符串或列表"""
+    if not values:
+        return set()
+    if isinstance(values, str):
+        values = values.split(',')
+    return {
+        value if hasattr(value, 'weekday') else datetime.strptime(str(value).strip(), '%Y-%m-%d').date()
+        for value in values if str(value).strip()
+    }
+
+
+def iter_slots(start_date, pattern, skip_dates=()):
+    """从 start_date 起按每周规律依次产出上课开始时间（带时区），跳过 skip_dates"""
+    tz = timezone.get_current_timezone()
+    day = start_date
+    while True:
+        if day not in skip_dates:
+            for weekday, start in pattern:
+                if weekday == day.weekday():
+                    yield timezone.make_aware(datetime.combine(day, start), tz)
+        day += timedelta(days=1)
+
+
+def build_sessions(course, pattern, classroom, teacher=None, holidays=(), start_date=None,
+                   first_session_no=1, count=None, skip_session_nos=()):
+    """生成课程的课次对象（未保存），skip_session_nos 中的课次号不生成、不占用上课时段"""
+    teacher = teacher or course.teacher
+    if teacher is None:
+        raise ValueError(f'课程「{course.name}」未指定授课教师')
+    duration = timedelta(minutes=course.class_type.duration_minutes)
+    count = course.total_sessions - first_session_no + 1 if count is None else count
+    slots = iter_slots(start_date or course.start_date, pattern, set(holidays))
+    sessions = []
+    for session_no in range(first_session_no, first_session_no + count):
+        if session_no in skip_session_nos:
+            continue
+        start_time = next(slots)
+        sessions.append(ClassSchedule(
+            course=course, session_no=session_no, classroom=classroom, teacher=teacher,
+            start_time=start_time, end_time=start_time + duration,
+        ))
+    return sessions
+
+
+def _regeneration_starts(courses, replaced):
+    """
+    replace 时各课程的重新生成起点 {course_id: (起始课次号, 起始日期, 保留的课次号)}
+
+    从被删除的第一个课次的课次号和日期开始生成；已上课、已调课的课次保留，其课次号不再生成。
+    没有可删除课次的课程接着已有的最大课次号、自今天起往后排。
+    """
+    tz = timezone.get_current_timezone()
+    first = {}
+    for course_id, session_no, start_time in replaced.order_by('session_no', 'start_time').values_list(
+            'course_id', 'session_no', 'start_time'):
+        first.setdefault(course_id, (session_no, start_time.astimezone(tz).date()))
+    kept = defaultdict(set)
+    for course_id, session_no in (ClassSchedule.objects.filter(course__in=courses).exclude(status='cancelled')
+                                  .exclude(pk__in=replaced.values('pk')).values_list('course_id', 'session_no')):
+        kept[course_id].add(session_no)
+    starts = {}
+    for course in courses:
+        if course.pk in first:
+            session_no, start_date = first[course.pk]
+        elif kept[course.pk]:
+            session_no, start_date = max(kept[course.pk]) + 1, max(course.start_date, timezone.localdate())
+        else:
+            continue
+        starts[course.pk] = (session_no, start_date, kept[course.pk])
+    return starts
+
+
+def generate_term_sessions(plans, holidays=(), replace=False, check_conflicts=True):
+    """
+    为多门课程批量生成课次，单个事务内一次 bulk_create
+
+    plans: [{'course': Course, 'pattern': [...], 'classroom': ClassRoom, 'teacher': Teacher|None}]
+    replace: 为True时先删除这些课程尚未上课的正常课次，从被删除的第一个课次起按新规律重新生成
+    check_conflicts: 写入前检测教室/教师冲突，有冲突时抛出 ScheduleConflict
+    返回已创建的课次列表。
+    """
+    holidays = set(holidays)
+    courses = [plan['course'] for plan in plans]
+    with transaction.atomic():
+        replaced = ClassSchedule.objects.filter(
+            course__in=courses, status='scheduled', start_time__gte=timezone.now(),
+        )
+        starts = _regeneration_starts(courses, replaced) if replace else {}
+        sessions = []
+        for plan in plans:
+            course = plan['course']
+            first_session_no, start_date, kept = starts.get(course.pk, (1, None, ()))
+            if first_session_no > course.total_sessions:
+                continue
+            sessions.extend(build_sessions(course, plan['pattern'], plan['classroom'], plan.get('teacher'),
+                                           holidays, start_date=start_date, first_session_no=first_session_no,
+                                           skip_session_nos=kept))
+        if check_conflicts:
+            exclude_ids = set(replaced.values_list('pk', flat=True)) if replace else ()
+            conflicts = find_conflicts(sessions, exclude_ids)
+            if conflicts:
+                raise ScheduleConflict(conflicts)
+        if replace:
+            replaced.delete()
+        return ClassSchedule.objects.bulk_create(sessions, batch_size=1000)
+
+
+def generate_sessions(course, pattern, classroom, teacher=None, holidays=(), replace=False,
+                      check_conflicts=True):
+    """为单门课程批量生成全部课次"""
+    plan = {'course': course, 'pattern': pattern, 'classroom': classroom, 'teacher': teacher}
+    return generate_term_sessions([plan], holidays=holidays, replace=replace,
+                                  check_conflicts=check_conflicts)
+
+
+def infer_pattern(sessions):
+    """从已有课次推断每周上课规律"""
+    tz = timezone.get_current_timezone()
+    return sorted({
+        (session.start_time.astimezone(tz).weekday(), session.start_time.astimezone(tz).time())
+        for session in sessions
+    })
+
+
+def shift_sessions(course, from_date, blocked_dates=(), pattern=None, check_conflicts=True):
+    """
+    顺延课程自 from_date 起尚未上课的课次
+
+    只调整开始时间未到的正常课次，已上课（可能已有考勤）和已调课的课次不动；
+    受影响的课次依次挪到 from_date 之后、避开 blocked_dates 和已调课课次时段的下一个上课时段，
+    上课规律默认沿用课程已有课次；时间有变化的课次标记为已调课。
+    from_date 早于今天时抛出 ValueError。
+    check_conflicts: 写入前检测新时段的教室/教师冲突，有冲突时抛出 ScheduleConflict，课次不做调整。
+    返回被调整的课次数。
+    """
+    if from_date < timezone.localdate():
+        raise ValueError(f'顺延起始日期不能早于今天：{from_date}')
+    now = timezone.now()
+    with transaction.atomic():
+        sessions = list(
+            ClassSchedule.objects.select_for_update()
+            .filter(course=course, status='scheduled', start_time__date__gte=from_date, start_time__gte=now)
+            .order_by('start_time')
+        )
+        if not sessions:
+            return 0
+        pattern = pattern or infer_pattern(sessions)
+        occupied = set(ClassSchedule.objects.filter(course=course, status='rescheduled', start_time__gte=now)
+                       .values_list('start_time', flat=True))
+        slots = (slot for slot in iter_slots(from_date, pattern, set(blocked_dates))
+                 if slot >= now and slot not in occupied)
+        changed = []
+        for session in sessions:
+            start_time = next(slots)
+            if start_time != session.start_time:
+                duration = session.end_time - session.start_time
+                session.start_time, session.end_time = start_time, start_time + duration
+                session.status = 'rescheduled'
+                changed.append(session)
+        if check_conflicts:
+            conflicts = find_conflicts(changed, exclude_ids=[session.pk for session in sessions])
+            if conflicts:
+                raise ScheduleConflict(conflicts)
+        ClassSchedule.objects.bulk_update(changed, ['start_time', 'end_time', 'status'], batch_size=1000)
+    return len(changed)
+
+
+def shift_for_teacher_absence(teacher, dates):
+    """教师请假：顺延其在这些日期上课的所有课程，返回 {course_id: 调整课次数}（日期早于今天时抛出 ValueError）"""
+    dates = set(dates)
+    if not dates:
+        return {}
+    course_ids = set(
+        ClassSchedule.objects.filter(teacher=teacher, start_time__date__in=dates)
+        .exclude(status='cancelled')
+        .values_list('course_id', flat=True)
+    )
+    result = {}
+    with transaction.atomic():
+        for course in Course.objects.filter(pk__in=course_ids):
+            result[course.pk] = shift_sessions(course, min(dates), blocked_dates=dates)
+    return result
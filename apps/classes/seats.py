@@ -0,0 +1,268 @@
+"""
+课程名额预留引擎
+
+名额的占用与释放全部通过带条件的原子 UPDATE 完成：
+
+    UPDATE courses SET enrolled_count = enrolled_count + 1
+    WHERE id = %s AND enrolled_count + 1 <= max_students
+
+不再先读 is_full 再写回整行，避免并发报名时的丢失更新和超卖；
+条件 UPDATE 放在事务最后一步执行，课程行锁只持有到提交为止。
+
+待支付的报名通过 SeatHold 限时占位，过期后由清理任务按批次集中释放，
+避免被放弃的订单长期占用热门课程的名额。
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from apps.classes.models import Course, Enrollment, SeatHold
+
+
+# 占用名额的报名状态
+SEAT_STATUSES = ('pending', 'paid', 'refunding')
+
+# 可取消（取消后归还名额）的报名状态
+SEAT_STATUSES_CANCELLABLE = ('pending', 'paid')
+
+
+class SeatUnavailable(Exception):
+    """名额不可用（已满员、未开放报名或重复报名）"""
+
+
+def reserve_seat(course_id, seats=1):
+    """原子占用名额，成功返回True"""
+    updated = Course.objects.filter(
+        pk=course_id,
+        is_open_enrollment=True,
+        enrolled_count__lte=F('max_students') - seats,
+    ).update(enrolled_count=F('enrolled_count') + seats)
+    return updated == 1
+
+
+def release_seat(course_id, seats=1):
+    """原子释放名额，计数不会被减到0以下"""
+    return Course.objects.filter(pk=course_id).update(
+        enrolled_count=Greatest(F('enrolled_count') - seats, 0)
+    )
+
+
+def release_seats_bulk(seat_counts):
+    """按课程批量释放名额，seat_counts 为 {course_id: 释放数量}，一条UPDATE完成"""
+    if not seat_counts:
+        return 0
+    delta = Case(
+        *[When(pk=course_id, then=Value(count)) for course_id, count in seat_counts.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return Course.objects.filter(pk__in=list(seat_counts)).update(
+        enrolled_count=Greatest(F('enrolled_count') - delta, 0)
+    )
+
+
+def hold_expiry(ttl_minutes=None):
+    """计算名额保留的过期时间"""
+    if ttl_minutes is None:
+        ttl_minutes = settings.SEAT_HOLD_TTL_MINUTES
+    return timezone.now() + timedelta(minutes=ttl_minutes)
+
+
+def _reactivate_enrollment(course, student, fields):
+    """
+    重新启用学员在该课程已取消的报名（如名额保留过期），字段按新报名重置
+
+    报名未取消时抛出 SeatUnavailable（重复报名）。需在调用方的事务内执行。
+    """
+    enrollment = Enrollment.objects.select_for_update().filter(student=student, course=course).first()
+    if enrollment is None or enrollment.status != 'cancelled':
+        raise SeatUnavailable('该学员已报名此课程')
+    for field in Enrollment._meta.concrete_fields:
+        if field.name not in ('id', 'student', 'course', 'enrollment_date'):
+            setattr(enrollment, field.attname, field.get_default())
+    for name, value in fields.items():
+        setattr(enrollment, name, value)
+    enrollment.enrollment_date = timezone.now()
+    enrollment.save()
+    return enrollment
+
+
+def enroll_student(course, student, **fields):
+    """
+    为学员报名课程并占用名额
+
+    先插入报名记录，再以条件UPDATE占用名额，两者在同一事务内；
+    学员在该课程已有取消的报名（名额保留过期、取消报名）时沿用原报名记录重新报名。
+    名额不足或重复报名时整体回滚并抛出 SeatUnavailable。
+    待支付的报名同时创建（或重新启用）限时的名额保留。
+    """
+    if course.is_full:
+        raise SeatUnavailable('该课程已满员')
+    if not course.is_open_enrollment:
+        raise SeatUnavailable('该课程暂未开放报名')
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                enrollment = Enrollment.objects.create(student=student, course=course, **fields)
+        except IntegrityError:
+            enrollment = _reactivate_enrollment(course, student, fields)
+        if enrollment.status == 'pending':
+            SeatHold.objects.update_or_create(
+                enrollment=enrollment,
+                defaults={'course_id': course.pk, 'payment_record': None, 'status': 'active',
+                          'expires_at': hold_expiry()},
+            )
+        if not reserve_seat(course.pk):
+            raise SeatUnavailable('该课程已满员')
+    return enrollment
+
+
+def place_hold(enrollment, payment_record=None, ttl_minutes=None):
+    """
+    为待支付报名创建或续期名额保留，并关联支付记录
+
+    若保留已过期导致报名被取消，则重新占用名额，名额不足时抛出 SeatUnavailable。
+    """
+    with transaction.atomic():
+        if enrollment.status == 'cancelled':
+            if not reserve_seat(enrollment.course_id):
+                raise SeatUnavailable('该课程已满员')
+            Enrollment.objects.filter(pk=enrollment.pk).update(status='pending')
+            enrollment.status = 'pending'
+        hold, _ = SeatHold.objects.update_or_create(
+            enrollment=enrollment,
+            defaults={
+                'course_id': enrollment.course_id,
+                'payment_record': payment_record,
+                'status': 'active',
+                'expires_at': hold_expiry(ttl_minutes),
+            },
+        )
+    return hold
+
+
+def confirm_hold(enrollment):
+    """支付成功后确认名额保留，返回是否确认成功"""
+    return SeatHold.objects.filter(enrollment=enrollment, status='active').update(
+        status='confirmed', updated_at=timezone.now()
+    ) == 1
+
+
+def release_expired_holds(batch_size=1000, now=None):
+    """
+    批量释放已过期的名额保留
+
+    每批在一个事务内完成：锁定一批过期保留（SKIP LOCKED，多进程可并行清理），
+    标记为已释放、取消对应的待支付报名，并按课程汇总后一条UPDATE归还名额。
+    返回 {course_id: 释放名额数}。
+    """
+    now = now or timezone.now()
+    freed = Counter()
+    while True:
+        with transaction.atomic():
+            holds = list(
+                SeatHold.objects.select_for_update(skip_locked=True)
+                .filter(status='active', expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('pk', 'enrollment_id')[:batch_size]
+            )
+            if not holds:
+                break
+            SeatHold.objects.filter(pk__in=[pk for pk, _ in holds]).update(
+                status='released', updated_at=now
+            )
+            pending = list(
+                Enrollment.objects.select_for_update()
+                .filter(pk__in=[enrollment_id for _, enrollment_id in holds], status='pending')
+                .values_list('pk', 'course_id')
+            )
+            Enrollment.objects.filter(pk__in=[pk for pk, _ in pending]).update(status='cancelled')
+            batch_freed = Counter(course_id for _, course_id in pending)
+            release_seats_bulk(batch_freed)
+        freed.update(batch_freed)
+        if len(holds) < batch_size:
+            break
+    return dict(freed)
+
+
+def release_payment_holds(payment_record_ids, now=None):
+    """
+    支付记录过期后批量释放名额
+
+    释放这些支付记录的名额保留、取消对应的待支付报名，按课程汇总后一条UPDATE归还名额。
+    需在调用方的事务内执行，返回 {course_id: 释放名额数}。
+    """
+    now = now or timezone.now()
+    SeatHold.objects.filter(payment_record_id__in=payment_record_ids, status='active').update(
+        status='released', updated_at=now
+    )
+    pending = list(
+        Enrollment.objects.select_for_update()
+        .filter(payment_record_id__in=payment_record_ids, status='pending')
+        .values_list('pk', 'course_id')
+    )
+    Enrollment.objects.filter(pk__in=[pk for pk, _ in pending]).update(status='cancelled')
+    freed = Counter(course_id for _, course_id in pending)
+    release_seats_bulk(freed)
+    return dict(freed)
+
+
+def cancel_enrollment(enrollment):
+    """
+    取消报名并归还名额
+
+    仅待支付/已支付的报名可取消，状态以条件UPDATE切换，重复取消不会重复归还名额。
+    返回是否取消成功。
+    """
+    with transaction.atomic():
+        cancelled = Enrollment.objects.filter(
+            pk=enrollment.pk, status__in=SEAT_STATUSES_CANCELLABLE
+        ).update(status='cancelled')
+        if not cancelled:
+            return False
+        SeatHold.objects.filter(enrollment=enrollment, status='active').update(
+            status='released', updated_at=timezone.now()
+        )
+        release_seat(enrollment.course_id)
+    enrollment.status = 'cancelled'
+    return True
+
+
+def reconcile_enrolled_counts(batch_size=1000, dry_run=False):
+    """
+    校正课程已报名人数
+
+    在同一事务快照内：一次分组聚合统计各课程占用名额的报名数，流式读取各课程当前计数，
+    找出偏差的课程后按批次一条UPDATE修正。UPDATE 带上读取时的旧值作为条件，
+    期间被并发报名修改过的课程保持不动，留待下次校正。
+    返回偏差列表 [(course_id, 原计数, 实际报名数)]。
+    """
+    with transaction.atomic():
+        actual = dict(
+            Enrollment.objects.filter(status__in=SEAT_STATUSES)
+            .values('course_id').annotate(n=Count('id')).values_list('course_id', 'n')
+        )
+        drifted = [
+            (pk, count, actual.get(pk, 0))
+            for pk, count in Course.objects.order_by().values_list('pk', 'enrolled_count')
+            .iterator(chunk_size=5000)
+            if count != actual.get(pk, 0)
+        ]
+    if dry_run:
+        return drifted
+    for offset in range(0, len(drifted), batch_size):
+        batch = drifted[offset:offset + batch_size]
+        Course.objects.filter(pk__in=[pk for pk, _, _ in batch]).update(enrolled_count=Case(
+            *[When(Q(pk=pk) & Q(enrolled_count=count), then=Value(expected))
+              for pk, count, expected in batch],
+            default=F('enrolled_count'),
+            output_field=IntegerField(),
+        ))
+    return drifted
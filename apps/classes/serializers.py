@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from apps.classes.models import DanceType, ClassType, Course, ClassRoom, ClassSchedule, Enrollment
+from apps.classes.conflicts import describe_conflict, find_conflicts
+from apps.classes.models import (DanceType, ClassType, Course, ClassRoom, ClassSchedule, Enrollment,
+                                 WaitlistEntry)
+from water_cube_studio.fieldsets import DynamicFieldsMixin
 
 
 class DanceTypeSerializer(serializers.ModelSerializer):
@@ -16,7 +19,7 @@ class ClassTypeSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class_type_name = serializers.CharField(source='class_type.name', read_only=True)
     teacher_name = serializers.CharField(source='teacher.real_name', read_only=True)
     is_full = serializers.BooleanField(read_only=True)
@@ -33,7 +36,7 @@ class ClassRoomSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class ClassScheduleSerializer(serializers.ModelSerializer):
+class ClassScheduleSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     course_name = serializers.CharField(source='course.name', read_only=True)
     teacher_name = serializers.CharField(source='teacher.real_name', read_only=True)
     classroom_name = serializers.CharField(source='classroom.name', read_only=True)
@@ -41,12 +44,40 @@ class ClassScheduleSerializer(serializers.ModelSerializer):
     class Meta:
         model = ClassSchedule
         fields = '__all__'
+    
+    def validate(self, attrs):
+        """校验时间先后以及教室、教师是否被重复占用"""
+        values = {field: attrs.get(field, getattr(self.instance, field, None))
+                  for field in ('classroom', 'teacher', 'start_time', 'end_time')}
+        # 新建时未传状态按模型默认值（正常）处理
+        status = attrs.get('status', getattr(self.instance, 'status', None)) or 'scheduled'
+        if values['start_time'] and values['end_time'] and values['start_time'] >= values['end_time']:
+            raise serializers.ValidationError('结束时间必须晚于开始时间')
+        if status != 'cancelled' and all(values.values()):
+            conflicts = find_conflicts([{
+                'id': getattr(self.instance, 'pk', None),
+                'classroom_id': values['classroom'].pk,
+                'teacher_id': values['teacher'].pk,
+                'start_time': values['start_time'],
+                'end_time': values['end_time'],
+            }])
+            if conflicts:
+                raise serializers.ValidationError([describe_conflict(c) for c in conflicts])
+        return attrs
 
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.real_name', read_only=True)
     course_name = serializers.CharField(source='course.name', read_only=True)
     
     class Meta:
         model = Enrollment
         fields = '__all__'
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    student_name = serializers.CharField(source='student.real_name', read_only=True)
+    
+    class Meta:
+        model = WaitlistEntry
+        fields = '__all__'
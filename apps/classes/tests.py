@@ -0,0 +1,61 @@
+from datetime import date, datetime, timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.classes.models import ClassRoom, ClassSchedule, ClassType, Course, DanceType
+from apps.classes.serializers import ClassScheduleSerializer
+from apps.teachers.models import Teacher
+from apps.users.models import User
+
+
+class ClassScheduleSerializerTests(TestCase):
+    """排课序列化器的冲突校验"""
+
+    @classmethod
+    def setUpTestData(cls):
+        dance_type = DanceType.objects.create(name='爵士')
+        class_type = ClassType.objects.create(name='爵士初级', dance_type=dance_type, level='beginner',
+                                              age_range='8-12岁')
+        cls.teacher = Teacher.objects.create(user=User.objects.create(username='teacher'), teacher_no='T001',
+                                             real_name='教师', specialty='爵士', join_date=date(2020, 1, 1))
+        cls.classroom = ClassRoom.objects.create(name='1号教室', capacity=20, location='一楼')
+        cls.course = Course.objects.create(class_type=class_type, name='爵士初级1班', term='第1期',
+                                           teacher=cls.teacher, start_date=date(2026, 9, 1),
+                                           end_date=date(2026, 12, 31))
+        cls.start_time = timezone.make_aware(datetime(2026, 9, 7, 19, 0))
+        cls.existing = ClassSchedule.objects.create(
+            course=cls.course, session_no=1, classroom=cls.classroom, teacher=cls.teacher,
+            start_time=cls.start_time, end_time=cls.start_time + timedelta(hours=1),
+        )
+
+    def _data(self, **overrides):
+        data = {
+            'course': self.course.pk, 'session_no': 2, 'classroom': self.classroom.pk,
+            'teacher': self.teacher.pk, 'start_time': self.start_time + timedelta(minutes=30),
+            'end_time': self.start_time + timedelta(minutes=90),
+        }
+        data.update(overrides)
+        return data
+
+    def test_conflict_detected_when_status_omitted(self):
+        serializer = ClassScheduleSerializer(data=self._data())
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('non_field_errors', serializer.errors)
+
+    def test_conflict_detected_for_scheduled_status(self):
+        serializer = ClassScheduleSerializer(data=self._data(status='scheduled'))
+        self.assertFalse(serializer.is_valid())
+
+    def test_cancelled_session_skips_conflict_check(self):
+        serializer = ClassScheduleSerializer(data=self._data(status='cancelled'))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_no_conflict_after_existing_session(self):
+        serializer = ClassScheduleSerializer(data=self._data(start_time=self.start_time + timedelta(hours=1),
+                                                             end_time=self.start_time + timedelta(hours=2)))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_partial_update_keeps_instance_status(self):
+        serializer = ClassScheduleSerializer(self.existing, data={'notes': '调整备注'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
@@ -0,0 +1,315 @@
+"""
+整期课表自动排课
+
+把一个期次的所有课程分配到每周固定的上课时段和教室，约束包括：
+
+- 教室容量 capacity 不小于课程招生名额 max_students
+- 同一教室、同一教师在同一时间只能有一节课（含已有排课）
+- 每节课按班型 duration_minutes 占用时间，每周节数由 total_sessions 和开课周数推算
+- 只为在职教师排课，同一课程每周的多节课在不同日期、同一教室
+
+求解采用带回溯的约束搜索：按可选方案数从少到多（MRV）依次放置每周课节，
+候选方案优先选择容量最贴合的教室；搜索节点数和求解时长有上限，超出时返回已找到的最优解。
+课节总数超过 教室数 × 每周时段数，或某位教师的课节数超过每周时段数时无法全部排上，不做搜索直接返回。
+求解结果可直接交给批量排课写入 ClassSchedule。
+"""
+
+import math
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.classes.models import ClassRoom, ClassSchedule, Course
+from apps.classes.scheduling import generate_term_sessions
+
+
+class TimetableTooLarge(ValueError):
+    """课节数超过在线求解上限"""
+
+
+def _minutes(value):
+    parsed = datetime.strptime(value, '%H:%M')
+    return parsed.hour * 60 + parsed.minute
+
+
+def _time(minutes):
+    return datetime.strptime(f'{minutes // 60:02d}:{minutes % 60:02d}', '%H:%M').time()
+
+
+class _Occupancy:
+    """按 (资源, 星期) 记录已占用的分钟区间"""
+
+    def __init__(self):
+        self._busy = defaultdict(set)
+
+    def is_free(self, key, start, end):
+        return all(end <= other_start or start >= other_end
+                   for other_start, other_end in self._busy.get(key, ()))
+
+    def add(self, key, start, end):
+        self._busy[key].add((start, end))
+
+    def remove(self, key, start, end):
+        self._busy[key].discard((start, end))
+
+
+class TimetableSolver:
+    """整期课表求解器"""
+
+    def __init__(self, courses, rooms, slots=None, existing=(), max_nodes=200000, time_limit=None,
+                 progress=None):
+        """
+        courses: 待排课程（需预取 class_type、teacher）
+        rooms: 可用教室
+        slots: {weekday: ['HH:MM', ...]}，默认取 settings.TIMETABLE_SLOTS
+        existing: 已有排课 [(classroom_id, teacher_id, start_time, end_time)]，视为每周固定占用
+        time_limit: 求解时长上限（秒），None 表示只受 max_nodes 限制
+        progress: 回调 progress(已放置课节数, 课节总数, 搜索节点数)
+        """
+        slots = slots or settings.TIMETABLE_SLOTS
+        self.slots = sorted((int(weekday), _minutes(start))
+                            for weekday, starts in slots.items() for start in starts)
+        self.rooms = sorted(rooms, key=lambda room: room.capacity)
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.progress = progress
+        self.occupancy = _Occupancy()
+        tz = timezone.get_current_timezone()
+        for classroom_id, teacher_id, start_time, end_time in existing:
+            start_time, end_time = start_time.astimezone(tz), end_time.astimezone(tz)
+            start = start_time.hour * 60 + start_time.minute
+            end = start + int((end_time - start_time).total_seconds() // 60)
+            self.occupancy.add(('room', classroom_id, start_time.weekday()), start, end)
+            self.occupancy.add(('teacher', teacher_id, start_time.weekday()), start, end)
+
+        self.unplaceable = {}
+        self.meetings = []
+        for course in courses:
+            reason = self._check_course(course)
+            if reason:
+                self.unplaceable[course.pk] = reason
+                continue
+            for index in range(self.sessions_per_week(course)):
+                self.meetings.append((course, index))
+        self.stats = {'courses': len(courses), 'meetings': len(self.meetings), 'nodes': 0,
+                      'backtracks': 0, 'placed': 0, 'elapsed': 0.0, 'timed_out': False, 'infeasible': None}
+
+    @staticmethod
+    def sessions_per_week(course):
+        """每周课节数 = 总课次 / 开课周数（向上取整）"""
+        weeks = max(1, math.ceil(((course.end_date - course.start_date).days + 1) / 7))
+        return max(1, math.ceil(course.total_sessions / weeks))
+
+    def _check_course(self, course):
+        if course.teacher is None:
+            return '未指定授课教师'
+        if course.teacher.status != 'active':
+            return '授课教师不在职'
+        if not any(room.capacity >= course.max_students for room in self.rooms):
+            return '没有容量足够的教室'
+        if self.sessions_per_week(course) > len({weekday for weekday, _ in self.slots}):
+            return '每周课节数超过可排课天数'
+        return None
+
+    def infeasible(self):
+        """课节数超过可用时段容量时返回原因（此时不可能全部排上），否则返回None"""
+        if len(self.meetings) > len(self.rooms) * len(self.slots):
+            return f'课节数 {len(self.meetings)} 超过 教室数×每周时段数 {len(self.rooms) * len(self.slots)}'
+        per_teacher = defaultdict(int)
+        for course, _ in self.meetings:
+            per_teacher[course.teacher_id] += 1
+        for teacher_id, count in per_teacher.items():
+            if count > len(self.slots):
+                return f'教师#{teacher_id} 的课节数 {count} 超过每周时段数 {len(self.slots)}'
+        return None
+
+    def _options(self, meeting, assignment):
+        """课节的可选 (weekday, start, room)，按教室容量贴合度排序"""
+        course, index = meeting
+        duration = course.class_type.duration_minutes
+        fixed_room = None
+        used_days = set()
+        for other_index in range(index):
+            placed = assignment.get((course.pk, other_index))
+            if placed:
+                used_days.add(placed[0])
+                fixed_room = placed[2]
+        options = []
+        for room in self.rooms:
+            if room.capacity < course.max_students or (fixed_room and room.pk != fixed_room):
+                continue
+            for weekday, start in self.slots:
+                end = start + duration
+                if weekday in used_days:
+                    continue
+                if (self.occupancy.is_free(('room', room.pk, weekday), start, end)
+                        and self.occupancy.is_free(('teacher', course.teacher_id, weekday), start, end)):
+                    options.append((weekday, start, room.pk))
+        return options
+
+    def _place(self, meeting, option):
+        course, _ = meeting
+        weekday, start, room_id = option
+        end = start + course.class_type.duration_minutes
+        self.occupancy.add(('room', room_id, weekday), start, end)
+        self.occupancy.add(('teacher', course.teacher_id, weekday), start, end)
+
+    def _unplace(self, meeting, option):
+        course, _ = meeting
+        weekday, start, room_id = option
+        end = start + course.class_type.duration_minutes
+        self.occupancy.remove(('room', room_id, weekday), start, end)
+        self.occupancy.remove(('teacher', course.teacher_id, weekday), start, end)
+
+    def solve(self):
+        """求解，返回 {(course_id, 课节序号): (weekday, start_minute, room_id)}"""
+        started = time.perf_counter()
+        self.stats['infeasible'] = self.infeasible()
+        if self.stats['infeasible']:
+            self.stats['elapsed'] = round(time.perf_counter() - started, 3)
+            return {}
+        deadline = started + self.time_limit if self.time_limit else None
+        # MRV：初始可选方案少的课程先排，同一课程的课节保持相邻
+        domain_size = {}
+        for meeting in self.meetings:
+            if meeting[0].pk not in domain_size:
+                domain_size[meeting[0].pk] = len(self._options(meeting, {}))
+        order = sorted(self.meetings, key=lambda m: (domain_size[m[0].pk], -m[0].max_students,
+                                                      m[0].pk, m[1]))
+        total = len(order)
+        best, assignment = {}, {}
+        # 搜索栈，每帧为 [课节位置, 候选方案列表（末尾None表示本课节不排）, 当前候选下标]
+        stack = []
+        position = 0
+        while self.stats['nodes'] < self.max_nodes:
+            if deadline is not None and time.perf_counter() >= deadline:
+                self.stats['timed_out'] = True
+                break
+            # 到达叶子，或剩余课节全部排上也无法超过当前最优：记录并回溯
+            if position == total or len(assignment) + (total - position) <= len(best):
+                if len(assignment) > len(best):
+                    best = dict(assignment)
+                if len(best) == total or not self._advance(stack, order, assignment):
+                    break
+                position = stack[-1][0] + 1
+                continue
+            stack.append([position, self._options(order[position], assignment) + [None], 0])
+            self._apply(stack[-1], order, assignment)
+            self.stats['nodes'] += 1
+            position += 1
+            if self.progress and self.stats['nodes'] % 1000 == 0:
+                self.progress(len(best), total, self.stats['nodes'])
+
+        self.stats['placed'] = len(best)
+        self.stats['elapsed'] = round(time.perf_counter() - started, 3)
+        if self.progress:
+            self.progress(len(best), total, self.stats['nodes'])
+        return best
+
+    def _apply(self, frame, order, assignment):
+        position, options, index = frame
+        option = options[index]
+        if option is not None:
+            meeting = order[position]
+            self._place(meeting, option)
+            assignment[(meeting[0].pk, meeting[1])] = option
+
+    def _advance(self, stack, order, assignment):
+        """回溯到最近一个还有其他候选方案的课节并换用下一个方案，无可回溯时返回False"""
+        while stack:
+            frame = stack[-1]
+            meeting = order[frame[0]]
+            option = assignment.pop((meeting[0].pk, meeting[1]), None)
+            if option is not None:
+                self._unplace(meeting, option)
+            if frame[2] + 1 < len(frame[1]):
+                self.stats['backtracks'] += 1
+                self.stats['nodes'] += 1
+                frame[2] += 1
+                self._apply(frame, order, assignment)
+                return True
+            stack.pop()
+        return False
+
+    def plans(self, solution, courses):
+        """把求解结果转换为批量排课的 plans"""
+        rooms = {room.pk: room for room in self.rooms}
+        by_course = defaultdict(list)
+        for (course_id, _), option in solution.items():
+            by_course[course_id].append(option)
+        plans = []
+        for course in courses:
+            options = by_course.get(course.pk)
+            if not options or len(options) < self.sessions_per_week(course):
+                continue
+            plans.append({
+                'course': course,
+                'pattern': sorted((weekday, _time(start)) for weekday, start, _ in options),
+                'classroom': rooms[options[0][2]],
+                'teacher': course.teacher,
+            })
+        return plans
+
+
+def solve_term(term, holidays=(), apply=False, max_nodes=200000, time_limit=None, max_meetings=None,
+               progress=None):
+    """
+    为期次求解课表
+
+    只为尚未排课的课程求解；apply=True 时把结果一次性写入排课表。
+    课节数超过 max_meetings 时抛出 TimetableTooLarge，不做求解（在线接口用，大期次走管理命令）。
+    返回 {'stats': 统计, 'assignments': [...], 'unassigned': {course_id: 原因}, 'created': 新建课次数}
+    """
+    courses = list(
+        Course.objects.filter(term=term).exclude(status__in=['cancelled', 'completed'])
+        .exclude(schedules__isnull=False)
+        .select_related('class_type', 'teacher')
+        .distinct()
+    )
+    rooms = list(ClassRoom.objects.filter(is_active=True))
+    existing = []
+    if courses:
+        start_date = min(course.start_date for course in courses)
+        end_date = max(course.end_date for course in courses)
+        existing = list(
+            ClassSchedule.objects.exclude(status='cancelled')
+            .filter(start_time__date__gte=start_date, start_time__date__lte=end_date)
+            .values_list('classroom_id', 'teacher_id', 'start_time', 'end_time')
+        )
+
+    solver = TimetableSolver(courses, rooms, existing=existing, max_nodes=max_nodes, time_limit=time_limit,
+                             progress=progress)
+    if max_meetings is not None and len(solver.meetings) > max_meetings:
+        raise TimetableTooLarge(f'期次「{term}」共 {len(solver.meetings)} 个课节，超过在线排课上限 {max_meetings}，'
+                                f'请使用 python manage.py solve_timetable --term {term}')
+    solution = solver.solve()
+    plans = solver.plans(solution, courses)
+    planned = {plan['course'].pk for plan in plans}
+    unassigned = dict(solver.unplaceable)
+    for course in courses:
+        if course.pk not in planned and course.pk not in unassigned:
+            unassigned[course.pk] = solver.stats['infeasible'] or '没有可用的时段和教室'
+
+    created = 0
+    if apply and plans:
+        created = len(generate_term_sessions(plans, holidays=holidays))
+
+    return {
+        'stats': solver.stats,
+        'assignments': [
+            {
+                'course_id': plan['course'].pk,
+                'course_name': plan['course'].name,
+                'classroom_id': plan['classroom'].pk,
+                'teacher_id': plan['teacher'].pk,
+                'pattern': [{'weekday': weekday, 'start': start.strftime('%H:%M')}
+                            for weekday, start in plan['pattern']],
+            }
+            for plan in plans
+        ],
+        'unassigned': unassigned,
+        'created': created,
+    }
@@ -1,9 +1,28 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.fields import BooleanField
 from rest_framework.response import Response
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from apps.classes.conflicts import ScheduleConflict, describe_conflict, find_conflicts
+from water_cube_studio.fieldsets import SparseFieldsMixin
+from water_cube_studio.pagination import HybridPagination
 from apps.classes.models import DanceType, ClassType, Course, ClassRoom, ClassSchedule, Enrollment
+from apps.classes.scheduling import generate_sessions, parse_dates, parse_weekly_pattern, shift_sessions
+from apps.classes.timetable import TimetableTooLarge, solve_term
+from apps.classes.seats import SeatUnavailable, cancel_enrollment, enroll_student
+from apps.classes.waitlist import join_waitlist, promote_waitlist
 from .serializers import (DanceTypeSerializer, ClassTypeSerializer, CourseSerializer,
-                         ClassRoomSerializer, ClassScheduleSerializer, EnrollmentSerializer)
+                         ClassRoomSerializer, ClassScheduleSerializer, EnrollmentSerializer,
+                         WaitlistEntrySerializer)
+
+
+def _flag(value):
+    """请求中的布尔参数：JSON 布尔值或 'true'/'false'、'1'/'0' 等字符串，缺省为假；无法识别时返回400"""
+    if value in (None, ''):
+        return False
+    return BooleanField().to_internal_value(value)
 
 
 class DanceTypeViewSet(viewsets.ModelViewSet):
@@ -19,7 +38,7 @@ class ClassTypeViewSet(viewsets.ModelViewSet):
     filterset_fields = ['dance_type', 'level']
 
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """课程视图集"""
     queryset = Course.objects.select_related('class_type', 'teacher').all()
     serializer_class = CourseSerializer
@@ -31,28 +50,112 @@ class CourseViewSet(viewsets.ModelViewSet):
         course = self.get_object()
         student_id = request.data.get('student_id')
         
-        if course.is_full:
-            return Response({'error': '该课程已满员'}, status=status.HTTP_400_BAD_REQUEST)
+        from apps.students.models import Student
+        try:
+            student = Student.objects.get(id=student_id)
+        except (Student.DoesNotExist, ValueError, TypeError):
+            return Response({'error': '学员不存在'}, status=status.HTTP_404_NOT_FOUND)
         
-        if not course.is_open_enrollment:
-            return Response({'error': '该课程暂未开放报名'}, status=status.HTTP_400_BAD_REQUEST)
+        # 名额占用与报名记录在同一事务内完成，满员时整体回滚
+        try:
+            enrollment = enroll_student(course, student, source=request.data.get('source', '线上'))
+        except SeatUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(EnrollmentSerializer(enrollment).data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['get', 'post'])
+    def waitlist(self, request, pk=None):
+        """候补名单：GET查看排队情况，POST加入候补"""
+        course = self.get_object()
+        if request.method == 'GET':
+            entries = course.waitlist.filter(status='waiting').select_related('student')
+            return Response(WaitlistEntrySerializer(entries, many=True).data)
         
-        # 创建报名记录
         from apps.students.models import Student
         try:
-            student = Student.objects.get(id=student_id)
-            enrollment = Enrollment.objects.create(
-                student=student,
-                course=course,
-                source=request.data.get('source', '线上')
-            )
-            course.enrolled_count += 1
-            course.save()
-            return Response(EnrollmentSerializer(enrollment).data, status=status.HTTP_201_CREATED)
-        except Student.DoesNotExist:
+            student = Student.objects.get(id=request.data.get('student_id'))
+        except (Student.DoesNotExist, ValueError, TypeError):
             return Response({'error': '学员不存在'}, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
+        
+        try:
+            entry, position = join_waitlist(course, student)
+        except SeatUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        data = WaitlistEntrySerializer(entry).data
+        data['position'] = position
+        return Response(data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'])
+    def generate_schedules(self, request, pk=None):
+        """按每周上课规律批量生成全部课次"""
+        course = self.get_object()
+        from apps.teachers.models import Teacher
+        try:
+            pattern = parse_weekly_pattern(request.data.get('pattern') or [])
+            holidays = parse_dates(request.data.get('holidays'))
+            classroom = ClassRoom.objects.get(pk=request.data.get('classroom_id'))
+            teacher = Teacher.objects.get(pk=request.data['teacher_id']) if request.data.get('teacher_id') else None
+        except ClassRoom.DoesNotExist:
+            return Response({'error': '教室不存在'}, status=status.HTTP_404_NOT_FOUND)
+        except Teacher.DoesNotExist:
+            return Response({'error': '教师不存在'}, status=status.HTTP_404_NOT_FOUND)
+        except (KeyError, TypeError, ValueError) as e:
+            return Response({'error': f'参数错误: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            sessions = generate_sessions(course, pattern, classroom, teacher, holidays,
+                                         replace=_flag(request.data.get('replace')))
+        except ScheduleConflict as e:
+            return Response({'error': str(e), 'conflicts': [describe_conflict(c) for c in e.conflicts]},
+                            status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ClassScheduleSerializer(sessions, many=True).data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'])
+    def reschedule(self, request, pk=None):
+        """节假日/停课顺延：自from_date起的课次避开blocked_dates顺延"""
+        course = self.get_object()
+        try:
+            blocked_dates = parse_dates(request.data.get('blocked_dates'))
+            from_date = min(parse_dates([request.data['from_date']]) if request.data.get('from_date')
+                            else blocked_dates)
+        except (TypeError, ValueError) as e:
+            return Response({'error': f'参数错误: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            shifted = shift_sessions(course, from_date, blocked_dates)
+        except ScheduleConflict as e:
+            return Response({'error': str(e), 'conflicts': [describe_conflict(c) for c in e.conflicts]},
+                            status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'shifted': shifted})
+
+
+    @action(detail=False, methods=['post'])
+    def solve_timetable(self, request):
+        """
+        为期次自动排课：apply为真时写入排课表，否则只返回方案
+
+        在线求解限时 TIMETABLE_API_TIME_LIMIT 秒，课节数超过 TIMETABLE_API_MAX_MEETINGS 的期次
+        需使用 solve_timetable 管理命令。
+        """
+        term = request.data.get('term')
+        if not term:
+            return Response({'error': '期次不能为空'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            holidays = parse_dates(request.data.get('holidays'))
+            result = solve_term(term, holidays=holidays, apply=_flag(request.data.get('apply')),
+                                time_limit=settings.TIMETABLE_API_TIME_LIMIT,
+                                max_meetings=settings.TIMETABLE_API_MAX_MEETINGS)
+        except TimetableTooLarge as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ScheduleConflict as e:
+            return Response({'error': str(e), 'conflicts': [describe_conflict(c) for c in e.conflicts]},
+                            status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({'error': f'参数错误: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
 
 
 class ClassRoomViewSet(viewsets.ModelViewSet):
@@ -61,15 +164,52 @@ class ClassRoomViewSet(viewsets.ModelViewSet):
     serializer_class = ClassRoomSerializer
 
 
-class ClassScheduleViewSet(viewsets.ModelViewSet):
+class ClassScheduleViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """排课视图集"""
     queryset = ClassSchedule.objects.select_related('course', 'teacher', 'classroom').all()
     serializer_class = ClassScheduleSerializer
     filterset_fields = ['course', 'status', 'teacher']
+    
+    @action(detail=False, methods=['post'])
+    def check_conflicts(self, request):
+        """批量检测候选课次的教室、教师冲突"""
+        candidates = []
+        for item in request.data.get('sessions') or []:
+            try:
+                start_time, end_time = parse_datetime(item['start_time']), parse_datetime(item['end_time'])
+                if start_time is None or end_time is None:
+                    raise ValueError('时间格式错误')
+                if timezone.is_naive(start_time):
+                    start_time = timezone.make_aware(start_time)
+                if timezone.is_naive(end_time):
+                    end_time = timezone.make_aware(end_time)
+                candidates.append({
+                    'id': item.get('id'), 'classroom_id': int(item['classroom_id']),
+                    'teacher_id': int(item['teacher_id']),
+                    'start_time': start_time, 'end_time': end_time,
+                })
+            except (KeyError, TypeError, ValueError):
+                return Response({'error': f'候选课次格式错误: {item}'}, status=status.HTTP_400_BAD_REQUEST)
+        conflicts = find_conflicts(candidates)
+        return Response({
+            'checked': len(candidates),
+            'conflicts': [dict(c, message=describe_conflict(c)) for c in conflicts],
+        })
 
 
-class EnrollmentViewSet(viewsets.ModelViewSet):
+class EnrollmentViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """报名视图集"""
     queryset = Enrollment.objects.select_related('student', 'course').all()
     serializer_class = EnrollmentSerializer
     filterset_fields = ['status', 'student', 'course']
+    pagination_class = HybridPagination
+    cursor_ordering = ('-enrollment_date', '-id')
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """取消报名，归还的名额转给候补学员"""
+        enrollment = self.get_object()
+        if not cancel_enrollment(enrollment):
+            return Response({'error': '当前状态的报名不能取消'}, status=status.HTTP_400_BAD_REQUEST)
+        promote_waitlist(enrollment.course_id)
+        return Response(EnrollmentSerializer(enrollment).data)
@@ -0,0 +1,147 @@
+"""
+课程候补名单
+
+满员课程的学员按加入顺序排队。名额释放（退款、取消、保留过期）后，
+由 promote_waitlist 取队首转正：队首通过 (course, status, id) 索引直接定位，
+不扫描报名表；SELECT ... FOR UPDATE SKIP LOCKED 加上条件UPDATE占用名额，
+多个 gunicorn worker 同时转正也不会重复转正或超卖。
+
+转正通知写入候补记录的 notified_at 作为发件箱，由 send_waitlist_notifications
+按批次合并发送。
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.utils import timezone
+
+from apps.classes.models import Enrollment, SeatHold, WaitlistEntry
+from apps.classes.seats import SEAT_STATUSES, SeatUnavailable, hold_expiry, reserve_seat
+
+logger = logging.getLogger(__name__)
+
+
+def join_waitlist(course, student):
+    """加入候补名单，返回 (候补记录, 当前排位)"""
+    if Enrollment.objects.filter(course=course, student=student,
+                                 status__in=SEAT_STATUSES).exists():
+        raise SeatUnavailable('该学员已报名此课程')
+    entry, created = WaitlistEntry.objects.get_or_create(course=course, student=student)
+    if not created and entry.status != 'waiting':
+        # 已转正或取消过的学员重新排到队尾
+        entry.delete()
+        entry = WaitlistEntry.objects.create(course=course, student=student)
+    return entry, waitlist_position(entry)
+
+
+def waitlist_position(entry):
+    """候补排位（从1开始）"""
+    return WaitlistEntry.objects.filter(
+        course_id=entry.course_id, status='waiting', pk__lte=entry.pk
+    ).count()
+
+
+def _promote_head(course_id):
+    """转正队首一人，返回处理的候补记录；无人候补或无名额时返回None"""
+    with transaction.atomic():
+        entry = (
+            WaitlistEntry.objects.select_for_update(skip_locked=True)
+            .filter(course_id=course_id, status='waiting')
+            .order_by('id')
+            .first()
+        )
+        if entry is None:
+            return None
+
+        enrollment, created = Enrollment.objects.get_or_create(
+            student_id=entry.student_id, course_id=course_id,
+            defaults={'status': 'pending', 'source': '候补转正'},
+        )
+        if not created:
+            if enrollment.status in SEAT_STATUSES:
+                # 已通过其他途径报名，作废此候补
+                WaitlistEntry.objects.filter(pk=entry.pk).update(status='cancelled')
+                entry.status = 'cancelled'
+                return entry
+            Enrollment.objects.filter(pk=enrollment.pk).update(status='pending', source='候补转正')
+
+        SeatHold.objects.update_or_create(
+            enrollment=enrollment,
+            defaults={'course_id': course_id, 'payment_record': None,
+                      'status': 'active', 'expires_at': hold_expiry()},
+        )
+        now = timezone.now()
+        WaitlistEntry.objects.filter(pk=entry.pk).update(
+            status='promoted', enrollment=enrollment, promoted_at=now
+        )
+        # 占用名额放在事务最后，课程行锁只持有到提交
+        if not reserve_seat(course_id):
+            transaction.set_rollback(True)
+            return None
+        entry.status, entry.enrollment, entry.promoted_at = 'promoted', enrollment, now
+        return entry
+
+
+def promote_waitlist(course_id, seats=1):
+    """按释放的名额数转正候补学员，返回转正的候补记录列表"""
+    promoted = []
+    while len(promoted) < seats:
+        entry = _promote_head(course_id)
+        if entry is None:
+            break
+        if entry.status == 'promoted':
+            promoted.append(entry)
+    return promoted
+
+
+def promote_waitlists(seat_counts):
+    """按 {course_id: 释放名额数} 批量转正，返回转正总人数"""
+    total = 0
+    for course_id, seats in seat_counts.items():
+        total += len(promote_waitlist(course_id, seats))
+    return total
+
+
+def send_promotion_notifications(batch_size=200):
+    """
+    批量发送转正通知
+
+    每批通过一个邮件连接发送（send_mass_mail），并一次性回写 notified_at。
+    返回已处理的候补记录数。
+    """
+    processed = 0
+    while True:
+        entries = list(
+            WaitlistEntry.objects.filter(status='promoted', notified_at__isnull=True)
+            .select_related('student__user', 'course')
+            .order_by('promoted_at')[:batch_size]
+        )
+        if not entries:
+            break
+        messages = []
+        for entry in entries:
+            email = entry.student.user.email
+            if not email:
+                continue
+            pay_url = f"{settings.SITE_URL}/api/payment/create/?enrollment_id={entry.enrollment_id}"
+            messages.append((
+                f'候补成功：{entry.course.name}',
+                f'{entry.student.real_name}，您候补的课程「{entry.course.name}」已有空余名额，'
+                f'名额为您保留 {settings.SEAT_HOLD_TTL_MINUTES} 分钟，请尽快完成支付：{pay_url}',
+                settings.DEFAULT_FROM_EMAIL,
+                [email],
+            ))
+        try:
+            send_mass_mail(messages, fail_silently=False)
+        except Exception as e:
+            logger.error(f"候补转正通知发送失败: {e}")
+            break
+        WaitlistEntry.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+            notified_at=timezone.now()
+        )
+        processed += len(entries)
+        if len(entries) < batch_size:
+            break
+    return processed
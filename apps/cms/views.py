@@ -3,6 +3,7 @@ from django.views.generic import ListView, DetailView
 from django.http import JsonResponse
 from apps.cms.models import Banner, Article, Gallery
 from apps.classes.models import ClassType, Course, Enrollment
+from apps.classes.seats import enroll_student
 from apps.teachers.models import Teacher
 from apps.students.models import Student
 
@@ -91,24 +92,16 @@ def enrollment(request, class_type_id=None):
             course = get_object_or_404(Course, pk=course_id)
             
             # 检查是否已经报名
-            enrollment_obj, created = Enrollment.objects.get_or_create(
-                student=student,
-                course=course,
-                defaults={
-                    'status': 'pending',
-                    'source': '线上',
-                }
-            )
-            
-            if created:
-                # 新报名，跳转到支付页面
-                return redirect(f'/api/payment/create/?enrollment_id={enrollment_obj.pk}')
-            else:
-                # 已经报名
+            enrollment_obj = Enrollment.objects.filter(student=student, course=course).first()
+            if enrollment_obj:
                 return render(request, 'cms/enrollment_result.html', {
                     'message': '你已经报名过该课程',
                     'enrollment': enrollment_obj
                 })
+            
+            # 新报名占用名额并限时保留，跳转到支付页面
+            enrollment_obj = enroll_student(course, student, status='pending', source='线上')
+            return redirect(f'/api/payment/create/?enrollment_id={enrollment_obj.pk}')
         except Exception as e:
             return render(request, 'cms/enrollment_error.html', {
                 'error': str(e)
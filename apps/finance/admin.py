@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import PricePolicy, Payment
+from .models import PricePolicy, Payment, LedgerEntry, LedgerLine, DailyRevenue
 from apps.payment.models import PaymentRecord
 
 
@@ -45,3 +45,32 @@ class PaymentRecordAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+class LedgerLineInline(admin.TabularInline):
+    model = LedgerLine
+    extra = 0
+    can_delete = False
+    fields = ['kind', 'account', 'debit', 'credit', 'payment_method', 'occurred_at']
+    readonly_fields = fields
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    """账本凭证（由支付记录、收费记录同步生成，只读）"""
+    list_display = ['order_no', 'source', 'student', 'amount', 'created_at', 'synced_at']
+    list_filter = ['source', 'billing_type', 'created_at']
+    search_fields = ['order_no', 'transaction_id', 'student__real_name']
+    readonly_fields = ['source', 'source_id', 'order_no', 'transaction_id', 'student', 'amount',
+                       'billing_type', 'dance_type_id', 'teacher_id', 'created_at', 'synced_at']
+    inlines = [LedgerLineInline]
+
+
+@admin.register(DailyRevenue)
+class DailyRevenueAdmin(admin.ModelAdmin):
+    """每日收入汇总（由账本重算，只读）"""
+    list_display = ['day', 'payment_method', 'billing_type', 'dance_type_id', 'teacher_id',
+                    'orders', 'revenue', 'refund_count', 'refunds']
+    list_filter = ['payment_method', 'billing_type']
+    date_hierarchy = 'day'
+    readonly_fields = [f.name for f in DailyRevenue._meta.fields]
@@ -5,3 +5,6 @@ class FinanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.finance'
     verbose_name = '财务管理'
+    
+    def ready(self):
+        from apps.finance import ledger, pricing, revenue  # noqa: F401
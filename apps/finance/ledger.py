@@ -0,0 +1,289 @@
+"""
+统一收费账本
+
+在线支付记录（payment.PaymentRecord）与收费记录（finance.Payment）统一记入同一本复式账：
+每张单据一条 LedgerEntry，单据上的每个业务事件记一借一贷两条 LedgerLine。
+
+    开单        借 应收学费   贷 课程收入
+    收款        借 实收资金   贷 应收学费
+    退款        借 课程收入   贷 实收资金
+    作废/减免   借 课程收入   贷 应收学费
+
+收入、退款按 (科目, 发生时间) 索引扫描实收资金科目，欠费按 (科目, 学员) 汇总应收学费科目，
+不再对两张来源表 UNION 去重。同一笔收款在两张表中都有记录时（订单号或交易号相同），
+以在线支付记录为准，收费记录不再入账。
+
+分录由单据当前状态整体重算：来源记录保存/删除时同步对应凭证，
+backfill_ledger 命令按主键分批流式回填（可重复执行）。凭证上冗余报表维度（计费模式、舞种、教师），
+重算后在同一事务内发送 ledger_changed 信号（重算前后的实收资金分录），供每日收入汇总（revenue）增量更新。
+"""
+
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.classes.models import Enrollment
+from apps.finance.models import LedgerEntry, LedgerLine, Payment
+from apps.finance.signals import ledger_changed
+from apps.payment.models import PaymentRecord
+
+ZERO = Decimal('0')
+
+# 业务事件对应的 (借方科目, 贷方科目)
+POSTINGS = {
+    'charge': ('receivable', 'revenue'),
+    'payment': ('cash', 'receivable'),
+    'refund': ('revenue', 'cash'),
+    'void': ('revenue', 'receivable'),
+}
+
+RECORD_FIELDS = ('pk', 'student_id', 'order_no', 'transaction_id', 'amount', 'payment_method', 'status',
+                 'paid_at', 'refunded_at', 'created_at', 'updated_at')
+PAYMENT_FIELDS = ('pk', 'student_id', 'order_no', 'transaction_id', 'amount', 'actual_amount',
+                  'refund_amount', 'payment_method', 'status', 'paid_at', 'refunded_at', 'created_at',
+                  'price_policy__billing_type', 'enrollment__price_policy__billing_type',
+                  'enrollment__course__class_type__dance_type_id', 'enrollment__course__teacher_id')
+
+
+def _record_dimensions(rows):
+    """在线支付记录的报表维度取自关联报名"""
+    enrollments = {
+        row['payment_record_id']: row for row in Enrollment.objects.filter(
+            payment_record_id__in=[row['pk'] for row in rows]
+        ).values('payment_record_id', 'price_policy__billing_type',
+                 'course__class_type__dance_type_id', 'course__teacher_id')
+    }
+    for row in rows:
+        enrollment = enrollments.get(row['pk'], {})
+        row['billing_type'] = enrollment.get('price_policy__billing_type') or ''
+        row['dance_type_id'] = enrollment.get('course__class_type__dance_type_id')
+        row['teacher_id'] = enrollment.get('course__teacher_id')
+    return rows
+
+
+def _payment_dimensions(rows):
+    """收费记录的报表维度：价格策略优先取收费记录上的，其次取关联报名的"""
+    for row in rows:
+        row['billing_type'] = (row['price_policy__billing_type']
+                               or row['enrollment__price_policy__billing_type'] or '')
+        row['dance_type_id'] = row['enrollment__course__class_type__dance_type_id']
+        row['teacher_id'] = row['enrollment__course__teacher_id']
+    return rows
+
+
+def record_events(row):
+    """在线支付记录的业务事件 [(类型, 金额, 发生时间)]"""
+    events = [('charge', row['amount'], row['created_at'])]
+    if row['status'] in ('paid', 'refunded'):
+        events.append(('payment', row['amount'], row['paid_at'] or row['updated_at']))
+    if row['status'] == 'refunded':
+        events.append(('refund', row['amount'], row['refunded_at'] or row['updated_at']))
+    elif row['status'] in ('failed', 'expired'):
+        events.append(('void', row['amount'], row['updated_at']))
+    return events
+
+
+def payment_events(row):
+    """收费记录的业务事件：实付少于应付的差额记减免"""
+    events = [('charge', row['amount'], row['created_at'])]
+    if row['status'] in ('paid', 'refunding', 'refunded'):
+        paid_at = row['paid_at'] or row['created_at']
+        events.append(('payment', row['actual_amount'], paid_at))
+        if row['actual_amount'] < row['amount']:
+            events.append(('void', row['amount'] - row['actual_amount'], paid_at))
+        if row['status'] == 'refunded':
+            events.append(('refund', row['refund_amount'] or row['actual_amount'],
+                           row['refunded_at'] or paid_at))
+    elif row['status'] == 'failed':
+        events.append(('void', row['amount'], row['created_at']))
+    return events
+
+
+def _post(entry_id, row, events):
+    lines = []
+    for kind, amount, occurred_at in events:
+        if not amount:
+            continue
+        debit_account, credit_account = POSTINGS[kind]
+        common = {'entry_id': entry_id, 'kind': kind, 'student_id': row['student_id'],
+                  'payment_method': row['payment_method'], 'occurred_at': occurred_at}
+        lines.append(LedgerLine(account=debit_account, debit=amount, credit=ZERO, **common))
+        lines.append(LedgerLine(account=credit_account, debit=ZERO, credit=amount, **common))
+    return lines
+
+
+# ledger_changed 信号中一条实收资金分录的字段
+CASH_LINE_FIELDS = ('occurred_at', 'payment_method', 'debit', 'credit', 'entry__billing_type',
+                    'entry__dance_type_id', 'entry__teacher_id')
+
+
+def _cash_lines(entries):
+    """凭证当前的实收资金分录（报表维度取自凭证）"""
+    return list(LedgerLine.objects.filter(entry__in=entries, account='cash').order_by()
+                .values_list(*CASH_LINE_FIELDS))
+
+
+def _sync(source, rows, events_of, removed_ids=()):
+    """按单据当前状态重算一批凭证和分录；removed_ids 为已删除或不再入账的来源ID"""
+    removed_ids = set(removed_ids)
+    removed_lines = []
+    added_lines = []
+    lines = []
+    with transaction.atomic():
+        if removed_ids:
+            removed = LedgerEntry.objects.filter(source=source, source_id__in=removed_ids)
+            removed_lines += _cash_lines(removed)
+            removed.delete()
+        if rows:
+            # 重算前的分录（维度取自更新前的凭证）
+            removed_lines += _cash_lines(LedgerEntry.objects.filter(
+                source=source, source_id__in=[row['pk'] for row in rows]))
+            entries = [
+                LedgerEntry(source=source, source_id=row['pk'], order_no=row['order_no'],
+                            transaction_id=row['transaction_id'], student_id=row['student_id'],
+                            amount=row['amount'], billing_type=row['billing_type'],
+                            dance_type_id=row['dance_type_id'], teacher_id=row['teacher_id'],
+                            created_at=row['created_at'])
+                for row in rows
+            ]
+            options = {'update_conflicts': True,
+                       'update_fields': ['order_no', 'transaction_id', 'student', 'amount', 'billing_type',
+                                         'dance_type_id', 'teacher_id', 'synced_at']}
+            if connection.features.supports_update_conflicts_with_target:
+                options['unique_fields'] = ['source', 'source_id']
+            LedgerEntry.objects.bulk_create(entries, **options)
+            entry_ids = dict(LedgerEntry.objects.filter(source=source,
+                                                        source_id__in=[row['pk'] for row in rows])
+                             .values_list('source_id', 'pk'))
+            LedgerLine.objects.filter(entry_id__in=entry_ids.values()).delete()
+            for row in rows:
+                posted = _post(entry_ids[row['pk']], row, events_of(row))
+                lines.extend(posted)
+                added_lines.extend(
+                    (line.occurred_at, line.payment_method, line.debit, line.credit, row['billing_type'],
+                     row['dance_type_id'], row['teacher_id'])
+                    for line in posted if line.account == 'cash'
+                )
+            LedgerLine.objects.bulk_create(lines, batch_size=1000)
+        if removed_lines or added_lines:
+            ledger_changed.send(sender=LedgerEntry, removed=removed_lines, added=added_lines)
+    return len(lines)
+
+
+def sync_payment_records(ids):
+    """同步在线支付记录的凭证，返回写入的分录数"""
+    ids = set(ids)
+    rows = _record_dimensions(list(PaymentRecord.objects.filter(pk__in=ids).values(*RECORD_FIELDS)))
+    removed = ids - {row['pk'] for row in rows}
+    with transaction.atomic():
+        written = _sync('payment_record', rows, record_events, removed)
+        # 与在线支付记录重复的收费记录凭证作废
+        duplicates = _duplicate_filter(rows)
+        if duplicates is not None:
+            stale = LedgerEntry.objects.filter(duplicates, source='finance_payment')
+            removed_lines = _cash_lines(stale)
+            if stale.delete()[0] and removed_lines:
+                ledger_changed.send(sender=LedgerEntry, removed=removed_lines, added=[])
+    return written
+
+
+def sync_finance_payments(ids):
+    """同步收费记录的凭证（与在线支付记录重复的不入账），返回写入的分录数"""
+    ids = set(ids)
+    rows = _payment_dimensions(list(Payment.objects.filter(pk__in=ids).values(*PAYMENT_FIELDS)))
+    duplicates = _duplicate_filter(rows)
+    duplicated = set()
+    if duplicates is not None:
+        matched = LedgerEntry.objects.filter(duplicates, source='payment_record').values_list(
+            'order_no', 'transaction_id')
+        order_nos = {order_no for order_no, _ in matched}
+        transaction_ids = {transaction_id for _, transaction_id in matched if transaction_id}
+        duplicated = {row['pk'] for row in rows
+                      if row['order_no'] in order_nos or row['transaction_id'] in transaction_ids}
+    kept = [row for row in rows if row['pk'] not in duplicated]
+    return _sync('finance_payment', kept, payment_events, ids - {row['pk'] for row in kept})
+
+
+def _duplicate_filter(rows):
+    if not rows:
+        return None
+    condition = Q(order_no__in=[row['order_no'] for row in rows])
+    transaction_ids = [row['transaction_id'] for row in rows if row['transaction_id']]
+    if transaction_ids:
+        condition |= Q(transaction_id__in=transaction_ids)
+    return condition
+
+
+@receiver(post_save, sender=PaymentRecord)
+@receiver(post_delete, sender=PaymentRecord)
+def _payment_record_changed(sender, instance, **kwargs):
+    sync_payment_records([instance.pk])
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def _finance_payment_changed(sender, instance, **kwargs):
+    sync_finance_payments([instance.pk])
+
+
+def _batches(model, batch_size):
+    last_pk = 0
+    while True:
+        batch = list(model.objects.filter(pk__gt=last_pk).order_by('pk')
+                     .values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
+
+
+def backfill_ledger(batch_size=1000, progress=None):
+    """按主键分批从两张来源表回填账本（先在线支付记录，再收费记录），返回 {来源: (单据数, 分录数)}"""
+    totals = {}
+    for source, model, sync in (('payment_record', PaymentRecord, sync_payment_records),
+                                ('finance_payment', Payment, sync_finance_payments)):
+        documents = lines = 0
+        for ids in _batches(model, batch_size):
+            lines += sync(ids)
+            documents += len(ids)
+            if progress:
+                progress(source, documents, lines)
+        # 来源记录已删除的凭证
+        live = model.objects.values('pk')
+        orphans = LedgerEntry.objects.filter(source=source).exclude(source_id__in=live)
+        with transaction.atomic():
+            removed_lines = _cash_lines(orphans)
+            if orphans.delete()[0] and removed_lines:
+                ledger_changed.send(sender=LedgerEntry, removed=removed_lines, added=[])
+        totals[source] = (documents, lines)
+    return totals
+
+
+def cash_summary(start=None, end=None, by_method=False):
+    """实收资金：收款、退款与净收入（按发生时间 [start, end)），可按支付方式分组"""
+    lines = LedgerLine.objects.filter(account='cash')
+    if start is not None:
+        lines = lines.filter(occurred_at__gte=start)
+    if end is not None:
+        lines = lines.filter(occurred_at__lt=end)
+    totals = {'received': Sum('debit'), 'refunded': Sum('credit')}
+    rows = (lines.values('payment_method').annotate(**totals).order_by('payment_method')
+            if by_method else [lines.aggregate(**totals)])
+    result = []
+    for row in rows:
+        received, refunded = row['received'] or ZERO, row['refunded'] or ZERO
+        result.append({**row, 'received': received, 'refunded': refunded, 'net': received - refunded})
+    return result if by_method else result[0]
+
+
+def outstanding_balances(student_id=None, limit=None):
+    """欠费（应收学费余额）大于0的学员：[{'student_id', 'balance'}]，按余额倒序"""
+    lines = LedgerLine.objects.filter(account='receivable')
+    if student_id is not None:
+        lines = lines.filter(student_id=student_id)
+    rows = (lines.values('student_id').annotate(balance=Sum('debit') - Sum('credit'))
+            .filter(balance__gt=0).order_by('-balance'))
+    return list(rows[:limit] if limit else rows)
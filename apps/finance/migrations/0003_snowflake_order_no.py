@@ -0,0 +1,19 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:13
+
+import apps.finance.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='order_no',
+            field=models.CharField(default=apps.finance.models.generate_order_no, max_length=50, unique=True, verbose_name='订单号'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0003_opening_credit_entries'),
+        ('finance', '0003_snowflake_order_no'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('payment_record', '在线支付记录'), ('finance_payment', '收费记录')], max_length=20, verbose_name='来源')),
+                ('source_id', models.BigIntegerField(verbose_name='来源记录ID')),
+                ('order_no', models.CharField(db_index=True, max_length=64, verbose_name='订单号')),
+                ('transaction_id', models.CharField(blank=True, db_index=True, max_length=128, null=True, verbose_name='交易号')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='单据金额')),
+                ('created_at', models.DateTimeField(verbose_name='开单时间')),
+                ('synced_at', models.DateTimeField(auto_now=True, verbose_name='同步时间')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='students.student', verbose_name='学员')),
+            ],
+            options={
+                'verbose_name': '账本凭证',
+                'verbose_name_plural': '账本凭证',
+                'db_table': 'ledger_entries',
+                'ordering': ['-created_at'],
+                'unique_together': {('source', 'source_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('charge', '开单'), ('payment', '收款'), ('refund', '退款'), ('void', '作废/减免')], max_length=20, verbose_name='业务类型')),
+                ('account', models.CharField(choices=[('receivable', '应收学费'), ('revenue', '课程收入'), ('cash', '实收资金')], max_length=20, verbose_name='科目')),
+                ('debit', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='借方')),
+                ('credit', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='贷方')),
+                ('payment_method', models.CharField(max_length=20, verbose_name='支付方式')),
+                ('occurred_at', models.DateTimeField(verbose_name='发生时间')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='finance.ledgerentry', verbose_name='凭证')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='students.student', verbose_name='学员')),
+            ],
+            options={
+                'verbose_name': '账本分录',
+                'verbose_name_plural': '账本分录',
+                'db_table': 'ledger_lines',
+                'ordering': ['occurred_at', 'id'],
+                'indexes': [models.Index(fields=['account', 'occurred_at'], name='ledger_line_account_774115_idx'), models.Index(fields=['account', 'student'], name='ledger_line_account_f7e920_idx')],
+            },
+        ),
+    ]
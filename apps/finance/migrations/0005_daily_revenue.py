@@ -0,0 +1,51 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_unified_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='billing_type',
+            field=models.CharField(blank=True, default='', max_length=20, verbose_name='计费模式'),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='dance_type_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='舞种ID'),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='teacher_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='授课教师ID'),
+        ),
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='日期')),
+                ('payment_method', models.CharField(max_length=20, verbose_name='支付方式')),
+                ('billing_type', models.CharField(blank=True, default='', max_length=20, verbose_name='计费模式')),
+                ('dance_type_id', models.BigIntegerField(default=0, help_text='0表示未关联', verbose_name='舞种ID')),
+                ('teacher_id', models.BigIntegerField(default=0, help_text='0表示未关联', verbose_name='教师ID')),
+                ('orders', models.IntegerField(default=0, verbose_name='收款笔数')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='收款金额')),
+                ('refund_count', models.IntegerField(default=0, verbose_name='退款笔数')),
+                ('refunds', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='退款金额')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '每日收入汇总',
+                'verbose_name_plural': '每日收入汇总',
+                'db_table': 'finance_daily_revenue',
+                'ordering': ['-day'],
+                'unique_together': {('day', 'payment_method', 'billing_type', 'dance_type_id', 'teacher_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.9 on 2026-10-18 15:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_daily_revenue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricepolicy',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='更新时间'),
+            preserve_default=False,
+        ),
+    ]
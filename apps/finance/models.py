@@ -1,6 +1,12 @@
 from django.db import models
 from apps.students.models import Student
 from apps.classes.models import Course, Enrollment
+from water_cube_studio.snowflake import next_order_no
+
+
+def generate_order_no():
+    """收费订单号"""
+    return next_order_no('ORD')
 
 
 class PricePolicy(models.Model):
@@ -24,6 +30,7 @@ class PricePolicy(models.Model):
     description = models.TextField('说明', null=True, blank=True)
     is_active = models.BooleanField('是否启用', default=True)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
     
     class Meta:
         verbose_name = '价格策略'
@@ -53,7 +60,7 @@ class Payment(models.Model):
         ('failed', '支付失败'),
     )
     
-    order_no = models.CharField('订单号', max_length=50, unique=True)
+    order_no = models.CharField('订单号', max_length=50, unique=True, default=generate_order_no)
     student = models.ForeignKey(Student, on_delete=models.PROTECT, verbose_name='学员')
     enrollment = models.ForeignKey(Enrollment, on_delete=models.SET_NULL, null=True, blank=True,
                                   verbose_name='关联报名')
@@ -76,6 +83,112 @@ class Payment(models.Model):
         db_table = 'payments'
         ordering = ['-created_at']
         app_label = 'finance'
+        indexes = [
+            # 游标分页：ORDER BY created_at DESC, id DESC
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['status', '-created_at']),
+        ]
     
     def __str__(self):
         return f"{self.order_no} - {self.student.real_name}"
+
+
+class LedgerEntry(models.Model):
+    """账本凭证（每张收费单据一条，来源为支付记录或收费记录）"""
+    
+    SOURCE_CHOICES = (
+        ('payment_record', '在线支付记录'),
+        ('finance_payment', '收费记录'),
+    )
+    
+    source = models.CharField('来源', max_length=20, choices=SOURCE_CHOICES)
+    source_id = models.BigIntegerField('来源记录ID')
+    order_no = models.CharField('订单号', max_length=64, db_index=True)
+    transaction_id = models.CharField('交易号', max_length=128, null=True, blank=True, db_index=True)
+    student = models.ForeignKey(Student, on_delete=models.PROTECT, verbose_name='学员')
+    amount = models.DecimalField('单据金额', max_digits=10, decimal_places=2)
+    # 报表维度（取自关联报名的价格策略、课程）
+    billing_type = models.CharField('计费模式', max_length=20, blank=True, default='')
+    dance_type_id = models.BigIntegerField('舞种ID', null=True, blank=True)
+    teacher_id = models.BigIntegerField('授课教师ID', null=True, blank=True)
+    created_at = models.DateTimeField('开单时间')
+    synced_at = models.DateTimeField('同步时间', auto_now=True)
+    
+    class Meta:
+        verbose_name = '账本凭证'
+        verbose_name_plural = verbose_name
+        db_table = 'ledger_entries'
+        unique_together = ['source', 'source_id']
+        ordering = ['-created_at']
+        app_label = 'finance'
+    
+    def __str__(self):
+        return f"{self.order_no} - {self.get_source_display()}"
+
+
+class LedgerLine(models.Model):
+    """账本分录（复式记账：每个业务事件一借一贷）"""
+    
+    ACCOUNT_CHOICES = (
+        ('receivable', '应收学费'),
+        ('revenue', '课程收入'),
+        ('cash', '实收资金'),
+    )
+    
+    KIND_CHOICES = (
+        ('charge', '开单'),
+        ('payment', '收款'),
+        ('refund', '退款'),
+        ('void', '作废/减免'),
+    )
+    
+    entry = models.ForeignKey(LedgerEntry, on_delete=models.CASCADE, related_name='lines', verbose_name='凭证')
+    kind = models.CharField('业务类型', max_length=20, choices=KIND_CHOICES)
+    account = models.CharField('科目', max_length=20, choices=ACCOUNT_CHOICES)
+    debit = models.DecimalField('借方', max_digits=10, decimal_places=2, default=0)
+    credit = models.DecimalField('贷方', max_digits=10, decimal_places=2, default=0)
+    student = models.ForeignKey(Student, on_delete=models.PROTECT, related_name='+', verbose_name='学员')
+    payment_method = models.CharField('支付方式', max_length=20)
+    occurred_at = models.DateTimeField('发生时间')
+    
+    class Meta:
+        verbose_name = '账本分录'
+        verbose_name_plural = verbose_name
+        db_table = 'ledger_lines'
+        ordering = ['occurred_at', 'id']
+        app_label = 'finance'
+        indexes = [
+            # 收入/退款：按科目和时间范围扫描
+            models.Index(fields=['account', 'occurred_at']),
+            # 欠费：按科目和学员汇总
+            models.Index(fields=['account', 'student']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_account_display()} 借{self.debit} 贷{self.credit}"
+
+
+class DailyRevenue(models.Model):
+    """每日收入汇总（按支付方式、计费模式、舞种、教师）"""
+    
+    day = models.DateField('日期')
+    payment_method = models.CharField('支付方式', max_length=20)
+    billing_type = models.CharField('计费模式', max_length=20, blank=True, default='')
+    dance_type_id = models.BigIntegerField('舞种ID', default=0, help_text='0表示未关联')
+    teacher_id = models.BigIntegerField('教师ID', default=0, help_text='0表示未关联')
+    orders = models.IntegerField('收款笔数', default=0)
+    revenue = models.DecimalField('收款金额', max_digits=12, decimal_places=2, default=0)
+    refund_count = models.IntegerField('退款笔数', default=0)
+    refunds = models.DecimalField('退款金额', max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+    
+    class Meta:
+        verbose_name = '每日收入汇总'
+        verbose_name_plural = verbose_name
+        db_table = 'finance_daily_revenue'
+        unique_together = ['day', 'payment_method', 'billing_type', 'dance_type_id', 'teacher_id']
+        ordering = ['-day']
+        app_label = 'finance'
+    
+    def __str__(self):
+        return f"{self.day} - {self.payment_method} - {self.revenue}"
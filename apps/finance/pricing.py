@@ -0,0 +1,230 @@
+"""
+报价引擎
+
+启用的价格策略编译为进程内规则表（{策略ID: PriceRule}），报价只做内存计算，不访问数据库：
+
+    次卡     price（含 sessions 课次）
+    月卡     price × 月数，月数 = ceil(课程天数 / 有效期天数，默认30天)
+    学期制   price
+    按课时   unit_price × 课程总课次
+    以上再乘策略折扣 discount；策略 price 为0时按 unit_price × 课次计价。
+
+购物车同时报名多门课程时按 PRICING_MULTI_COURSE_DISCOUNTS（如 "2:0.95,3:0.90"，课程数:折扣）
+在各项折后价合计上再打折，折扣额按金额比例分摊到各项。
+
+规则表失效：价格策略保存/删除时清空本进程规则表；其他进程每 PRICING_RULES_CHECK_INTERVAL 秒
+读一次策略表指纹（条数、最大ID、最近修改时间），与编译时不一致时重新编译。指纹直接读库，
+不依赖共享缓存（未开启Redis时各进程的本地缓存互不可见）。
+"""
+
+import math
+import threading
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.finance.models import PricePolicy
+
+CENT = Decimal('0.01')
+DEFAULT_PERIOD_DAYS = 30
+
+
+class PricingError(Exception):
+    """无法报价（策略不存在或已停用、策略配置不完整）"""
+
+
+def _money(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class PriceRule:
+    """编译后的价格策略"""
+    __slots__ = ('policy_id', 'name', 'billing_type', 'price', 'unit_price', 'sessions', 'discount',
+                 'validity_days')
+
+    def __init__(self, policy_id, name, billing_type, price, unit_price, sessions, discount, validity_days):
+        self.policy_id = policy_id
+        self.name = name
+        self.billing_type = billing_type
+        self.price = Decimal(price)
+        self.unit_price = Decimal(unit_price)
+        self.sessions = sessions
+        self.discount = Decimal(discount)
+        self.validity_days = validity_days
+
+    def list_price(self, total_sessions, course_days):
+        """课程的原价与购买课次"""
+        if self.billing_type == 'hourly' or not self.price:
+            return self.unit_price * total_sessions, total_sessions
+        if self.billing_type == 'session_card':
+            return self.price, self.sessions or total_sessions
+        if self.billing_type == 'monthly':
+            months = max(1, math.ceil(course_days / (self.validity_days or DEFAULT_PERIOD_DAYS)))
+            return self.price * months, total_sessions
+        return self.price, total_sessions
+
+
+class Quote:
+    """单项报价"""
+    __slots__ = ('course_id', 'policy_id', 'billing_type', 'classes', 'list_price', 'amount', 'basket_discount')
+
+    def __init__(self, course_id, policy_id, billing_type, classes, list_price, amount):
+        self.course_id = course_id
+        self.policy_id = policy_id
+        self.billing_type = billing_type
+        self.classes = classes
+        self.list_price = list_price
+        self.amount = amount
+        self.basket_discount = Decimal('0.00')
+
+    def as_dict(self):
+        return {'course': self.course_id, 'policy': self.policy_id, 'billing_type': self.billing_type,
+                'classes': self.classes, 'list_price': self.list_price,
+                'basket_discount': self.basket_discount, 'amount': self.amount}
+
+
+def parse_multi_course_discounts(value):
+    """'2:0.95,3:0.90' → [(3, Decimal('0.90')), (2, Decimal('0.95'))]（课程数从多到少）"""
+    tiers = []
+    for item in (value or '').split(','):
+        if item.strip():
+            count, rate = item.split(':')
+            tiers.append((int(count), Decimal(rate.strip())))
+    return sorted(tiers, reverse=True)
+
+
+class RuleTable:
+    """进程内规则表"""
+
+    def __init__(self, rules, multi_course_discounts, version):
+        self.rules = rules
+        self.multi_course_discounts = multi_course_discounts
+        self.version = version
+        self.checked_at = time.monotonic()
+
+    def rule(self, policy_id):
+        rule = self.rules.get(policy_id)
+        if rule is None:
+            raise PricingError(f'价格策略不存在或已停用: {policy_id}')
+        return rule
+
+    def basket_rate(self, course_count):
+        for count, rate in self.multi_course_discounts:
+            if course_count >= count:
+                return rate
+        return Decimal('1')
+
+
+_table = None
+_lock = threading.Lock()
+
+
+def _current_version():
+    """策略表指纹：新增、修改、删除策略都会改变"""
+    row = PricePolicy.objects.aggregate(count=Count('pk'), last_id=Max('pk'), updated=Max('updated_at'))
+    return row['count'], row['last_id'], row['updated']
+
+
+def compile_rules():
+    """从启用的价格策略编译规则表"""
+    version = _current_version()
+    rules = {
+        row[0]: PriceRule(*row) for row in PricePolicy.objects.filter(is_active=True).values_list(
+            'pk', 'name', 'billing_type', 'price', 'unit_price', 'sessions', 'discount', 'validity_days')
+    }
+    return RuleTable(rules, parse_multi_course_discounts(settings.PRICING_MULTI_COURSE_DISCOUNTS), version)
+
+
+def rule_table():
+    """当前规则表：本进程未编译或其他进程修改过策略时重新编译"""
+    global _table
+    table = _table
+    if table is not None and time.monotonic() - table.checked_at < settings.PRICING_RULES_CHECK_INTERVAL:
+        return table
+    with _lock:
+        table = _table
+        if table is None or table.version != _current_version():
+            table = _table = compile_rules()
+        else:
+            table.checked_at = time.monotonic()
+    return table
+
+
+def invalidate_rules():
+    """价格策略变更：清空本进程规则表（其他进程按指纹发现变更）"""
+    global _table
+    _table = None
+
+
+@receiver(post_save, sender=PricePolicy)
+@receiver(post_delete, sender=PricePolicy)
+def _policy_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_rules)
+
+
+def quote(policy_id, course, table=None):
+    """
+    按策略为课程报价
+
+    course 只读取 pk、total_sessions、start_date、end_date，可以是模型实例或同名属性的对象。
+    """
+    table = table or rule_table()
+    rule = table.rule(policy_id)
+    course_days = (course.end_date - course.start_date).days + 1
+    list_price, classes = rule.list_price(course.total_sessions, course_days)
+    if list_price <= 0:
+        raise PricingError(f'价格策略未配置价格: {rule.name}')
+    return Quote(course.pk, policy_id, rule.billing_type, classes, _money(list_price),
+                 _money(list_price * rule.discount))
+
+
+def quote_enrollment(enrollment):
+    """报名的应付金额：报名上单独约定的金额优先，否则按价格策略报价（需已加载 course）"""
+    if enrollment.amount and enrollment.amount > 0:
+        return _money(Decimal(enrollment.amount))
+    if enrollment.price_policy_id is None:
+        raise PricingError('报名未指定价格策略')
+    return quote(enrollment.price_policy_id, enrollment.course).amount
+
+
+def quote_basket(items):
+    """
+    购物车报价，items 为 [(policy_id, course)]
+
+    返回 {'items': [Quote], 'subtotal', 'basket_discount', 'total'}；同一课程只计一次课程数。
+    """
+    table = rule_table()
+    quotes = [quote(policy_id, course, table) for policy_id, course in items]
+    subtotal = sum((item.amount for item in quotes), Decimal('0.00'))
+    rate = table.basket_rate(len({item.course_id for item in quotes}))
+    total = _money(subtotal * rate)
+    discount = subtotal - total
+    if discount:
+        # 折扣额按金额比例分摊，尾差计入最后一项
+        remaining = discount
+        for item in quotes[:-1]:
+            share = _money(discount * item.amount / subtotal)
+            item.basket_discount, item.amount = share, item.amount - share
+            remaining -= share
+        quotes[-1].basket_discount, quotes[-1].amount = remaining, quotes[-1].amount - remaining
+    return {'items': quotes, 'subtotal': subtotal, 'basket_discount': discount, 'total': total}
+
+
+def quote_catalog(courses):
+    """课程目录报价：每门课程 × 每个启用的策略，返回 [{'course', 'name', 'quotes': [...]}]"""
+    table = rule_table()
+    catalog = []
+    for course in courses:
+        quotes = []
+        for policy_id in table.rules:
+            try:
+                quotes.append(quote(policy_id, course, table).as_dict())
+            except PricingError:
+                continue
+        catalog.append({'course': course.pk, 'name': getattr(course, 'name', None), 'quotes': quotes})
+    return catalog
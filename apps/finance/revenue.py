@@ -0,0 +1,192 @@
+"""
+每日收入汇总
+
+按 (日期, 支付方式, 计费模式, 舞种, 教师) 汇总账本实收资金科目的收款、退款金额与笔数，
+写入 DailyRevenue。报表维度取自凭证（ledger 同步时从关联报名冗余），未关联的舞种、教师记为0。
+
+账本凭证重算时（ledger_changed 信号，与凭证同一事务）按重算前后的分录差额以 F() 增减受影响的汇总行，
+不重扫当天账本；并发的结算按汇总行的行锁先后叠加，差额可交换，互不覆盖。
+backfill_revenue 命令把历史日期切块，多线程并行重建：重建前锁住该日期范围的汇总行，
+重建期间的增量更新等重建提交后再叠加。看板接口只读汇总表，任意日期范围按 day 索引扫描，每天至多几十行。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F, Max, Min, Sum
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.classes.models import DanceType
+from apps.finance.models import DailyRevenue, LedgerLine
+from apps.finance.signals import ledger_changed
+from apps.teachers.models import Teacher
+
+ZERO = Decimal('0')
+
+DIMENSIONS = {
+    'day': 'day',
+    'payment_method': 'payment_method',
+    'billing_type': 'billing_type',
+    'dance_type': 'dance_type_id',
+    'teacher': 'teacher_id',
+}
+MEASURES = ('orders', 'revenue', 'refund_count', 'refunds')
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+KEY_FIELDS = ('day', 'payment_method', 'billing_type', 'dance_type_id', 'teacher_id')
+
+
+def _accumulate(rows, lines, sign=1):
+    """把实收资金分录 [(发生时间, 支付方式, 借方, 贷方, 计费模式, 舞种ID, 教师ID)] 按 sign 计入 {键: {指标}}"""
+    for occurred_at, method, debit, credit, billing_type, dance_type_id, teacher_id in lines:
+        key = (timezone.localdate(occurred_at), method, billing_type, dance_type_id or 0, teacher_id or 0)
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = {'orders': 0, 'revenue': ZERO, 'refund_count': 0, 'refunds': ZERO}
+        if debit:
+            row['orders'] += sign
+            row['revenue'] += sign * debit
+        if credit:
+            row['refund_count'] += sign
+            row['refunds'] += sign * credit
+    return rows
+
+
+def build_revenue(start, end):
+    """从账本计算 [start, end) 日期内的汇总行 {键: {指标}}"""
+    lines = LedgerLine.objects.filter(
+        account='cash', occurred_at__gte=_day_start(start), occurred_at__lt=_day_start(end),
+    ).order_by().values_list('occurred_at', 'payment_method', 'debit', 'credit',
+                             'entry__billing_type', 'entry__dance_type_id', 'entry__teacher_id')
+    return _accumulate({}, lines.iterator(chunk_size=5000))
+
+
+def apply_deltas(deltas):
+    """按 {键: {指标差额}} 增减汇总行（在调用方事务内），返回变动的行数"""
+    now = timezone.now()
+    changed = 0
+    # 按键排序加锁，并发的结算不会互相死锁
+    for key in sorted(deltas):
+        values = deltas[key]
+        if not any(values.values()):
+            continue
+        lookup = dict(zip(KEY_FIELDS, key))
+        increments = {measure: F(measure) + values[measure] for measure in MEASURES}
+        changed += 1
+        if DailyRevenue.objects.filter(**lookup).update(updated_at=now, **increments):
+            continue
+        try:
+            with transaction.atomic():
+                DailyRevenue.objects.create(**lookup, **values)
+        except IntegrityError:
+            # 并发的结算先插入了该行
+            DailyRevenue.objects.filter(**lookup).update(updated_at=now, **increments)
+    return changed
+
+
+def rebuild_range(start, end):
+    """重算 [start, end) 日期的汇总行，返回写入的行数"""
+    with transaction.atomic():
+        # 先锁住范围内的汇总行（MySQL 一并锁住间隙），并发的增量更新等本次重建提交后再叠加
+        existing = {
+            tuple(key): pk for pk, *key in DailyRevenue.objects.select_for_update()
+            .filter(day__gte=start, day__lt=end).order_by().values_list('pk', *KEY_FIELDS)
+        }
+        rows = build_revenue(start, end)
+        objs = [DailyRevenue(**dict(zip(KEY_FIELDS, key)), **values) for key, values in rows.items()]
+        options = {'update_conflicts': True, 'update_fields': [*MEASURES, 'updated_at']}
+        if connection.features.supports_update_conflicts_with_target:
+            options['unique_fields'] = list(KEY_FIELDS)
+        DailyRevenue.objects.bulk_create(objs, batch_size=1000, **options)
+        # 该维度当天已无收支的行删除
+        DailyRevenue.objects.filter(pk__in=[pk for key, pk in existing.items() if key not in rows]).delete()
+    return len(objs)
+
+
+@receiver(ledger_changed)
+def _on_ledger_changed(sender, removed=(), added=(), **kwargs):
+    deltas = _accumulate({}, removed, sign=-1)
+    apply_deltas(_accumulate(deltas, added))
+
+
+def _rebuild_chunk(start, end):
+    try:
+        return start, rebuild_range(start, end)
+    finally:
+        close_old_connections()
+
+
+def backfill_revenue(start=None, end=None, chunk_days=31, workers=4, progress=None):
+    """
+    按日期切块并行重建 [start, end] 的汇总，返回 (天数, 汇总行数)
+
+    未指定范围时覆盖账本全部实收资金分录，并清理范围外的汇总行。
+    """
+    full = start is None and end is None
+    if start is None or end is None:
+        bounds = LedgerLine.objects.filter(account='cash').aggregate(first=Min('occurred_at'),
+                                                                      last=Max('occurred_at'))
+        if bounds['first'] is None:
+            if full:
+                DailyRevenue.objects.all().delete()
+            return 0, 0
+        start = start or timezone.localdate(bounds['first'])
+        end = end or timezone.localdate(bounds['last'])
+    end = end + timedelta(days=1)
+    chunks = []
+    day = start
+    while day < end:
+        chunks.append((day, min(day + timedelta(days=chunk_days), end)))
+        day = chunks[-1][1]
+
+    written = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='revenue-backfill') as pool:
+        for chunk_start, rows in pool.map(lambda chunk: _rebuild_chunk(*chunk), chunks):
+            written += rows
+            if progress:
+                progress(chunk_start, rows)
+    if full:
+        DailyRevenue.objects.exclude(day__gte=start, day__lt=end).delete()
+    return (end - start).days, written
+
+
+def revenue_report(start=None, end=None, group_by=()):
+    """
+    按汇总表统计 [start, end] 日期的收入
+
+    返回 {'total': {指标, 'net'}, 'rows': [{维度..., 指标, 'net'}]}，
+    group_by 为 DIMENSIONS 中的维度，舞种、教师附带名称。
+    """
+    queryset = DailyRevenue.objects.all()
+    if start is not None:
+        queryset = queryset.filter(day__gte=start)
+    if end is not None:
+        queryset = queryset.filter(day__lte=end)
+    totals = {measure: Sum(measure) for measure in MEASURES}
+    fields = [DIMENSIONS[name] for name in group_by]
+    rows = list(queryset.values(*fields).annotate(**totals).order_by(*fields)) if fields else []
+    total = queryset.aggregate(**totals)
+
+    dance_types = teachers = {}
+    if 'dance_type' in group_by:
+        dance_types = dict(DanceType.objects.filter(
+            pk__in={row['dance_type_id'] for row in rows}).values_list('pk', 'name'))
+    if 'teacher' in group_by:
+        teachers = dict(Teacher.objects.filter(
+            pk__in={row['teacher_id'] for row in rows}).values_list('pk', 'real_name'))
+    for row in [total, *rows]:
+        for measure in MEASURES:
+            row[measure] = row[measure] or (0 if measure in ('orders', 'refund_count') else ZERO)
+        row['net'] = row['revenue'] - row['refunds']
+        if 'dance_type_id' in row:
+            row['dance_type_name'] = dance_types.get(row['dance_type_id'])
+        if 'teacher_id' in row:
+            row['teacher_name'] = teachers.get(row['teacher_id'])
+    return {'total': total, 'rows': rows}
@@ -0,0 +1,11 @@
+"""
+财务信号
+
+ledger_changed 在账本凭证重算（来源单据保存、删除或回填）后、同一事务内发送，
+参数 removed、added 为重算前后的实收资金分录
+[(发生时间, 支付方式, 借方, 贷方, 计费模式, 舞种ID, 教师ID)]。
+"""
+
+from django.dispatch import Signal
+
+ledger_changed = Signal()
@@ -0,0 +1,97 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.finance.ledger import backfill_ledger, cash_summary, sync_finance_payments, sync_payment_records
+from apps.finance.models import DailyRevenue, LedgerEntry, LedgerLine, Payment
+from apps.finance.revenue import KEY_FIELDS, MEASURES, build_revenue
+from apps.payment.models import PaymentRecord
+from apps.students.models import Student
+from apps.users.models import User
+
+
+def aware(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class LedgerTests(TestCase):
+    """收费账本：借贷平衡、重复同步不重复记账、收入汇总与账本一致"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = Student.objects.create(user=User.objects.create(username='student'), student_no='S001',
+                                             real_name='学员')
+
+    def setUp(self):
+        self.paid = PaymentRecord.objects.create(student=self.student, amount=Decimal('200.00'),
+                                                 payment_method='alipay_web', status='paid',
+                                                 transaction_id='T001', paid_at=aware(2026, 9, 1, 10))
+        self.refunded = PaymentRecord.objects.create(student=self.student, amount=Decimal('300.00'),
+                                                     payment_method='wechat', status='refunded',
+                                                     paid_at=aware(2026, 9, 1, 11),
+                                                     refunded_at=aware(2026, 9, 2, 9))
+        self.expired = PaymentRecord.objects.create(student=self.student, amount=Decimal('100.00'),
+                                                    payment_method='alipay_web', status='expired')
+        # 实付少于应付，差额记减免
+        self.discounted = Payment.objects.create(student=self.student, amount=Decimal('500.00'),
+                                                 actual_amount=Decimal('450.00'), payment_method='cash',
+                                                 status='paid', paid_at=aware(2026, 9, 1, 12))
+        # 与在线支付记录是同一笔收款
+        self.duplicate = Payment.objects.create(student=self.student, amount=Decimal('200.00'),
+                                                actual_amount=Decimal('200.00'), payment_method='alipay',
+                                                status='paid', transaction_id='T001',
+                                                paid_at=aware(2026, 9, 1, 10))
+
+    def _lines(self):
+        return sorted(LedgerLine.objects.values_list('entry__source', 'entry__source_id', 'kind', 'account',
+                                                     'debit', 'credit'))
+
+    def _revenue(self):
+        # 增量更新减到0的行保留，不影响报表
+        return {
+            tuple(row[field] for field in KEY_FIELDS): {measure: row[measure] for measure in MEASURES}
+            for row in DailyRevenue.objects.values(*KEY_FIELDS, *MEASURES)
+            if any(row[measure] for measure in MEASURES)
+        }
+
+    def test_every_entry_balances(self):
+        entries = LedgerEntry.objects.annotate(debit=Sum('lines__debit'), credit=Sum('lines__credit'))
+        self.assertEqual(entries.count(), 4)
+        for entry in entries:
+            self.assertEqual(entry.debit, entry.credit, entry.order_no)
+        # 每个业务事件一借一贷
+        kinds = LedgerLine.objects.values('entry_id', 'kind').annotate(n=Count('pk'))
+        self.assertEqual({row['n'] for row in kinds}, {2})
+
+    def test_events_are_posted(self):
+        self.assertEqual(cash_summary(), {'received': Decimal('950.00'), 'refunded': Decimal('300.00'),
+                                          'net': Decimal('650.00')})
+        discounted = LedgerLine.objects.filter(entry__source='finance_payment',
+                                               entry__source_id=self.discounted.pk, kind='void')
+        self.assertEqual(discounted.aggregate(total=Sum('debit'))['total'], Decimal('50.00'))
+        self.assertFalse(LedgerEntry.objects.filter(source='finance_payment', source_id=self.duplicate.pk)
+                         .exists())
+
+    def test_resync_does_not_duplicate_lines(self):
+        lines = self._lines()
+        revenue = self._revenue()
+        records = [self.paid.pk, self.refunded.pk, self.expired.pk]
+        payments = [self.discounted.pk, self.duplicate.pk]
+        for _ in range(2):
+            sync_payment_records(records)
+            sync_finance_payments(payments)
+        backfill_ledger()
+        self.assertEqual(self._lines(), lines)
+        self.assertEqual(LedgerEntry.objects.count(), 4)
+        self.assertEqual(self._revenue(), revenue)
+
+    def test_daily_revenue_follows_ledger(self):
+        self.paid.status = 'refunded'
+        self.paid.refunded_at = aware(2026, 9, 3, 9)
+        self.paid.save()
+        self.discounted.delete()
+        expected = build_revenue(date(2026, 1, 1), date(2027, 1, 1))
+        self.assertEqual(self._revenue(), expected)
@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PricePolicyViewSet, PaymentViewSet
+from .views import PricePolicyViewSet, PaymentViewSet, LedgerViewSet
 
 router = DefaultRouter()
 router.register(r'price-policies', PricePolicyViewSet, basename='pricepolicy')
 router.register(r'payments', PaymentViewSet, basename='payment')
+router.register(r'ledger', LedgerViewSet, basename='ledger')
 
 urlpatterns = [
     path('', include(router.urls)),
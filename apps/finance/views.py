@@ -1,5 +1,16 @@
-from rest_framework import viewsets
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from apps.finance.ledger import cash_summary, outstanding_balances
+from apps.classes.models import Course
 from apps.finance.models import PricePolicy, Payment
+from apps.finance.pricing import PricingError, quote_basket, quote_catalog
+from apps.finance.revenue import DIMENSIONS, revenue_report
+from water_cube_studio.pagination import HybridPagination
 from .serializers import PricePolicySerializer, PaymentSerializer
 
 
@@ -7,6 +18,36 @@ class PricePolicyViewSet(viewsets.ModelViewSet):
     """价格策略视图集"""
     queryset = PricePolicy.objects.filter(is_active=True)
     serializer_class = PricePolicySerializer
+    
+    @action(detail=False, methods=['get'])
+    def catalog(self, request):
+        """期次课程目录报价（每门课程 × 每个启用的策略）：?term=第1期"""
+        term = request.query_params.get('term')
+        if not term:
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        courses = (Course.objects.filter(term=term).exclude(status='cancelled')
+                   .only('pk', 'name', 'total_sessions', 'start_date', 'end_date').order_by('pk'))
+        return Response(quote_catalog(courses))
+    
+    @action(detail=False, methods=['post'])
+    def quote(self, request):
+        """购物车报价：{"items": [{"course": 课程ID, "policy": 策略ID}, ...]}，含多课程折扣"""
+        try:
+            items = [(int(item['policy']), int(item['course'])) for item in request.data.get('items') or []]
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        if not items:
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        courses = Course.objects.only('pk', 'total_sessions', 'start_date', 'end_date').in_bulk(
+            {course_id for _, course_id in items})
+        try:
+            result = quote_basket([(policy_id, courses[course_id]) for policy_id, course_id in items])
+        except KeyError:
+            return Response({'error': '课程不存在'}, status=status.HTTP_400_BAD_REQUEST)
+        except PricingError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        result['items'] = [item.as_dict() for item in result['items']]
+        return Response(result)
 
 
 class PaymentViewSet(viewsets.ModelViewSet):
@@ -14,3 +55,57 @@ class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.select_related('student', 'price_policy').all()
     serializer_class = PaymentSerializer
     filterset_fields = ['status', 'payment_method', 'student']
+    pagination_class = HybridPagination
+    cursor_ordering = ('-created_at', '-id')
+
+
+def _day_start(value):
+    """'YYYY-MM-DD' 转为当日0点（本地时区）"""
+    return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+
+
+class LedgerViewSet(viewsets.ViewSet):
+    """统一收费账本查询"""
+    permission_classes = [IsAdminUser]
+    
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """收款、退款与净收入：?start=2025-01-01&end=2025-01-31&by_method=1（日期含首尾）"""
+        try:
+            start = request.query_params.get('start')
+            end = request.query_params.get('end')
+            start = _day_start(start) if start else None
+            end = _day_start(end) + timedelta(days=1) if end else None
+        except ValueError:
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        by_method = request.query_params.get('by_method') in ('1', 'true')
+        return Response(cash_summary(start, end, by_method=by_method))
+    
+    @action(detail=False, methods=['get'])
+    def outstanding(self, request):
+        """欠费学员：?student=学员ID&limit=100"""
+        try:
+            student_id = request.query_params.get('student')
+            student_id = int(student_id) if student_id else None
+            limit = min(int(request.query_params.get('limit', 100)), 1000)
+        except ValueError:
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(outstanding_balances(student_id, limit=limit))
+    
+    @action(detail=False, methods=['get'])
+    def dashboard(self, request):
+        """收入看板（读每日汇总）：?start=2025-01-01&end=2025-12-31&group_by=day,payment_method
+        
+        group_by 可选 day、payment_method、billing_type、dance_type、teacher，逗号分隔
+        """
+        try:
+            start = request.query_params.get('start')
+            end = request.query_params.get('end')
+            start = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+            end = datetime.strptime(end, '%Y-%m-%d').date() if end else None
+        except ValueError:
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        group_by = [name for name in request.query_params.get('group_by', '').split(',') if name]
+        if any(name not in DIMENSIONS for name in group_by):
+            return Response({'error': '参数错误'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(revenue_report(start, end, group_by=group_by))
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import AlipayConfig, WeChatPayConfig, HuPiPayConfig
+from .models import AlipayConfig, WeChatPayConfig, HuPiPayConfig, PaymentNotification, RefundRequest
+from .refunds import cancel_refunds, resubmit_refunds
 
 @admin.register(AlipayConfig)
 class AlipayConfigAdmin(admin.ModelAdmin):
@@ -65,3 +66,40 @@ class HuPiPayConfigAdmin(admin.ModelAdmin):
             'fields': ('is_active',)
         }),
     )
+
+
+@admin.register(PaymentNotification)
+class PaymentNotificationAdmin(admin.ModelAdmin):
+    """支付通知管理"""
+    list_display = ['order_no', 'gateway', 'event', 'status', 'attempts', 'next_retry_at', 'created_at']
+    list_filter = ['gateway', 'event', 'status', 'created_at']
+    search_fields = ['order_no', 'transaction_id']
+    readonly_fields = ['gateway', 'order_no', 'event', 'transaction_id', 'amount', 'payload',
+                       'attempts', 'last_error', 'created_at', 'processed_at']
+
+
+@admin.register(RefundRequest)
+class RefundRequestAdmin(admin.ModelAdmin):
+    """退款申请管理（由报名管理的“申请退款”或 process_refunds --course 创建）"""
+    list_display = ['refund_no', 'enrollment', 'amount', 'status', 'attempts', 'next_retry_at', 'created_at',
+                    'completed_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['refund_no', 'payment_record__order_no', 'enrollment__student__real_name']
+    readonly_fields = [f.name for f in RefundRequest._meta.fields]
+    
+    actions = ['resubmit', 'cancel']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def resubmit(self, request, queryset):
+        """退款失败的申请重新排队"""
+        count = resubmit_refunds(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f'已重新排队 {count} 条退款申请')
+    resubmit.short_description = '重新提交退款失败的申请'
+    
+    def cancel(self, request, queryset):
+        """撤销尚未退款的申请，报名恢复为已支付"""
+        count = cancel_refunds(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f'已撤销 {count} 条退款申请')
+    cancel.short_description = '撤销选中的退款申请'
@@ -5,3 +5,6 @@ class PaymentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.payment'
     verbose_name = '支付管理'
+    
+    def ready(self):
+        from apps.payment import credentials, status  # noqa: F401
@@ -0,0 +1,179 @@
+"""
+支付网关配置缓存
+
+每个进程按网关缓存当前启用的 AlipayConfig / WeChatPayConfig / HuPiPayConfig，
+RSA 密钥只解析一次（支付宝商户私钥在首次签名时解析，回调验签只需支付宝公钥），
+验签、签名直接使用解析好的密钥对象，回调与查询不再逐次查库、解析 PEM。
+
+热更新：后台修改、启停或删除配置时清空本进程缓存；其他进程每 PAYMENT_GATEWAY_CONFIG_CHECK_INTERVAL 秒
+读一次该网关配置表的指纹（条数、最大ID、最近修改时间），与加载时不一致时重新加载。指纹直接读库，
+不依赖共享缓存（未开启Redis时各进程的本地缓存互不可见）。
+"""
+
+import base64
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.payment.models import AlipayConfig, HuPiPayConfig, WeChatPayConfig
+
+
+class ConfigMissing(Exception):
+    """网关未配置（没有启用的配置）"""
+
+
+def _with_markers(key, begin, end):
+    key = key.strip()
+    if begin not in key:
+        key = f'{begin}\n{key}'
+    if end not in key:
+        key = f'{key}\n{end}'
+    return key
+
+
+def load_private_key(key):
+    """
+    解析 RSA 私钥：PKCS#1（BEGIN RSA PRIVATE KEY）或 PKCS#8（BEGIN PRIVATE KEY，支付宝密钥工具默认），
+    可带或不带 PEM 首尾行；无法解析时抛出 ConfigMissing
+    """
+    import rsa
+    from pyasn1.codec.der import decoder
+
+    body = ''.join(line.strip() for line in (key or '').strip().splitlines() if not line.startswith('-----'))
+    if not body:
+        raise ConfigMissing('未配置商户私钥')
+    try:
+        der = base64.b64decode(body, validate=True)
+        try:
+            return rsa.PrivateKey.load_pkcs1(der, 'DER')
+        except Exception:
+            # PKCS#8 PrivateKeyInfo：SEQUENCE { 版本, 算法标识, OCTET STRING（PKCS#1 私钥）}
+            info, _ = decoder.decode(der)
+            return rsa.PrivateKey.load_pkcs1(bytes(info[2]), 'DER')
+    except Exception as e:
+        raise ConfigMissing(f'商户私钥无法解析，需为 PKCS#1 或 PKCS#8 格式的 RSA 私钥: {e}')
+
+
+class AlipayCredentials:
+    """支付宝配置（支付宝公钥已解析，商户私钥首次签名时解析）"""
+    gateway = 'alipay'
+
+    def __init__(self, config):
+        import rsa
+
+        self.app_id = config.app_id
+        self.notify_url = config.notify_url
+        self.return_url = config.return_url
+        self._private_key_pem = config.private_key
+        self._private_key = None
+        try:
+            self.public_key = rsa.PublicKey.load_pkcs1_openssl_pem(_with_markers(
+                config.alipay_public_key, '-----BEGIN PUBLIC KEY-----', '-----END PUBLIC KEY-----'))
+        except Exception as e:
+            raise ConfigMissing(f'支付宝公钥无法解析: {e}')
+
+    @property
+    def private_key(self):
+        """商户私钥（首次使用时解析），无法解析时抛出 ConfigMissing"""
+        if self._private_key is None:
+            self._private_key = load_private_key(self._private_key_pem)
+        return self._private_key
+
+    def sign(self, content):
+        """RSA2 签名（商户私钥），私钥无法解析时抛出 ConfigMissing"""
+        import rsa
+        return base64.b64encode(rsa.sign(content.encode('utf-8'), self.private_key, 'SHA-256')).decode('ascii')
+
+    def verify(self, message, sign):
+        """验签（支付宝公钥），失败抛出 rsa.VerificationError / ValueError"""
+        import rsa
+        rsa.verify(message, base64.b64decode(sign), self.public_key)
+
+
+class WeChatPayCredentials:
+    """微信支付配置"""
+    gateway = 'wechat'
+
+    def __init__(self, config):
+        self.app_id = config.app_id
+        self.mch_id = config.mch_id
+        self.api_key = config.api_key
+        self.notify_url = config.notify_url
+        # 退款接口的商户证书
+        self.cert_path = config.cert_path
+        self.key_path = config.key_path
+
+
+class HuPiPayCredentials:
+    """虎皮椒配置"""
+    gateway = 'hupipay'
+
+    def __init__(self, config):
+        self.app_id = config.app_id
+        self.app_secret = config.app_secret
+        self.notify_url = config.notify_url
+        self.return_url = config.return_url
+
+
+CONFIG_MODELS = {
+    'alipay': (AlipayConfig, AlipayCredentials),
+    'wechat': (WeChatPayConfig, WeChatPayCredentials),
+    'hupipay': (HuPiPayConfig, HuPiPayCredentials),
+}
+MODEL_GATEWAYS = {model: gateway for gateway, (model, _) in CONFIG_MODELS.items()}
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def _current_version(gateway):
+    """网关配置表指纹：新增、修改、启停、删除配置都会改变"""
+    row = CONFIG_MODELS[gateway][0].objects.aggregate(count=Count('pk'), last_id=Max('pk'),
+                                                       updated=Max('updated_at'))
+    return row['count'], row['last_id'], row['updated']
+
+
+def load_credentials(gateway):
+    """从数据库加载并解析当前启用的配置"""
+    model, credentials_class = CONFIG_MODELS[gateway]
+    config = model.objects.filter(is_active=True).order_by('-created_at').first()
+    if config is None:
+        raise ConfigMissing(f'未配置{model._meta.verbose_name}')
+    return credentials_class(config)
+
+
+def active_credentials(gateway):
+    """当前启用的网关配置（进程内缓存）"""
+    entry = _loaded.get(gateway)
+    if entry is not None and time.monotonic() - entry[1] < settings.PAYMENT_GATEWAY_CONFIG_CHECK_INTERVAL:
+        return entry[2]
+    with _lock:
+        entry = _loaded.get(gateway)
+        version = _current_version(gateway)
+        if entry is None or entry[0] != version:
+            entry = (version, time.monotonic(), load_credentials(gateway))
+        else:
+            entry = (version, time.monotonic(), entry[2])
+        _loaded[gateway] = entry
+    return entry[2]
+
+
+def invalidate_credentials(gateway):
+    """配置变更：清空本进程缓存（其他进程按指纹发现变更）"""
+    _loaded.pop(gateway, None)
+
+
+@receiver(post_save, sender=AlipayConfig)
+@receiver(post_save, sender=WeChatPayConfig)
+@receiver(post_save, sender=HuPiPayConfig)
+@receiver(post_delete, sender=AlipayConfig)
+@receiver(post_delete, sender=WeChatPayConfig)
+@receiver(post_delete, sender=HuPiPayConfig)
+def _config_changed(sender, **kwargs):
+    gateway = MODEL_GATEWAYS[sender]
+    transaction.on_commit(lambda: invalidate_credentials(gateway))
@@ -0,0 +1,130 @@
+"""
+支付记录导出
+
+列表页与导出共用同一组筛选条件。导出按 (created_at, id) 键集分页，每块一条带 LIMIT 的查询，
+沿 (-created_at, -id) 索引续读（MySQL 驱动的游标会把整个结果集读入内存，.iterator() 不能流式读取），
+只取需要的列（学员姓名随行 JOIN），
+CSV 边读边写逐行流式返回；XLSX 使用 openpyxl 只写模式，行数据写入临时文件，内存占用不随行数增长，
+生成完毕后按块流式返回。
+"""
+
+import csv
+import tempfile
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from apps.payment.models import PaymentRecord
+
+EXPORT_CHUNK_SIZE = 2000
+
+COLUMNS = (
+    ('order_no', '订单号'),
+    ('student__student_no', '学员编号'),
+    ('student__real_name', '学员姓名'),
+    ('amount', '金额'),
+    ('payment_method', '支付方式'),
+    ('status', '状态'),
+    ('transaction_id', '交易号'),
+    ('created_at', '创建时间'),
+    ('paid_at', '支付时间'),
+    ('refunded_at', '退款时间'),
+)
+
+
+def filter_payments(params):
+    """
+    按查询参数筛选支付记录
+
+    status、method、start/end（创建日期 YYYY-MM-DD，含首尾）、q（订单号、交易号或学员姓名）。
+    日期格式错误抛出 ValueError。
+    """
+    queryset = PaymentRecord.objects.select_related('student')
+    if params.get('status'):
+        queryset = queryset.filter(status=params['status'])
+    if params.get('method'):
+        queryset = queryset.filter(payment_method=params['method'])
+    if params.get('start'):
+        queryset = queryset.filter(created_at__gte=_day_start(params['start']))
+    if params.get('end'):
+        queryset = queryset.filter(created_at__lt=_day_start(params['end']) + timedelta(days=1))
+    keyword = (params.get('q') or '').strip()
+    if keyword:
+        queryset = queryset.filter(Q(order_no=keyword) | Q(transaction_id=keyword)
+                                   | Q(student__real_name__startswith=keyword))
+    return queryset.order_by('-created_at', '-id')
+
+
+def _day_start(value):
+    return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+
+
+def _keyset_batches(queryset, fields, batch_size=EXPORT_CHUNK_SIZE):
+    """按 (created_at, id) 倒序分批读取 fields 列，每批一条查询"""
+    queryset = queryset.order_by('-created_at', '-id')
+    batch = list(queryset.values_list('created_at', 'id', *fields)[:batch_size])
+    while batch:
+        yield [row[2:] for row in batch]
+        if len(batch) < batch_size:
+            return
+        last_created, last_id = batch[-1][:2]
+        batch = list(queryset.filter(Q(created_at__lt=last_created) | Q(created_at=last_created, id__lt=last_id))
+                     .values_list('created_at', 'id', *fields)[:batch_size])
+
+
+def export_rows(queryset):
+    """导出行（显示值），按块读取"""
+    methods = dict(PaymentRecord.PAYMENT_METHOD_CHOICES)
+    statuses = dict(PaymentRecord.STATUS_CHOICES)
+    fields = [field for field, _ in COLUMNS]
+    for row in (row for batch in _keyset_batches(queryset, fields) for row in batch):
+        row = dict(zip(fields, row))
+        row['payment_method'] = methods.get(row['payment_method'], row['payment_method'])
+        row['status'] = statuses.get(row['status'], row['status'])
+        for field in ('created_at', 'paid_at', 'refunded_at'):
+            if row[field] is not None:
+                # Excel 不支持带时区的时间
+                row[field] = timezone.localtime(row[field]).replace(tzinfo=None, microsecond=0)
+        yield [row[field] for field in fields]
+
+
+class _Echo:
+    """csv.writer 的伪文件对象：write 直接返回写入内容"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_stream(queryset):
+    writer = csv.writer(_Echo())
+    # 带 BOM，Excel 直接打开不乱码
+    yield '\ufeff' + writer.writerow([title for _, title in COLUMNS])
+    for row in export_rows(queryset):
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+def export_csv(queryset, filename):
+    """CSV 流式导出"""
+    response = StreamingHttpResponse(_csv_stream(queryset), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def export_xlsx(queryset, filename):
+    """XLSX 导出（openpyxl 只写模式）"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('支付记录')
+    sheet.append([title for _, title in COLUMNS])
+    for row in export_rows(queryset):
+        sheet.append(row)
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(
+        output, as_attachment=True, filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
@@ -0,0 +1,262 @@
+"""
+本地模拟支付网关（离线压测用）
+
+在 127.0.0.1 的随机端口启动 HTTP/1.1 长连接服务，模拟支付宝 alipay.trade.query / alipay.trade.refund、
+微信支付 orderquery / refund 与虎皮椒订单查询、退款接口：校验请求签名，按各网关规则签名应答。
+已支付的订单退款金额不超过订单金额即退款成功（不记录退款状态）。
+服务运行在 fork 出的多个子进程中（共享监听套接字），签名计算不与压测客户端争用 GIL。
+orders 预设订单状态，latency 模拟网关处理耗时；商户与网关密钥在启动时临时生成，不读写数据库配置。
+
+    with FakeGateway(orders={'PAY...': ('paid', Decimal('100.00'))}, latency=0.005) as fake:
+        client = AlipayClient(url=fake.url('alipay'), refund_url=fake.refund_url('alipay'),
+                              credentials=fake.credentials('alipay'))
+"""
+
+import base64
+import json
+import multiprocessing
+import os
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+from apps.payment.credentials import CONFIG_MODELS
+from apps.payment.models import AlipayConfig, HuPiPayConfig, WeChatPayConfig
+from apps.payment.notify import _sign_content, hupipay_sign, wechat_sign
+
+# 订单状态 → 各网关的交易状态
+TRADE_STATES = {
+    'alipay': {'paid': 'TRADE_SUCCESS', 'closed': 'TRADE_CLOSED', 'pending': 'WAIT_BUYER_PAY'},
+    'wechat': {'paid': 'SUCCESS', 'closed': 'CLOSED', 'pending': 'NOTPAY'},
+    'hupipay': {'paid': 'OD', 'closed': 'CD', 'pending': 'WP'},
+}
+
+
+def openssl_public_pem(public_key):
+    """rsa.PublicKey 转为 X.509 SubjectPublicKeyInfo PEM（支付宝公钥格式）"""
+    import rsa
+    from pyasn1.codec.der import encoder
+    from pyasn1.type import univ
+    from rsa.asn1 import OpenSSLPubKey
+
+    info = OpenSSLPubKey()
+    info['header']['oid'] = univ.ObjectIdentifier('1.2.840.113549.1.1.1')
+    info['header']['parameters'] = univ.Null('')
+    info['key'] = info['key'].clone(b'\x00' + public_key.save_pkcs1('DER'))
+    return rsa.pem.save_pem(encoder.encode(info), 'PUBLIC KEY').decode('ascii')
+
+
+def _increment(counter):
+    with counter.get_lock():
+        counter.value += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 应答头与正文分两次写出，长连接下需关闭 Nagle，否则每次应答被延迟确认拖慢约40ms
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        _increment(self.server.fake._connections)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        fake = self.server.fake
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        gateway = self.path.strip('/')
+        handler = getattr(fake, f'_handle_{gateway}', None)
+        if handler is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if fake.latency:
+            time.sleep(fake.latency)
+        content_type, payload = handler(body)
+        _increment(fake._requests)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FakeGateway:
+    """本地模拟网关"""
+
+    def __init__(self, orders=None, latency=0, key_size=2048, processes=None):
+        import rsa
+
+        self.orders = orders if orders is not None else {}
+        self.latency = latency
+        self.processes = processes or os.cpu_count() or 1
+        self._context = multiprocessing.get_context('fork')
+        self._requests = self._context.Value('i', 0)
+        self._connections = self._context.Value('i', 0)
+        merchant_public, merchant_private = rsa.newkeys(key_size)
+        alipay_public, self._alipay_private = rsa.newkeys(key_size)
+        self._merchant_public = merchant_public
+        tag = uuid.uuid4().hex[:8]
+        # 未保存的配置实例，仅用于构造客户端配置
+        self.configs = {
+            'alipay': AlipayConfig(app_id=f'fake-{tag}',
+                                   private_key=merchant_private.save_pkcs1().decode('ascii'),
+                                   alipay_public_key=openssl_public_pem(alipay_public)),
+            'wechat': WeChatPayConfig(app_id=f'fake-{tag}', mch_id=tag, api_key=uuid.uuid4().hex),
+            'hupipay': HuPiPayConfig(app_id=f'fake-{tag}', app_secret=uuid.uuid4().hex),
+        }
+        self._workers = []
+        self.port = None
+
+    @property
+    def requests(self):
+        """已处理的请求数"""
+        return self._requests.value
+
+    @property
+    def connections(self):
+        """已接受的TCP连接数"""
+        return self._connections.value
+
+    def credentials(self, gateway):
+        """按模拟网关密钥解析的客户端配置"""
+        return CONFIG_MODELS[gateway][1](self.configs[gateway])
+
+    def start(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        server.daemon_threads = True
+        server.fake = self
+        self.port = server.server_address[1]
+        for i in range(self.processes):
+            worker = self._context.Process(target=server.serve_forever, name=f'fake-gateway-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        # 监听套接字已由子进程持有
+        server.server_close()
+        return self
+
+    def stop(self):
+        for worker in self._workers:
+            worker.terminate()
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def url(self, gateway):
+        return f'http://127.0.0.1:{self.port}/{gateway}'
+
+    def refund_url(self, gateway):
+        # 支付宝查询与退款为同一网关地址
+        return self.url(gateway if gateway == 'alipay' else f'{gateway}_refund')
+
+    def _refundable(self, order_no, amount):
+        status, total = self._order(order_no)
+        return status == 'paid' and Decimal(amount) <= total
+
+    def _order(self, order_no):
+        state = self.orders.get(order_no)
+        if state is None:
+            return None, None
+        status, amount = state
+        return status, Decimal(amount)
+
+    def _handle_alipay(self, body):
+        import rsa
+
+        params = dict(parse_qsl(body.decode('utf-8')))
+        try:
+            rsa.verify(_sign_content(params, ('sign',)).encode('utf-8'), base64.b64decode(params['sign']),
+                       self._merchant_public)
+        except (KeyError, rsa.VerificationError):
+            response = {'code': '40002', 'msg': 'Invalid Arguments', 'sub_code': 'isv.invalid-signature'}
+        else:
+            biz_content = json.loads(params['biz_content'])
+            order_no = biz_content['out_trade_no']
+            status, amount = self._order(order_no)
+            if status is None:
+                response = {'code': '40004', 'msg': 'Business Failed', 'sub_code': 'ACQ.TRADE_NOT_EXIST'}
+            elif params.get('method') == 'alipay.trade.refund':
+                if self._refundable(order_no, biz_content['refund_amount']):
+                    response = {'code': '10000', 'msg': 'Success', 'out_trade_no': order_no,
+                                'trade_no': f'A{order_no}', 'fund_change': 'Y',
+                                'refund_fee': biz_content['refund_amount']}
+                else:
+                    response = {'code': '40004', 'msg': 'Business Failed', 'sub_code': 'ACQ.TRADE_STATUS_ERROR'}
+            else:
+                response = {'code': '10000', 'msg': 'Success', 'out_trade_no': order_no,
+                            'trade_no': f'A{order_no}', 'trade_status': TRADE_STATES['alipay'][status],
+                            'total_amount': str(amount)}
+        response_key = params.get('method', 'alipay.trade.query').replace('.', '_') + '_response'
+        content = json.dumps(response, separators=(',', ':'))
+        sign = base64.b64encode(rsa.sign(content.encode('utf-8'), self._alipay_private, 'SHA-256')).decode()
+        payload = f'{{"{response_key}":{content},"sign":"{sign}"}}'
+        return 'application/json; charset=utf-8', payload.encode('utf-8')
+
+    def _handle_wechat(self, body, refund=False):
+        config = self.configs['wechat']
+        params = {child.tag: child.text or '' for child in ET.fromstring(body)}
+        response = {'return_code': 'SUCCESS', 'appid': config.app_id, 'mch_id': config.mch_id,
+                    'nonce_str': uuid.uuid4().hex}
+        if params.get('sign') != wechat_sign(params, config.api_key):
+            response = {'return_code': 'FAIL', 'return_msg': '签名错误'}
+        else:
+            order_no = params.get('out_trade_no')
+            status, amount = self._order(order_no)
+            if status is None:
+                response.update(result_code='FAIL', err_code='ORDERNOTEXIST')
+            elif refund:
+                if self._refundable(order_no, Decimal(params['refund_fee']) / 100):
+                    response.update(result_code='SUCCESS', out_trade_no=order_no,
+                                    out_refund_no=params['out_refund_no'], refund_id=f"W{params['out_refund_no']}",
+                                    refund_fee=params['refund_fee'])
+                else:
+                    response.update(result_code='FAIL', err_code='INVALID_REQUEST')
+            else:
+                response.update(result_code='SUCCESS', out_trade_no=order_no, transaction_id=f'W{order_no}',
+                                trade_state=TRADE_STATES['wechat'][status], total_fee=str(int(amount * 100)),
+                                time_end=time.strftime('%Y%m%d%H%M%S'))
+            response['sign'] = wechat_sign(response, config.api_key)
+        content = ''.join(f'<{key}>{value}</{key}>' for key, value in response.items())
+        return 'text/xml; charset=utf-8', f'<xml>{content}</xml>'.encode('utf-8')
+
+    def _handle_wechat_refund(self, body):
+        return self._handle_wechat(body, refund=True)
+
+    def _handle_hupipay(self, body):
+        config = self.configs['hupipay']
+        params = dict(parse_qsl(body.decode('utf-8')))
+        if params.get('hash') != hupipay_sign(params, config.app_secret):
+            response = {'errcode': 40029, 'errmsg': 'invalid sign'}
+        else:
+            order_no = params.get('out_trade_order')
+            status, amount = self._order(order_no)
+            if status is None:
+                response = {'errcode': 0, 'errmsg': 'success', 'data': {'status': 'WP'}}
+            else:
+                response = {'errcode': 0, 'errmsg': 'success',
+                            'data': {'status': TRADE_STATES['hupipay'][status], 'open_order_id': f'H{order_no}',
+                                     'total_amount': str(amount)}}
+        return 'application/json; charset=utf-8', json.dumps(response).encode('utf-8')
+
+    def _handle_hupipay_refund(self, body):
+        config = self.configs['hupipay']
+        params = dict(parse_qsl(body.decode('utf-8')))
+        if params.get('hash') != hupipay_sign(params, config.app_secret):
+            response = {'errcode': 40029, 'errmsg': 'invalid sign'}
+        elif self._refundable(params.get('trade_order_id'), params.get('refund_amount', '0')):
+            response = {'errcode': 0, 'errmsg': 'success', 'data': {'refund_id': f"H{params['refund_no']}"}}
+        else:
+            response = {'errcode': 40004, 'errmsg': 'refund not allowed'}
+        return 'application/json; charset=utf-8', json.dumps(response).encode('utf-8')
@@ -0,0 +1,399 @@
+"""
+支付网关客户端注册表
+
+对账清理待支付订单、批量退款等场景主动调用网关的查询与退款接口：
+
+- 每个进程每个网关一个客户端（fork 后的子进程重新创建），复用 requests.Session 长连接池
+  （PAYMENT_GATEWAY_POOL_SIZE），查询失败不在客户端内重试，留给下一轮清理；
+- 商户配置与解析后的密钥取自进程内缓存（credentials），后台修改配置后自动重新加载，客户端无需重建；
+- 令牌桶限流（PAYMENT_GATEWAY_QPS），多线程并发查询时不超出网关的接口频率限制；
+- PAYMENT_GATEWAY_STUB 开启时使用本地桩客户端，不发出网络请求，按预设结果应答（测试用）；
+  离线压测可用 fakegateway 启动本地模拟网关，客户端通过 url 指向它。
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from decimal import Decimal
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from apps.payment.credentials import ConfigMissing, active_credentials
+from apps.payment.notify import _amount, _sign_content, hupipay_sign, wechat_sign
+
+# 支付宝退款业务失败中可稍后重试的错误码
+ALIPAY_RETRYABLE = ('ACQ.SYSTEM_ERROR', 'ACQ.SELLER_BALANCE_NOT_ENOUGH', 'ACQ.REFUND_AMT_RESTRICTION')
+# 微信支付退款失败中可稍后重试的错误码
+WECHAT_RETRYABLE = ('SYSTEMERROR', 'BIZERR_NEED_RETRY', 'FREQUENCY_LIMITED', 'NOTENOUGH')
+# 虎皮椒退款的业务拒绝错误码（订单不存在、未支付、金额超限等），其余（签名时间偏差、限流、系统繁忙）可稍后重试
+HUPIPAY_REJECTED = ('40004',)
+
+# 支付方式 → 网关
+METHOD_GATEWAYS = {
+    'alipay_web': 'alipay',
+    'alipay_qr': 'alipay',
+    'wechat_pay': 'wechat',
+    'hupi_pay': 'hupipay',
+}
+
+
+class GatewayError(Exception):
+    """网关查询失败（网络错误、应答验签失败或业务错误），可稍后重试"""
+
+
+class RefundRejected(GatewayError):
+    """网关明确拒绝退款（交易不存在、已超过退款期限、金额不符等），重试无意义"""
+
+
+class QueryResult:
+    """
+    订单查询结果
+
+    status: paid 已支付 / closed 已关闭 / not_found 网关无此订单 / pending 等待支付
+    """
+
+    def __init__(self, status, transaction_id=None, amount=None, paid_at=None):
+        self.status = status
+        self.transaction_id = transaction_id
+        self.amount = amount
+        self.paid_at = paid_at
+
+    def __repr__(self):
+        return f'QueryResult({self.status}, {self.transaction_id}, {self.amount})'
+
+
+class RateLimiter:
+    """令牌桶限流（线程安全）：每秒补充 rate 个令牌，最多积攒 burst 个"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class GatewayClient:
+    """
+    网关客户端基类：连接池 + 限流
+
+    url、refund_url、credentials 默认取网关正式地址与当前启用的配置，压测时可指向本地模拟网关并传入配置。
+    """
+    gateway = None
+    url = None
+    refund_url = None
+
+    def __init__(self, rate=None, pool_size=None, timeout=None, url=None, credentials=None, refund_url=None):
+        self.url = url or self.url
+        self.refund_url = refund_url or self.refund_url or self.url
+        self._credentials = credentials
+        self.limiter = RateLimiter(rate or settings.PAYMENT_GATEWAY_QPS)
+        self.timeout = timeout or settings.PAYMENT_GATEWAY_TIMEOUT
+        pool_size = pool_size or settings.PAYMENT_GATEWAY_POOL_SIZE
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        self.limiter.acquire()
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise GatewayError(f'{self.gateway} 请求失败: {e}')
+        return response
+
+    def config(self):
+        if self._credentials is not None:
+            return self._credentials
+        try:
+            return active_credentials(self.gateway)
+        except ConfigMissing as e:
+            raise GatewayError(str(e))
+
+    def query(self, order_no):
+        """查询订单交易状态，返回 QueryResult"""
+        raise NotImplementedError
+
+    def refund(self, order_no, refund_no, amount, total_amount, reason=''):
+        """
+        全额或部分退款，返回网关退款号
+
+        同一 refund_no 重复提交由网关去重，不会重复退款；失败抛出 GatewayError / RefundRejected。
+        """
+        raise NotImplementedError
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d %H:%M:%S'))
+    except ValueError:
+        return None
+
+
+class AlipayClient(GatewayClient):
+    """支付宝 alipay.trade.query / alipay.trade.refund"""
+    gateway = 'alipay'
+    url = 'https://openapi.alipay.com/gateway.do'
+
+    def call(self, method, biz_content):
+        """调用开放平台接口，返回验签后的业务应答"""
+        import rsa
+
+        config = self.config()
+        params = {
+            'app_id': config.app_id, 'method': method, 'format': 'JSON',
+            'charset': 'utf-8', 'sign_type': 'RSA2', 'version': '1.0',
+            'timestamp': timezone.localtime().strftime('%Y-%m-%d %H:%M:%S'),
+            'biz_content': json.dumps(biz_content, separators=(',', ':')),
+        }
+        try:
+            params['sign'] = config.sign(_sign_content(params, ('sign',)))
+        except ConfigMissing as e:
+            raise GatewayError(str(e))
+        body = self.request('POST', self.url, data=params).text
+
+        # 验签内容为应答 JSON 中 <method>_response 对象的原文
+        response_key = method.replace('.', '_') + '_response'
+        start = body.find('{', body.find(f'"{response_key}"'))
+        end = body.rfind(',"sign"')
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            raise GatewayError(f'支付宝应答解析失败: {e}')
+        if start < 0 or end < start or 'sign' not in data or response_key not in data:
+            raise GatewayError('支付宝应答缺少签名')
+        try:
+            config.verify(body[start:end].encode('utf-8'), data['sign'])
+        except (rsa.VerificationError, ValueError) as e:
+            raise GatewayError(f'支付宝应答验签失败: {e}')
+        return data[response_key]
+
+    def query(self, order_no):
+        result = self.call('alipay.trade.query', {'out_trade_no': order_no})
+        if result.get('code') != '10000':
+            if result.get('sub_code') == 'ACQ.TRADE_NOT_EXIST':
+                return QueryResult('not_found')
+            raise GatewayError(f"支付宝查询失败: {result.get('sub_code')} {result.get('sub_msg')}")
+        trade_status = result.get('trade_status')
+        if trade_status in ('TRADE_SUCCESS', 'TRADE_FINISHED'):
+            return QueryResult('paid', result.get('trade_no'), _amount(result.get('total_amount')),
+                               _parse_time(result.get('send_pay_date')))
+        if trade_status == 'TRADE_CLOSED':
+            return QueryResult('closed', result.get('trade_no'))
+        return QueryResult('pending', result.get('trade_no'))
+
+    def refund(self, order_no, refund_no, amount, total_amount, reason=''):
+        biz_content = {'out_trade_no': order_no, 'out_request_no': refund_no, 'refund_amount': str(amount)}
+        if reason:
+            biz_content['refund_reason'] = reason
+        result = self.call('alipay.trade.refund', biz_content)
+        if result.get('code') == '10000':
+            return result.get('trade_no') or refund_no
+        # 40004 业务失败（交易不存在、状态不允许退款、金额超限等），其余为系统繁忙、限流
+        error = f"支付宝退款失败: {result.get('sub_code')} {result.get('sub_msg')}"
+        if result.get('code') == '40004' and result.get('sub_code') not in ALIPAY_RETRYABLE:
+            raise RefundRejected(error)
+        raise GatewayError(error)
+
+
+class WeChatPayClient(GatewayClient):
+    """微信支付 V2 查询订单 / 申请退款（退款需商户证书）"""
+    gateway = 'wechat'
+    url = 'https://api.mch.weixin.qq.com/pay/orderquery'
+    refund_url = 'https://api.mch.weixin.qq.com/secapi/pay/refund'
+
+    def call(self, url, params, cert=None):
+        """签名并提交 XML 请求，返回验签后的应答字段"""
+        config = self.config()
+        params = {'appid': config.app_id, 'mch_id': config.mch_id, 'nonce_str': uuid.uuid4().hex, **params}
+        params['sign'] = wechat_sign(params, config.api_key)
+        body = ''.join(f'<{key}>{value}</{key}>' for key, value in params.items())
+        response = self.request('POST', url, data=f'<xml>{body}</xml>'.encode('utf-8'),
+                                headers={'Content-Type': 'text/xml'}, cert=cert)
+        try:
+            data = {child.tag: child.text or '' for child in ET.fromstring(response.content)}
+        except ET.ParseError as e:
+            raise GatewayError(f'微信支付应答解析失败: {e}')
+        if data.get('return_code') != 'SUCCESS':
+            raise GatewayError(f"微信支付请求失败: {data.get('return_msg')}")
+        if data.get('sign') != wechat_sign(data, config.api_key, data.get('sign_type', 'MD5')):
+            raise GatewayError('微信支付应答验签失败')
+        return data
+
+    def query(self, order_no):
+        data = self.call(self.url, {'out_trade_no': order_no})
+        if data.get('result_code') != 'SUCCESS':
+            if data.get('err_code') == 'ORDERNOTEXIST':
+                return QueryResult('not_found')
+            raise GatewayError(f"微信支付查询失败: {data.get('err_code')} {data.get('err_code_des')}")
+
+        trade_state = data.get('trade_state')
+        if trade_state == 'SUCCESS':
+            paid_at = None
+            if data.get('time_end'):
+                paid_at = timezone.make_aware(datetime.strptime(data['time_end'], '%Y%m%d%H%M%S'))
+            return QueryResult('paid', data.get('transaction_id'), _amount(Decimal(int(data['total_fee'])) / 100),
+                               paid_at)
+        if trade_state in ('CLOSED', 'REVOKED', 'PAYERROR'):
+            return QueryResult('closed', data.get('transaction_id'))
+        return QueryResult('pending')
+
+    def refund(self, order_no, refund_no, amount, total_amount, reason=''):
+        config = self.config()
+        cert = None
+        if self.refund_url.startswith('https://'):
+            # 本地模拟网关为 http，不加载证书
+            if not (config.cert_path and config.key_path):
+                raise RefundRejected('微信支付退款需配置商户证书')
+            cert = (config.cert_path, config.key_path)
+        params = {'out_trade_no': order_no, 'out_refund_no': refund_no,
+                  'total_fee': str(int(total_amount * 100)), 'refund_fee': str(int(amount * 100))}
+        if reason:
+            params['refund_desc'] = reason
+        data = self.call(self.refund_url, params, cert=cert)
+        if data.get('result_code') == 'SUCCESS':
+            return data.get('refund_id') or refund_no
+        error = f"微信支付退款失败: {data.get('err_code')} {data.get('err_code_des')}"
+        if data.get('err_code') in WECHAT_RETRYABLE:
+            raise GatewayError(error)
+        raise RefundRejected(error)
+
+
+class HuPiPayClient(GatewayClient):
+    """虎皮椒订单查询 / 退款"""
+    gateway = 'hupipay'
+    url = 'https://api.xunhupay.com/payment/query.html'
+    refund_url = 'https://api.xunhupay.com/payment/refund.html'
+
+    def call(self, url, params):
+        """签名并提交表单请求，返回应答 JSON"""
+        config = self.config()
+        params = {'appid': config.app_id, 'time': str(int(time.time())), 'nonce_str': uuid.uuid4().hex, **params}
+        params['hash'] = hupipay_sign(params, config.app_secret)
+        try:
+            return self.request('POST', url, data=params).json()
+        except ValueError as e:
+            raise GatewayError(f'虎皮椒应答解析失败: {e}')
+
+    def query(self, order_no):
+        data = self.call(self.url, {'out_trade_order': order_no})
+        if str(data.get('errcode')) != '0':
+            raise GatewayError(f"虎皮椒查询失败: {data.get('errcode')} {data.get('errmsg')}")
+        result = data.get('data') or {}
+        status = result.get('status')
+        transaction_id = result.get('transaction_id') or result.get('open_order_id')
+        if status == 'OD':
+            return QueryResult('paid', transaction_id, _amount(result.get('total_amount')))
+        if status == 'CD':
+            return QueryResult('closed', transaction_id)
+        return QueryResult('pending', transaction_id)
+
+    def refund(self, order_no, refund_no, amount, total_amount, reason=''):
+        data = self.call(self.refund_url, {'trade_order_id': order_no, 'refund_no': refund_no,
+                                           'refund_amount': str(amount), 'reason': reason or '退款'})
+        errcode = str(data.get('errcode'))
+        if errcode != '0':
+            error = f"虎皮椒退款失败: {errcode} {data.get('errmsg')}"
+            if errcode in HUPIPAY_REJECTED:
+                raise RefundRejected(error)
+            raise GatewayError(error)
+        result = data.get('data') or {}
+        return result.get('refund_id') or result.get('open_order_id') or refund_no
+
+
+class StubGatewayClient:
+    """
+    本地桩客户端（不发网络请求）
+
+    results 为 {订单号: QueryResult}，未预设的订单按 default 状态应答；
+    refund_errors 为 {订单号: 异常}，预设的订单退款时抛出该异常，其余退款成功；
+    latency 模拟每次查询、退款的网络耗时（秒），同样经过限流。
+    """
+
+    def __init__(self, gateway='stub', results=None, default='pending', latency=0, rate=None, refund_errors=None):
+        self.gateway = gateway
+        self.results = results if results is not None else {}
+        self.refund_errors = refund_errors if refund_errors is not None else {}
+        self.default = default
+        self.latency = latency
+        self.limiter = RateLimiter(rate or settings.PAYMENT_GATEWAY_QPS)
+
+    def query(self, order_no):
+        self.limiter.acquire()
+        if self.latency:
+            time.sleep(self.latency)
+        return self.results.get(order_no) or QueryResult(self.default)
+
+    def refund(self, order_no, refund_no, amount, total_amount, reason=''):
+        self.limiter.acquire()
+        if self.latency:
+            time.sleep(self.latency)
+        error = self.refund_errors.get(order_no)
+        if error is not None:
+            raise error
+        return f'STUB{refund_no}'
+
+
+CLIENT_CLASSES = {
+    'alipay': AlipayClient,
+    'wechat': WeChatPayClient,
+    'hupipay': HuPiPayClient,
+}
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def get_client(gateway):
+    """网关客户端（进程内按网关复用，共享连接池与限流）"""
+    global _clients_pid
+    client = _clients.get(gateway) if _clients_pid == os.getpid() else None
+    if client is None:
+        with _clients_lock:
+            if _clients_pid != os.getpid():
+                # fork 出的子进程不能沿用父进程的连接
+                _clients.clear()
+                _clients_pid = os.getpid()
+            client = _clients.get(gateway)
+            if client is None:
+                if settings.PAYMENT_GATEWAY_STUB:
+                    client = StubGatewayClient(gateway)
+                else:
+                    client = CLIENT_CLASSES[gateway]()
+                _clients[gateway] = client
+    return client
+
+
+def set_client(gateway, client):
+    """替换网关客户端（测试、压测注入桩客户端）"""
+    global _clients_pid
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        _clients[gateway] = client
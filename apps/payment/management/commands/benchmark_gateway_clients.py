@@ -0,0 +1,84 @@
+"""
+支付网关客户端压测（离线）
+
+启动本地模拟网关，对比两种调用方式的延迟与吞吐：
+  复用：注册表中的客户端，长连接池 + 进程内缓存的已解析密钥；
+  新建：每次查询重新解析配置密钥、新建会话与连接（改造前的做法）。
+并校验查询结果与预设的订单状态一致。
+
+    python manage.py benchmark_gateway_clients --requests 2000 --concurrency 16 --latency 0.005
+"""
+
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from apps.classes.management.commands.benchmark_enrollment import percentile
+from apps.payment.credentials import CONFIG_MODELS
+from apps.payment.fakegateway import FakeGateway
+from apps.payment.gateways import CLIENT_CLASSES
+
+STATUSES = ('paid', 'closed', 'pending')
+UNLIMITED = 1e9
+
+
+class Command(BaseCommand):
+    help = '支付网关客户端压测：连接复用与配置缓存'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='每种方式每个网关的查询次数')
+        parser.add_argument('--concurrency', type=int, default=16, help='并发线程数')
+        parser.add_argument('--latency', type=float, default=0.005, help='模拟网关处理耗时（秒）')
+        parser.add_argument('--gateway', choices=[*CLIENT_CLASSES, 'all'], default='all', help='压测的网关')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        orders = {f'BENCH{tag}{i:08d}': (STATUSES[i % len(STATUSES)], Decimal('100.00'))
+                  for i in range(options['requests'])}
+        gateways = list(CLIENT_CLASSES) if options['gateway'] == 'all' else [options['gateway']]
+        self.stdout.write('生成模拟网关密钥...')
+        with FakeGateway(orders=orders, latency=options['latency']) as fake:
+            for gateway in gateways:
+                client_class = CLIENT_CLASSES[gateway]
+                url = fake.url(gateway)
+                pooled = client_class(rate=UNLIMITED, pool_size=options['concurrency'], url=url,
+                                      credentials=fake.credentials(gateway))
+
+                def query_pooled(order_no):
+                    return pooled.query(order_no)
+
+                def query_cold(order_no):
+                    credentials = CONFIG_MODELS[gateway][1](fake.configs[gateway])
+                    client = client_class(rate=UNLIMITED, pool_size=1, url=url, credentials=credentials)
+                    try:
+                        return client.query(order_no)
+                    finally:
+                        client.session.close()
+
+                for label, query in (('复用', query_pooled), ('新建', query_cold)):
+                    connections = fake.connections
+                    self._run(f'{gateway} {label}', query, orders, options['concurrency'])
+                    self.stdout.write(f'  新建连接 {fake.connections - connections} 个')
+                pooled.session.close()
+
+    def _run(self, label, query, orders, concurrency):
+        def timed(order_no):
+            begin = time.perf_counter()
+            result = query(order_no)
+            return order_no, result, time.perf_counter() - begin
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(timed, orders))
+        elapsed = time.perf_counter() - started
+
+        mismatched = sum(1 for order_no, result, _ in results if result.status != orders[order_no][0])
+        latencies = sorted(seconds for _, _, seconds in results)
+        style = self.style.SUCCESS if not mismatched else self.style.ERROR
+        self.stdout.write(style(
+            f'{label}：{len(results)} 次，{len(results) / elapsed:.0f} 次/秒，'
+            f'p50 {percentile(latencies, 50) * 1000:.2f}ms，p99 {percentile(latencies, 99) * 1000:.2f}ms，'
+            f'结果不符 {mismatched} 次'))
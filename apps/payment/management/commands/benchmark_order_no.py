@@ -0,0 +1,52 @@
+"""
+订单号生成压测
+
+多个进程同时生成订单号，统计总吞吐量，并校验全部ID唯一、每个进程内严格递增。
+
+    python manage.py benchmark_order_no --processes 8 --count 200000
+"""
+
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+
+from water_cube_studio.snowflake import next_id, parse_id
+
+
+def _generate(count):
+    started = time.perf_counter()
+    ids = [next_id() for _ in range(count)]
+    return ids, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = '订单号生成压测：多进程吞吐量与唯一性校验'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='生成进程数')
+        parser.add_argument('--count', type=int, default=200000, help='每个进程生成的ID数')
+
+    def handle(self, *args, **options):
+        processes, count = options['processes'], options['count']
+        self.stdout.write(f'开始压测：{processes} 个进程，每个进程 {count} 个ID')
+        # fork 出的子进程各自重新确定机器号
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            started = time.perf_counter()
+            results = pool.map(_generate, [count] * processes)
+            elapsed = time.perf_counter() - started
+
+        total = processes * count
+        busiest = max(seconds for _, seconds in results)
+        self.stdout.write(f'生成 {total} 个ID，总吞吐 {total / busiest:.0f} 个/秒'
+                          f'（单进程最慢 {count / busiest:.0f} 个/秒，含进程调度 {total / elapsed:.0f} 个/秒）')
+
+        workers = {parse_id(ids[0])[1] for ids, _ in results}
+        monotonic = all(all(a < b for a, b in zip(ids, ids[1:])) for ids, _ in results)
+        unique = len({value for ids, _ in results for value in ids})
+        if unique == total and monotonic and len(workers) == processes:
+            self.stdout.write(self.style.SUCCESS(f'校验通过：{total} 个ID全部唯一，各进程内严格递增，'
+                                                 f'机器号 {sorted(workers)}'))
+        else:
+            self.stdout.write(self.style.ERROR(f'校验失败：唯一 {unique}/{total}，严格递增 {monotonic}，'
+                                               f'机器号 {sorted(workers)}'))
@@ -0,0 +1,140 @@
+"""
+支付通知重放压测
+
+为一笔待支付订单生成签名正确的虎皮椒支付成功通知，并发重放大量重复回调，
+统计应答延迟与回调请求产生的写语句数，并校验支付记录、报名与课时流水只落账一次。
+
+    python manage.py benchmark_payment_notify --requests 10000 --concurrency 32
+"""
+
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+
+from apps.classes.management.commands.benchmark_enrollment import percentile
+from apps.classes.models import ClassType, Course, DanceType, Enrollment, SeatHold
+from apps.classes.seats import enroll_student, place_hold
+from apps.payment.models import HuPiPayConfig, PaymentNotification, PaymentRecord
+from apps.payment.notify import hupipay_sign
+from apps.payment.views import hupipay_notify
+from apps.students.models import ClassCreditEntry, Student
+from apps.users.models import User
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class Command(BaseCommand):
+    help = '支付通知重放压测：重复回调不产生额外写入'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=10000, help='重放的回调次数')
+        parser.add_argument('--concurrency', type=int, default=32, help='并发线程数')
+        parser.add_argument('--keep', action='store_true', help='保留压测数据')
+
+    def handle(self, *args, **options):
+        tag = f'notify-{uuid.uuid4().hex[:8]}'
+        fixture = self._create_fixture(tag)
+        config = fixture['config']
+        data = {
+            'appid': config.app_id, 'trade_order_id': fixture['payment'].order_no,
+            'open_order_id': f'{tag}-open', 'transaction_id': f'{tag}-txn',
+            'total_fee': str(fixture['payment'].amount), 'status': 'OD', 'nonce_str': tag,
+            'time': str(int(time.time())),
+        }
+        data['hash'] = hupipay_sign(data, config.app_secret)
+        factory = RequestFactory()
+        writes = []
+
+        def count_writes(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            # 并发的首批重复回调撞上唯一约束的 INSERT 未写入任何行，不计入
+            if sql.lstrip().upper().startswith(WRITE_PREFIXES):
+                writes.append(sql)
+            return result
+
+        def notify_one(_):
+            request = factory.post('/payment/hupipay/notify/', data)
+            begin = time.perf_counter()
+            with connection.execute_wrapper(count_writes):
+                response = hupipay_notify(request)
+            return b'success' in response.content, time.perf_counter() - begin
+
+        self.stdout.write(f'开始重放：{options["requests"]} 次回调，{options["concurrency"]} 并发')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(notify_one, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        # 等待异步落账完成
+        deadline = time.perf_counter() + 30
+        while time.perf_counter() < deadline:
+            if not PaymentNotification.objects.filter(order_no=data['trade_order_id'],
+                                                      status__in=('pending', 'retry')).exists():
+                break
+            time.sleep(0.05)
+
+        latencies = sorted(seconds for _, seconds in results)
+        self.stdout.write(f'应答：{sum(ok for ok, _ in results)}/{len(results)} 成功，'
+                          f'{len(results) / elapsed:.0f} 次/秒，'
+                          f'p50 {percentile(latencies, 50) * 1000:.2f}ms，'
+                          f'p99 {percentile(latencies, 99) * 1000:.2f}ms')
+        self.stdout.write(f'回调请求写语句：{len(writes)} 条')
+
+        payment = PaymentRecord.objects.get(pk=fixture['payment'].pk)
+        enrollment = Enrollment.objects.get(pk=fixture['enrollment'].pk)
+        notifications = PaymentNotification.objects.filter(order_no=payment.order_no).count()
+        credits = ClassCreditEntry.objects.filter(payment_record=payment).count()
+        if (payment.status == 'paid' and enrollment.status == 'paid' and notifications == 1
+                and credits == 1 and len(writes) == 1):
+            self.stdout.write(self.style.SUCCESS('校验通过：通知入表 1 条，支付与报名已落账，课时流水 1 条'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f'校验失败：支付 {payment.status}，报名 {enrollment.status}，通知 {notifications} 条，'
+                f'课时流水 {credits} 条，写语句 {len(writes)} 条'))
+
+        if not options['keep']:
+            self._cleanup(fixture)
+        connection.close()
+
+    def _create_fixture(self, tag):
+        config = HuPiPayConfig.objects.filter(is_active=True).order_by('-created_at').first()
+        created_config = config is None
+        if created_config:
+            config = HuPiPayConfig.objects.create(app_id=tag, app_secret=uuid.uuid4().hex)
+        student = Student.objects.create(user=User.objects.create(username=tag), student_no=tag[-12:],
+                                         real_name=tag)
+        dance_type = DanceType.objects.create(name=tag)
+        class_type = ClassType.objects.create(name=tag, dance_type=dance_type, level='beginner',
+                                              age_range='-', max_students=10)
+        course = Course.objects.create(
+            class_type=class_type, name=tag, term=tag, status='enrolling', start_date=date.today(),
+            end_date=date.today() + timedelta(days=90), max_students=10,
+        )
+        enrollment = enroll_student(course, student, amount=100)
+        payment = PaymentRecord.objects.create(student=student, order_no=tag.upper(), amount=100,
+                                               payment_method='hupi_pay')
+        Enrollment.objects.filter(pk=enrollment.pk).update(payment_record=payment)
+        place_hold(enrollment, payment)
+        return {'config': config, 'created_config': created_config, 'student': student,
+                'course': course, 'enrollment': enrollment, 'payment': payment}
+
+    def _cleanup(self, fixture):
+        PaymentNotification.objects.filter(order_no=fixture['payment'].order_no).delete()
+        ClassCreditEntry.objects.filter(student=fixture['student']).delete()
+        SeatHold.objects.filter(enrollment=fixture['enrollment']).delete()
+        Enrollment.objects.filter(pk=fixture['enrollment'].pk).delete()
+        fixture['payment'].delete()
+        class_type = fixture['course'].class_type
+        fixture['course'].delete()
+        class_type.delete()
+        class_type.dance_type.delete()
+        user_id = fixture['student'].user_id
+        fixture['student'].delete()
+        User.objects.filter(pk=user_id).delete()
+        if fixture['created_config']:
+            fixture['config'].delete()
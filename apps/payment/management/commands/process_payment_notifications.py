@@ -0,0 +1,38 @@
+"""
+支付通知重试
+
+处理到期待重试的支付通知，以及接收后长时间未处理的通知（Web 进程退出导致异步任务丢失）。
+建议常驻运行或定时执行：
+
+    python manage.py process_payment_notifications
+    python manage.py process_payment_notifications --loop --interval 10
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.payment.notify import due_notifications, process_notification
+
+
+class Command(BaseCommand):
+    help = '重试处理到期的支付通知'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500, help='每轮最多处理的通知数')
+        parser.add_argument('--loop', action='store_true', help='常驻循环执行')
+        parser.add_argument('--interval', type=float, default=10, help='每轮间隔（秒）')
+
+    def handle(self, *args, **options):
+        while True:
+            results = {}
+            for notification_id in due_notifications(limit=options['limit']):
+                status = process_notification(notification_id)
+                if status:
+                    results[status] = results.get(status, 0) + 1
+            if results or not options['loop']:
+                self.stdout.write(f"处理完成 {results.get('done', 0)} 条，待重试 {results.get('retry', 0)} 条，"
+                                  f"失败 {results.get('failed', 0)} 条")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,47 @@
+"""
+批量退款
+
+处理排队和到期待重试的退款申请：并发提交网关，按批落账，归还的名额转给候补名单队首。
+--course 先为该课程所有已支付的报名申请退款（课程取消），再一并处理。
+
+    python manage.py process_refunds
+    python manage.py process_refunds --course 42 --reason 课程取消
+    python manage.py process_refunds --workers 16 --loop --interval 60
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.classes.models import Course
+from apps.classes.waitlist import promote_waitlists
+from apps.payment.refunds import process_refunds, request_course_refunds
+
+
+class Command(BaseCommand):
+    help = '批量提交退款申请'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, help='为该课程所有已支付的报名申请退款')
+        parser.add_argument('--reason', default='', help='退款原因（与 --course 一起使用）')
+        parser.add_argument('--batch-size', type=int, default=500, help='每批落账的申请数')
+        parser.add_argument('--workers', type=int, help='网关提交并发线程数，默认 REFUND_WORKERS')
+        parser.add_argument('--loop', action='store_true', help='常驻循环执行')
+        parser.add_argument('--interval', type=int, default=60, help='循环间隔（秒）')
+
+    def handle(self, *args, **options):
+        if options['course'] is not None:
+            if not Course.objects.filter(pk=options['course']).exists():
+                raise CommandError(f"课程不存在: {options['course']}")
+            count = request_course_refunds(options['course'], options['reason'])
+            self.stdout.write(f'已申请退款 {count} 条')
+        while True:
+            started = time.perf_counter()
+            result = process_refunds(batch_size=options['batch_size'], workers=options['workers'])
+            promoted = promote_waitlists(result['freed'])
+            self.stdout.write(
+                f"退款成功 {result['succeeded']} 笔，待重试 {result['retry']} 笔，失败 {result['failed']} 笔，"
+                f"候补转正 {promoted} 人，耗时 {time.perf_counter() - started:.2f}s")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,49 @@
+"""
+待支付订单清理
+
+超过最长等待时间的待支付订单直接置为已过期；超过有效期的向网关查询交易状态，
+已支付的补落账，已关闭的置为过期。过期订单的名额随即释放并转给候补名单队首。
+可由 cron / K8s CronJob 定时执行，或使用 --loop 常驻运行。
+网关查询按 PAYMENT_GATEWAY_QPS 限流，积压较多时对账耗时约为 订单数 / QPS 秒（每个网关）。
+
+    python manage.py sweep_pending_payments
+    python manage.py sweep_pending_payments --workers 16 --loop --interval 300
+    python manage.py sweep_pending_payments --no-query
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.classes.waitlist import promote_waitlists
+from apps.payment.sweeper import expire_abandoned, reconcile_pending
+
+
+class Command(BaseCommand):
+    help = '清理过期的待支付订单并向网关对账'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批处理的订单数')
+        parser.add_argument('--workers', type=int, default=8, help='网关查询并发线程数')
+        parser.add_argument('--no-query', action='store_true', help='只过期超过最长等待时间的订单，不查询网关')
+        parser.add_argument('--loop', action='store_true', help='常驻循环执行')
+        parser.add_argument('--interval', type=int, default=300, help='循环间隔（秒）')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            expired, freed = expire_abandoned(batch_size=options['batch_size'])
+            promoted = promote_waitlists(freed)
+            self.stdout.write(f'过期订单 {expired} 笔，释放名额 {sum(freed.values())} 个，候补转正 {promoted} 人，'
+                              f'耗时 {time.perf_counter() - started:.2f}s')
+            if not options['no_query']:
+                started = time.perf_counter()
+                result = reconcile_pending(batch_size=options['batch_size'], workers=options['workers'])
+                promoted = promote_waitlists(result['freed'])
+                self.stdout.write(
+                    f"网关对账：补落账 {result['paid']} 笔，关闭 {result['expired']} 笔，"
+                    f"仍待支付 {result['pending']} 笔，查询失败 {result['error']} 笔，"
+                    f"候补转正 {promoted} 人，耗时 {time.perf_counter() - started:.2f}s")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gateway', models.CharField(choices=[('alipay', '支付宝'), ('wechat', '微信支付'), ('hupipay', '虎皮椒')], max_length=20, verbose_name='支付网关')),
+                ('order_no', models.CharField(max_length=64, verbose_name='订单号')),
+                ('event', models.CharField(choices=[('paid', '支付成功'), ('closed', '交易关闭')], max_length=20, verbose_name='事件')),
+                ('transaction_id', models.CharField(blank=True, max_length=128, null=True, verbose_name='交易号')),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='通知金额')),
+                ('payload', models.JSONField(default=dict, verbose_name='通知内容')),
+                ('status', models.CharField(choices=[('pending', '待处理'), ('retry', '待重试'), ('done', '已处理'), ('failed', '处理失败')], default='pending', max_length=20, verbose_name='处理状态')),
+                ('attempts', models.IntegerField(default=0, verbose_name='处理次数')),
+                ('last_error', models.TextField(blank=True, null=True, verbose_name='最近错误')),
+                ('next_retry_at', models.DateTimeField(blank=True, null=True, verbose_name='下次重试时间')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='接收时间')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='处理完成时间')),
+            ],
+            options={
+                'verbose_name': '支付通知',
+                'verbose_name_plural': '支付通知',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_retry_at'], name='payment_pay_status_2b2421_idx')],
+                'unique_together': {('gateway', 'order_no', 'event')},
+            },
+        ),
+    ]
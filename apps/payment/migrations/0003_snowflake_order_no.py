@@ -0,0 +1,19 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:13
+
+import apps.payment.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0002_payment_notifications'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentrecord',
+            name='order_no',
+            field=models.CharField(default=apps.payment.models.generate_order_no, max_length=64, unique=True, verbose_name='订单号'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0003_snowflake_order_no'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymentrecord',
+            index=models.Index(fields=['-created_at', '-id'], name='payment_pay_created_31850a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentrecord',
+            index=models.Index(fields=['status', '-created_at'], name='payment_pay_status_e56f0b_idx'),
+        ),
+    ]
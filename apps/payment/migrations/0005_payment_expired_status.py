@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0004_payment_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentrecord',
+            name='status',
+            field=models.CharField(choices=[('pending', '待支付'), ('paid', '已支付'), ('failed', '支付失败'), ('expired', '已过期'), ('refunded', '已退款')], default='pending', max_length=20, verbose_name='状态'),
+        ),
+    ]
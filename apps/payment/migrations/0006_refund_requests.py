@@ -0,0 +1,44 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:35
+
+import apps.payment.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0005_cursor_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('payment', '0005_payment_expired_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefundRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('refund_no', models.CharField(default=apps.payment.models.generate_refund_no, max_length=64, unique=True, verbose_name='退款单号')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='退款金额')),
+                ('reason', models.CharField(blank=True, default='', max_length=200, verbose_name='退款原因')),
+                ('status', models.CharField(choices=[('queued', '排队中'), ('submitting', '提交中'), ('retry', '待重试'), ('succeeded', '已退款'), ('failed', '退款失败'), ('cancelled', '已撤销')], default='queued', max_length=20, verbose_name='状态')),
+                ('attempts', models.IntegerField(default=0, verbose_name='提交次数')),
+                ('last_error', models.TextField(blank=True, null=True, verbose_name='最近错误')),
+                ('next_retry_at', models.DateTimeField(blank=True, null=True, verbose_name='下次重试时间')),
+                ('gateway_refund_id', models.CharField(blank=True, max_length=128, null=True, verbose_name='网关退款号')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='申请时间')),
+                ('submitted_at', models.DateTimeField(blank=True, null=True, verbose_name='提交时间')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='申请人')),
+                ('enrollment', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='refund_requests', to='classes.enrollment', verbose_name='报名记录')),
+                ('payment_record', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='payment.paymentrecord', verbose_name='支付记录')),
+            ],
+            options={
+                'verbose_name': '退款申请',
+                'verbose_name_plural': '退款申请',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_retry_at'], name='payment_ref_status_c7338b_idx')],
+            },
+        ),
+    ]
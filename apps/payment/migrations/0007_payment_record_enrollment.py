@@ -0,0 +1,36 @@
+# Generated by Django 4.2.9 on 2026-10-18 15:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_enrollments(apps, schema_editor):
+    """已有支付记录按报名的当前订单回填所属报名（重新下单前的旧订单无从追溯）"""
+    Enrollment = apps.get_model('classes', 'Enrollment')
+    PaymentRecord = apps.get_model('payment', 'PaymentRecord')
+    rows = (Enrollment.objects.filter(payment_record__isnull=False)
+            .values_list('pk', 'payment_record_id').order_by('pk'))
+    batch = []
+    for enrollment_id, record_id in rows.iterator(chunk_size=2000):
+        batch.append(PaymentRecord(pk=record_id, enrollment_id=enrollment_id))
+        if len(batch) >= 2000:
+            PaymentRecord.objects.bulk_update(batch, ['enrollment'])
+            batch = []
+    PaymentRecord.objects.bulk_update(batch, ['enrollment'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0006_enrollment_payment_record_related_name'),
+        ('payment', '0006_refund_requests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentrecord',
+            name='enrollment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payment_records', to='classes.enrollment', verbose_name='报名'),
+        ),
+        migrations.RunPython(backfill_enrollments, migrations.RunPython.noop),
+    ]
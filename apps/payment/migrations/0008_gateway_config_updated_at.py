@@ -0,0 +1,32 @@
+# Generated by Django 4.2.9 on 2026-10-18 15:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0007_payment_record_enrollment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alipayconfig',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='更新时间'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='hupipayconfig',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='更新时间'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='wechatpayconfig',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='更新时间'),
+            preserve_default=False,
+        ),
+    ]
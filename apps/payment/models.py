@@ -1,6 +1,12 @@
 from django.db import models
 from django.conf import settings
 from apps.students.models import Student
+from water_cube_studio.snowflake import next_order_no
+
+
+def generate_order_no():
+    """支付记录订单号"""
+    return next_order_no('PAY')
 
 
 class PaymentRecord(models.Model):
@@ -16,11 +22,15 @@ class PaymentRecord(models.Model):
         ('pending', '待支付'),
         ('paid', '已支付'),
         ('failed', '支付失败'),
+        ('expired', '已过期'),
         ('refunded', '已退款'),
     ]
     
     student = models.ForeignKey(Student, on_delete=models.CASCADE, verbose_name='学员')
-    order_no = models.CharField('订单号', max_length=64, unique=True)
+    # 报名重新下单后 Enrollment.payment_record 指向新订单，旧订单仍经此字段找到报名
+    enrollment = models.ForeignKey('classes.Enrollment', on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='payment_records', verbose_name='报名')
+    order_no = models.CharField('订单号', max_length=64, unique=True, default=generate_order_no)
     amount = models.DecimalField('金额', max_digits=10, decimal_places=2)
     payment_method = models.CharField('支付方式', max_length=20, choices=PAYMENT_METHOD_CHOICES)
     status = models.CharField('状态', max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -34,6 +44,11 @@ class PaymentRecord(models.Model):
         verbose_name = '支付记录'
         verbose_name_plural = '支付记录'
         ordering = ['-created_at']
+        indexes = [
+            # 列表分页与导出
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['status', '-created_at']),
+        ]
     
     def __str__(self):
         return f'{self.order_no} - {self.get_payment_method_display()} - {self.amount}'
@@ -48,6 +63,7 @@ class AlipayConfig(models.Model):
     return_url = models.URLField('同步跳转地址', blank=True)
     is_active = models.BooleanField('是否启用', default=True)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
     
     class Meta:
         verbose_name = '支付宝配置'
@@ -67,6 +83,7 @@ class WeChatPayConfig(models.Model):
     notify_url = models.URLField('异步通知地址', blank=True)
     is_active = models.BooleanField('是否启用', default=True)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
     
     class Meta:
         verbose_name = '微信支付配置'
@@ -84,6 +101,7 @@ class HuPiPayConfig(models.Model):
     return_url = models.URLField('同步跳转地址', blank=True)
     is_active = models.BooleanField('是否启用', default=True)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
     
     class Meta:
         verbose_name = '虎皮椒支付配置'
@@ -91,3 +109,95 @@ class HuPiPayConfig(models.Model):
     
     def __str__(self):
         return f'虎皮椒支付配置 - {self.app_id}'
+
+
+class PaymentNotification(models.Model):
+    """支付异步通知（按 网关 + 订单号 + 事件 去重的幂等表）"""
+    GATEWAY_CHOICES = [
+        ('alipay', '支付宝'),
+        ('wechat', '微信支付'),
+        ('hupipay', '虎皮椒'),
+    ]
+    
+    EVENT_CHOICES = [
+        ('paid', '支付成功'),
+        ('closed', '交易关闭'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', '待处理'),
+        ('retry', '待重试'),
+        ('done', '已处理'),
+        ('failed', '处理失败'),
+    ]
+    
+    gateway = models.CharField('支付网关', max_length=20, choices=GATEWAY_CHOICES)
+    order_no = models.CharField('订单号', max_length=64)
+    event = models.CharField('事件', max_length=20, choices=EVENT_CHOICES)
+    transaction_id = models.CharField('交易号', max_length=128, blank=True, null=True)
+    amount = models.DecimalField('通知金额', max_digits=10, decimal_places=2, blank=True, null=True)
+    payload = models.JSONField('通知内容', default=dict)
+    status = models.CharField('处理状态', max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField('处理次数', default=0)
+    last_error = models.TextField('最近错误', blank=True, null=True)
+    next_retry_at = models.DateTimeField('下次重试时间', blank=True, null=True)
+    created_at = models.DateTimeField('接收时间', auto_now_add=True)
+    processed_at = models.DateTimeField('处理完成时间', blank=True, null=True)
+    
+    class Meta:
+        verbose_name = '支付通知'
+        verbose_name_plural = '支付通知'
+        ordering = ['-created_at']
+        unique_together = ['gateway', 'order_no', 'event']
+        indexes = [
+            models.Index(fields=['status', 'next_retry_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.get_gateway_display()} - {self.order_no} - {self.get_event_display()}'
+
+
+def generate_refund_no():
+    """退款单号"""
+    return next_order_no('RF')
+
+
+class RefundRequest(models.Model):
+    """退款申请（排队后由 process_refunds 分批提交网关）"""
+    STATUS_CHOICES = [
+        ('queued', '排队中'),
+        ('submitting', '提交中'),
+        ('retry', '待重试'),
+        ('succeeded', '已退款'),
+        ('failed', '退款失败'),
+        ('cancelled', '已撤销'),
+    ]
+    
+    refund_no = models.CharField('退款单号', max_length=64, unique=True, default=generate_refund_no)
+    enrollment = models.ForeignKey('classes.Enrollment', on_delete=models.PROTECT, related_name='refund_requests',
+                                   verbose_name='报名记录')
+    payment_record = models.ForeignKey(PaymentRecord, on_delete=models.SET_NULL, null=True, blank=True,
+                                       verbose_name='支付记录')
+    amount = models.DecimalField('退款金额', max_digits=10, decimal_places=2)
+    reason = models.CharField('退款原因', max_length=200, blank=True, default='')
+    status = models.CharField('状态', max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField('提交次数', default=0)
+    last_error = models.TextField('最近错误', blank=True, null=True)
+    next_retry_at = models.DateTimeField('下次重试时间', blank=True, null=True)
+    gateway_refund_id = models.CharField('网关退款号', max_length=128, blank=True, null=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='+', verbose_name='申请人')
+    created_at = models.DateTimeField('申请时间', auto_now_add=True)
+    submitted_at = models.DateTimeField('提交时间', blank=True, null=True)
+    completed_at = models.DateTimeField('完成时间', blank=True, null=True)
+    
+    class Meta:
+        verbose_name = '退款申请'
+        verbose_name_plural = '退款申请'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_retry_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.refund_no} - {self.amount} - {self.get_status_display()}'
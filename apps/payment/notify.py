@@ -0,0 +1,252 @@
+"""
+支付异步通知流水线
+
+1. 验签：用当前启用的 AlipayConfig / WeChatPayConfig / HuPiPayConfig 密钥校验通知
+   （配置与解析后的密钥按进程缓存，见 credentials），验签失败或商户不符直接拒绝，不写库；
+2. 去重：按 (网关, 订单号, 事件) 写入 PaymentNotification 幂等表。先查缓存，
+   网关重复推送的通知命中缓存后直接应答；缓存未命中时由唯一约束兜底，重复通知只产生一次查询；
+3. 应答：通知入表即应答网关，落账（支付记录 → 报名 → 课程名额、课时）提交到进程内线程池异步执行；
+4. 重试：落账失败按指数退避重试，由 process_payment_notifications 命令扫描到期的通知重新处理，
+   超过最大次数或通知与订单不符的标记为处理失败，需人工处理。
+"""
+
+import hashlib
+import hmac
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.payment.credentials import ConfigMissing, active_credentials
+from apps.payment.models import PaymentNotification
+from apps.payment.settlement import PaymentMismatch, apply_payment, close_payment
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidNotification(Exception):
+    """通知验签失败或内容不完整"""
+
+
+class Notification:
+    """验签通过的通知"""
+
+    def __init__(self, gateway, order_no, event, transaction_id=None, amount=None, payload=None):
+        self.gateway = gateway
+        self.order_no = order_no
+        self.event = event
+        self.transaction_id = transaction_id
+        self.amount = amount
+        self.payload = payload or {}
+
+
+def _active_config(gateway):
+    try:
+        return active_credentials(gateway)
+    except ConfigMissing as e:
+        raise InvalidNotification(str(e))
+
+
+def _amount(value):
+    try:
+        return Decimal(value).quantize(Decimal('0.01'))
+    except (TypeError, InvalidOperation):
+        raise InvalidNotification(f'金额格式错误: {value}')
+
+
+def _sign_content(data, exclude):
+    return '&'.join(f'{key}={data[key]}' for key in sorted(data)
+                    if key not in exclude and data[key] not in ('', None))
+
+
+def parse_alipay(data):
+    """支付宝异步通知：RSA2/RSA 验签（支付宝公钥）"""
+    import rsa
+
+    config = _active_config('alipay')
+    sign = data.get('sign')
+    if not sign or data.get('app_id') != config.app_id:
+        raise InvalidNotification('缺少签名或 app_id 不符')
+    message = _sign_content(data, ('sign', 'sign_type')).encode('utf-8')
+    try:
+        config.verify(message, sign)
+    except (rsa.VerificationError, ValueError) as e:
+        raise InvalidNotification(f'支付宝验签失败: {e}')
+
+    trade_status = data.get('trade_status')
+    if trade_status in ('TRADE_SUCCESS', 'TRADE_FINISHED'):
+        event = 'paid'
+    elif trade_status == 'TRADE_CLOSED':
+        event = 'closed'
+    else:
+        return None
+    return Notification('alipay', data.get('out_trade_no'), event, data.get('trade_no'),
+                        _amount(data.get('total_amount')), data)
+
+
+def wechat_sign(data, api_key, sign_type='MD5'):
+    """微信支付 V2 签名"""
+    content = f"{_sign_content(data, ('sign',))}&key={api_key}".encode('utf-8')
+    if sign_type == 'HMAC-SHA256':
+        return hmac.new(api_key.encode('utf-8'), content, hashlib.sha256).hexdigest().upper()
+    return hashlib.md5(content).hexdigest().upper()
+
+
+def parse_wechat(body):
+    """微信支付异步通知（XML）：MD5 / HMAC-SHA256 验签（API密钥）"""
+    try:
+        data = {child.tag: child.text or '' for child in ET.fromstring(body)}
+    except ET.ParseError as e:
+        raise InvalidNotification(f'XML解析失败: {e}')
+    if data.get('return_code') != 'SUCCESS':
+        raise InvalidNotification(f"通信失败: {data.get('return_msg')}")
+
+    config = _active_config('wechat')
+    if data.get('mch_id') != config.mch_id or data.get('appid') != config.app_id:
+        raise InvalidNotification('商户号或 appid 不符')
+    expected = wechat_sign(data, config.api_key, data.get('sign_type', 'MD5'))
+    if not hmac.compare_digest(expected, data.get('sign', '')):
+        raise InvalidNotification('微信支付验签失败')
+
+    event = 'paid' if data.get('result_code') == 'SUCCESS' else 'closed'
+    try:
+        amount = Decimal(int(data.get('total_fee'))) / 100
+    except (TypeError, ValueError):
+        raise InvalidNotification(f"金额格式错误: {data.get('total_fee')}")
+    return Notification('wechat', data.get('out_trade_no'), event, data.get('transaction_id'),
+                        _amount(amount), data)
+
+
+def hupipay_sign(data, app_secret):
+    """虎皮椒签名：参数按键排序拼接后追加 AppSecret 取 MD5"""
+    return hashlib.md5(f"{_sign_content(data, ('hash',))}{app_secret}".encode('utf-8')).hexdigest()
+
+
+def parse_hupipay(data):
+    """虎皮椒异步通知：MD5 验签（AppSecret）"""
+    config = _active_config('hupipay')
+    if data.get('appid') and data.get('appid') != config.app_id:
+        raise InvalidNotification('appid 不符')
+    if not hmac.compare_digest(hupipay_sign(data, config.app_secret), data.get('hash', '')):
+        raise InvalidNotification('虎皮椒验签失败')
+
+    status = data.get('status')
+    if status == 'OD':
+        event = 'paid'
+    elif status == 'CD':
+        event = 'closed'
+    else:
+        return None
+    return Notification('hupipay', data.get('trade_order_id'), event,
+                        data.get('transaction_id') or data.get('open_order_id'),
+                        _amount(data.get('total_fee')), data)
+
+
+def _dedupe_key(notification):
+    return f'payment:notify:{notification.gateway}:{notification.order_no}:{notification.event}'
+
+
+def receive(notification):
+    """
+    记录验签通过的通知并提交异步处理
+
+    重复通知直接返回 False，不写库。
+    """
+    if not notification.order_no:
+        raise InvalidNotification('缺少订单号')
+    key = _dedupe_key(notification)
+    if cache.get(key):
+        return False
+    record, created = PaymentNotification.objects.get_or_create(
+        gateway=notification.gateway, order_no=notification.order_no, event=notification.event,
+        defaults={
+            'transaction_id': notification.transaction_id,
+            'amount': notification.amount,
+            'payload': notification.payload,
+        },
+    )
+    # 入表后才写缓存，入表失败时网关的重试仍会被处理
+    cache.set(key, 1, settings.PAYMENT_NOTIFY_DEDUPE_TTL)
+    if created:
+        transaction.on_commit(lambda: submit(record.pk))
+    return created
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def submit(notification_id):
+    """提交到进程内线程池异步落账"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.PAYMENT_NOTIFY_WORKERS,
+                                               thread_name_prefix='payment-notify')
+    return _executor.submit(_process_in_thread, notification_id)
+
+
+def _process_in_thread(notification_id):
+    try:
+        process_notification(notification_id)
+    except Exception as e:
+        logger.error(f"支付通知处理异常: id={notification_id}, {e}")
+    finally:
+        close_old_connections()
+
+
+def retry_delay(attempts):
+    """第 N 次失败后的重试间隔：基数 * 2^(N-1)，最长1小时"""
+    return timedelta(seconds=min(settings.PAYMENT_NOTIFY_RETRY_BASE * 2 ** (attempts - 1), 3600))
+
+
+def process_notification(notification_id):
+    """落账一条通知，返回处理后的状态；已处理或正被其他进程处理的返回 None"""
+    with transaction.atomic():
+        notification = (PaymentNotification.objects.select_for_update(skip_locked=True)
+                        .filter(pk=notification_id, status__in=('pending', 'retry')).first())
+        if notification is None:
+            return None
+        notification.attempts += 1
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                if notification.event == 'paid':
+                    apply_payment(notification.order_no, notification.transaction_id, notification.amount)
+                else:
+                    close_payment(notification.order_no)
+        except PaymentMismatch as e:
+            logger.error(f"支付通知与订单不符: {notification}, {e}")
+            notification.status, notification.last_error = 'failed', str(e)
+        except Exception as e:
+            logger.warning(f"支付通知落账失败（第{notification.attempts}次）: {notification}, {e}")
+            notification.last_error = str(e)
+            if notification.attempts >= settings.PAYMENT_NOTIFY_MAX_ATTEMPTS:
+                notification.status = 'failed'
+            else:
+                notification.status = 'retry'
+                notification.next_retry_at = now + retry_delay(notification.attempts)
+        else:
+            notification.status, notification.processed_at, notification.last_error = 'done', now, None
+        notification.save(update_fields=['status', 'attempts', 'last_error', 'next_retry_at', 'processed_at'])
+    return notification.status
+
+
+def due_notifications(now=None, limit=500):
+    """到期待重试的通知，以及超过一定时间仍未处理的新通知（进程退出时未执行的异步任务）"""
+    now = now or timezone.now()
+    stale = now - timedelta(seconds=settings.PAYMENT_NOTIFY_RETRY_BASE)
+    return list(
+        PaymentNotification.objects.filter(
+            Q(status='retry', next_retry_at__lte=now) | Q(status='pending', created_at__lte=stale)
+        ).order_by('pk').values_list('pk', flat=True)[:limit]
+    )
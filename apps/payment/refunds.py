@@ -0,0 +1,255 @@
+"""
+批量退款
+
+退款申请（RefundRequest）状态机：
+
+    queued ─→ submitting ─→ succeeded
+                │   ↑
+                │   └── retry（可重试的失败，按指数退避到期后重新认领）
+                └─→ failed ─→ queued（后台重新提交）
+    queued / retry / failed ─→ cancelled（后台撤销）
+
+申请：已支付的报名 → 退款中（仍占名额），关联的已支付收费记录 → 退款中，每个报名一条排队的申请。
+
+process_refunds 按批处理到期的申请：
+
+1. 短事务内 SKIP LOCKED 认领一批，置为提交中；
+2. 事务外经限流的网关客户端以 workers 个线程并发提交退款（网关按退款单号去重，重复提交不会重复退款）；
+3. 一个事务内落账整批结果：
+   成功 —— 申请 → 已退款；支付记录 → 已退款；收费记录 → 已退款并记退款金额；报名 → 已退款；
+   扣回购课课时；按课程一条 UPDATE 归还名额；重算这批凭证；
+   拒绝或超过 REFUND_MAX_ATTEMPTS —— 申请 → 退款失败，报名与收费记录恢复为已支付。
+
+提交中的申请超过 REFUND_SUBMIT_TIMEOUT_MINUTES 仍未落账（进程中途退出）时重新认领。
+没有在线支付的报名（现金、转账收费）不经网关，由财务线下退还，随申请一并标记为已退款。
+"""
+
+import logging
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.classes.models import Course, Enrollment
+from apps.classes.seats import release_seats_bulk
+from apps.finance.ledger import sync_finance_payments, sync_payment_records
+from apps.finance.models import Payment
+from apps.payment.gateways import METHOD_GATEWAYS, RefundRejected, get_client
+from apps.payment.models import PaymentRecord, RefundRequest
+from apps.payment.status import publish_on_commit
+from apps.students.credits import debit_refunds
+
+logger = logging.getLogger(__name__)
+
+# 当前状态 → 可转入的状态
+TRANSITIONS = {
+    'queued': ('submitting', 'cancelled'),
+    'submitting': ('succeeded', 'retry', 'failed'),
+    'retry': ('submitting', 'cancelled'),
+    'failed': ('queued', 'cancelled'),
+    'succeeded': (),
+    'cancelled': (),
+}
+
+# 退款完成后课程仍可转正候补的状态
+PROMOTABLE_COURSE_STATUSES = ('enrolling', 'ongoing')
+
+
+def _sources(target):
+    """可转入 target 的状态"""
+    return [status for status, targets in TRANSITIONS.items() if target in targets]
+
+
+def retry_delay(attempts):
+    """第 N 次提交失败后的重试间隔：基数 * 2^(N-1)，最长1小时"""
+    return timedelta(seconds=min(settings.REFUND_RETRY_BASE * 2 ** (attempts - 1), 3600))
+
+
+def request_refunds(enrollment_ids, reason='', user=None):
+    """为已支付的报名申请全额退款，返回新建的申请数（非已支付的报名跳过）"""
+    with transaction.atomic():
+        rows = list(Enrollment.objects.select_for_update().filter(pk__in=enrollment_ids, status='paid')
+                    .values_list('pk', 'payment_record_id'))
+        if not rows:
+            return 0
+        ids = [pk for pk, _ in rows]
+        records = dict(PaymentRecord.objects.filter(
+            pk__in=[record_id for _, record_id in rows if record_id], status='paid'
+        ).values_list('pk', 'amount'))
+        offline = defaultdict(Decimal)
+        for enrollment_id, amount in Payment.objects.filter(enrollment_id__in=ids, status='paid').values_list(
+                'enrollment_id', 'actual_amount'):
+            offline[enrollment_id] += amount
+        Enrollment.objects.filter(pk__in=ids).update(status='refunding')
+        Payment.objects.filter(enrollment_id__in=ids, status='paid').update(status='refunding')
+        RefundRequest.objects.bulk_create([
+            RefundRequest(enrollment_id=pk, payment_record_id=record_id if record_id in records else None,
+                          amount=records.get(record_id, Decimal('0')) + offline[pk], reason=reason,
+                          created_by=user)
+            for pk, record_id in rows
+        ], batch_size=1000)
+    return len(rows)
+
+
+def request_course_refunds(course_id, reason='', user=None, batch_size=1000):
+    """为课程所有已支付的报名申请退款（课程取消），返回新建的申请数"""
+    ids = list(Enrollment.objects.filter(course_id=course_id, status='paid').order_by('pk')
+               .values_list('pk', flat=True))
+    return sum(request_refunds(ids[i:i + batch_size], reason, user) for i in range(0, len(ids), batch_size))
+
+
+def _restore_enrollments(enrollment_ids):
+    """退款未完成：报名与收费记录恢复为已支付"""
+    Enrollment.objects.filter(pk__in=enrollment_ids, status='refunding').update(status='paid')
+    Payment.objects.filter(enrollment_id__in=enrollment_ids, status='refunding').update(status='paid')
+
+
+def resubmit_refunds(ids):
+    """退款失败的申请重新排队（报名需仍为已支付），返回重新排队数"""
+    with transaction.atomic():
+        rows = list(RefundRequest.objects.select_for_update().filter(pk__in=ids, status__in=_sources('queued'))
+                    .values_list('pk', 'enrollment_id'))
+        paid = set(Enrollment.objects.select_for_update().filter(
+            pk__in=[enrollment_id for _, enrollment_id in rows], status='paid').values_list('pk', flat=True))
+        ids = [pk for pk, enrollment_id in rows if enrollment_id in paid]
+        RefundRequest.objects.filter(pk__in=ids).update(status='queued', attempts=0, last_error=None,
+                                                        next_retry_at=None, completed_at=None)
+        Enrollment.objects.filter(pk__in=paid).update(status='refunding')
+        Payment.objects.filter(enrollment_id__in=paid, status='paid').update(status='refunding')
+    return len(ids)
+
+
+def cancel_refunds(ids):
+    """撤销尚未提交成功的申请（提交中的不可撤销），返回撤销数"""
+    with transaction.atomic():
+        rows = list(RefundRequest.objects.select_for_update().filter(pk__in=ids, status__in=_sources('cancelled'))
+                    .values_list('pk', 'enrollment_id', 'status'))
+        RefundRequest.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(
+            status='cancelled', completed_at=timezone.now())
+        # 退款失败的申请落账时已恢复报名
+        _restore_enrollments([enrollment_id for _, enrollment_id, status in rows if status != 'failed'])
+    return len(rows)
+
+
+def _claim(batch_size, now):
+    """认领一批到期的申请置为提交中，返回提交所需字段"""
+    stale = now - timedelta(minutes=settings.REFUND_SUBMIT_TIMEOUT_MINUTES)
+    with transaction.atomic():
+        ids = list(RefundRequest.objects.select_for_update(skip_locked=True).filter(
+            Q(status='queued') | Q(status='retry', next_retry_at__lte=now)
+            | Q(status='submitting', submitted_at__lt=stale)
+        ).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        RefundRequest.objects.filter(pk__in=ids).update(status='submitting', submitted_at=now,
+                                                        attempts=F('attempts') + 1)
+    return list(RefundRequest.objects.filter(pk__in=ids).values(
+        'pk', 'refund_no', 'reason', 'attempts', 'enrollment_id', 'payment_record_id',
+        'payment_record__order_no', 'payment_record__amount', 'payment_record__payment_method',
+        'payment_record__status'))
+
+
+def _submit(row):
+    """提交一笔退款，返回 (row, 结果状态, 网关退款号, 错误)"""
+    gateway = METHOD_GATEWAYS.get(row['payment_record__payment_method'])
+    if gateway is None or row['payment_record__status'] == 'refunded':
+        # 无在线支付（线下退还）或支付记录已退款
+        return row, 'succeeded', None, None
+    amount = row['payment_record__amount']
+    try:
+        refund_id = get_client(gateway).refund(row['payment_record__order_no'], row['refund_no'], amount, amount,
+                                               row['reason'])
+    except RefundRejected as e:
+        logger.error(f"网关拒绝退款: 退款单号={row['refund_no']}, {e}")
+        return row, 'failed', None, str(e)
+    except Exception as e:
+        logger.warning(f"退款提交失败: 退款单号={row['refund_no']}, {e}")
+        return row, 'retry', None, str(e)
+    finally:
+        close_old_connections()
+    return row, 'succeeded', refund_id, None
+
+
+def _apply(outcomes, claimed_at):
+    """一个事务内落账一批提交结果，返回 (各状态数, {course_id: 归还名额数})"""
+    now = timezone.now()
+    stats = Counter()
+    with transaction.atomic():
+        # 只落账仍由本轮持有的申请（超时被其他进程重新认领的跳过）
+        held = set(RefundRequest.objects.select_for_update().filter(
+            pk__in=[row['pk'] for row, *_ in outcomes], status='submitting', submitted_at=claimed_at
+        ).values_list('pk', flat=True))
+        updates = []
+        succeeded = []
+        failed = []
+        for row, status, refund_id, error in outcomes:
+            if row['pk'] not in held:
+                continue
+            if status == 'retry' and row['attempts'] >= settings.REFUND_MAX_ATTEMPTS:
+                status = 'failed'
+            request = RefundRequest(pk=row['pk'], status=status, gateway_refund_id=refund_id, last_error=error,
+                                    next_retry_at=now + retry_delay(row['attempts']) if status == 'retry' else None,
+                                    completed_at=now if status != 'retry' else None)
+            updates.append(request)
+            stats[status] += 1
+            if status == 'succeeded':
+                succeeded.append(row)
+            elif status == 'failed':
+                failed.append(row['enrollment_id'])
+        RefundRequest.objects.bulk_update(updates, ['status', 'gateway_refund_id', 'last_error', 'next_retry_at',
+                                                    'completed_at'], batch_size=1000)
+        _restore_enrollments(failed)
+
+        freed = Counter()
+        if succeeded:
+            enrollment_ids = [row['enrollment_id'] for row in succeeded]
+            refunded = list(Enrollment.objects.select_for_update()
+                            .filter(pk__in=enrollment_ids, status='refunding').values_list('pk', 'course_id'))
+            Enrollment.objects.filter(pk__in=[pk for pk, _ in refunded]).update(status='refunded')
+            freed.update(course_id for _, course_id in refunded)
+            release_seats_bulk(freed)
+
+            records = {row['payment_record_id']: row['payment_record__order_no']
+                       for row in succeeded if row['payment_record_id']}
+            record_ids = list(records)
+            refunded_records = list(PaymentRecord.objects.filter(pk__in=record_ids, status='paid')
+                                    .values_list('pk', flat=True))
+            PaymentRecord.objects.filter(pk__in=refunded_records).update(
+                status='refunded', refunded_at=now, updated_at=now)
+            publish_on_commit((records[pk], 'refunded') for pk in refunded_records)
+            payment_ids = list(Payment.objects.filter(enrollment_id__in=enrollment_ids, status='refunding')
+                               .values_list('pk', flat=True))
+            Payment.objects.filter(pk__in=payment_ids).update(status='refunded', refund_amount=F('actual_amount'),
+                                                              refunded_at=now)
+            debit_refunds(record_ids)
+            sync_payment_records(record_ids)
+            sync_finance_payments(payment_ids)
+    return stats, freed
+
+
+def process_refunds(batch_size=500, workers=None):
+    """
+    处理到期的退款申请直到没有可认领的
+
+    返回 {'succeeded', 'retry', 'failed': 申请数, 'freed': {course_id: 归还名额数}}；
+    freed 只含仍在招生或上课中的课程（已取消的课程不转正候补）。
+    """
+    workers = workers or settings.REFUND_WORKERS
+    stats = Counter()
+    freed = Counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='refund') as pool:
+        while True:
+            claimed_at = timezone.now()
+            batch = _claim(batch_size, claimed_at)
+            if not batch:
+                break
+            batch_stats, batch_freed = _apply(list(pool.map(_submit, batch)), claimed_at)
+            stats.update(batch_stats)
+            freed.update(batch_freed)
+    promotable = set(Course.objects.filter(pk__in=list(freed), status__in=PROMOTABLE_COURSE_STATUSES)
+                     .values_list('pk', flat=True))
+    return {'succeeded': stats['succeeded'], 'retry': stats['retry'], 'failed': stats['failed'],
+            'freed': {course_id: seats for course_id, seats in freed.items() if course_id in promotable}}
@@ -0,0 +1,106 @@
+"""
+支付结果落账
+
+支付成功：支付记录 → 已支付；报名 → 已支付并确认名额保留（名额保留已过期被释放的重新占用）；
+记购课流水。交易关闭：待支付记录 → 支付失败，取消待支付报名并归还名额，事务提交后名额转给候补名单队首。
+
+报名重新下单后旧订单仍可能付款成功：经 PaymentRecord.enrollment 找到报名，报名尚未支付时改用该订单，
+另一笔待支付的新订单作废；报名已由其他订单支付时记错误日志，需人工退款。
+
+支付记录行加锁后按当前状态判断，重复调用不会重复处理。
+"""
+
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.classes.models import Enrollment
+from apps.classes.seats import cancel_enrollment, confirm_hold, reserve_seat
+from apps.classes.waitlist import promote_waitlist
+from apps.finance.ledger import sync_payment_records
+from apps.payment.models import PaymentRecord
+from apps.payment.status import publish_on_commit
+from apps.students.credits import credit_purchase
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentMismatch(Exception):
+    """通知与支付记录不符（订单不存在或金额不一致），重试无意义"""
+
+
+def apply_payment(order_no, transaction_id=None, amount=None, paid_at=None):
+    """支付成功落账，返回本次是否完成了状态变更"""
+    with transaction.atomic():
+        record = PaymentRecord.objects.select_for_update().filter(order_no=order_no).first()
+        if record is None:
+            raise PaymentMismatch(f'订单不存在: {order_no}')
+        if record.status == 'paid':
+            return False
+        if amount is not None and Decimal(amount) != record.amount:
+            raise PaymentMismatch(f'金额不一致: 订单 {record.amount}，通知 {amount}')
+
+        record.status = 'paid'
+        record.transaction_id = transaction_id or record.transaction_id
+        record.paid_at = paid_at or timezone.now()
+        record.save(update_fields=['status', 'transaction_id', 'paid_at', 'updated_at'])
+
+        owner = Q(payment_record=record)
+        if record.enrollment_id:
+            owner |= Q(pk=record.enrollment_id)
+        enrollment = Enrollment.objects.select_for_update().select_related('course').filter(owner).first()
+        if enrollment is None:
+            logger.warning(f"支付成功但未找到关联报名: 订单号={order_no}")
+            return True
+        if enrollment.payment_record_id != record.pk:
+            # 重新下单前的旧订单付款成功
+            if enrollment.status not in ('pending', 'cancelled'):
+                logger.error(f"报名已由其他订单支付，重复付款需人工退款: 订单号={order_no}, 报名={enrollment.pk}")
+                return True
+            _retire_order(enrollment.payment_record_id)
+            Enrollment.objects.filter(pk=enrollment.pk).update(payment_record=record)
+            enrollment.payment_record = record
+        if enrollment.status == 'cancelled':
+            # 名额保留已过期被释放，重新占用
+            if not reserve_seat(enrollment.course_id):
+                logger.error(f"支付成功但课程已满员，需人工退款: 订单号={order_no}")
+                return True
+        if enrollment.status in ('pending', 'cancelled'):
+            Enrollment.objects.filter(pk=enrollment.pk).update(status='paid')
+            enrollment.status = 'paid'
+        confirm_hold(enrollment)
+        credit_purchase(enrollment, record)
+    return True
+
+
+def _retire_order(record_id):
+    """报名改用其他订单，作废原来的待支付订单（不释放名额）"""
+    if record_id is None:
+        return
+    order_no = (PaymentRecord.objects.select_for_update().filter(pk=record_id, status='pending')
+                .values_list('order_no', flat=True).first())
+    if order_no is None:
+        return
+    PaymentRecord.objects.filter(pk=record_id).update(status='expired', updated_at=timezone.now())
+    sync_payment_records([record_id])
+    publish_on_commit([(order_no, 'expired')])
+
+
+def close_payment(order_no):
+    """交易关闭，返回本次是否完成了状态变更"""
+    with transaction.atomic():
+        record = PaymentRecord.objects.select_for_update().filter(order_no=order_no).first()
+        if record is None:
+            raise PaymentMismatch(f'订单不存在: {order_no}')
+        if record.status != 'pending':
+            return False
+        record.status = 'failed'
+        record.save(update_fields=['status', 'updated_at'])
+        enrollment = Enrollment.objects.filter(payment_record=record, status='pending').first()
+        if enrollment is not None and cancel_enrollment(enrollment):
+            course_id = enrollment.course_id
+            transaction.on_commit(lambda: promote_waitlist(course_id))
+    return True
@@ -0,0 +1,160 @@
+"""
+支付状态推送
+
+结账页通过 /api/payment/status/<order_no>/ 以长轮询或 SSE 等待支付结果。请求在进程内登记等待，
+不逐秒查库；支付记录状态变更（通知落账、交易关闭、过期、退款）在事务提交后广播 (订单号, 状态)：
+
+- USE_REDIS 时发布到 Redis 频道，每个 Web 进程一个后台线程订阅，唤醒本进程内等待该订单的请求；
+- 否则只唤醒本进程内的等待，其他 worker 进程的变更由读库复查发现。
+
+每个请求登记后读一次支付记录，等待期间释放数据库连接，每 PAYMENT_STATUS_RECHECK 秒未被唤醒时读库复查
+（广播丢失、订阅重连期间、未开启 Redis 的多进程部署）。
+等待中的请求占用工作线程，Web 进程需使用多线程 worker（gunicorn --worker-class gthread），
+每个容器同时等待的请求数上限为 GUNICORN_WORKERS × GUNICORN_THREADS，超出后新请求排队；
+更多并发等待按需调大线程数或增加副本。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.payment.models import PaymentRecord
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'payment:status'
+
+# 结账页不再等待的状态
+FINAL_STATUSES = ('paid', 'failed', 'expired', 'refunded')
+
+
+class Waiter:
+    """一个等待中的请求"""
+
+    def __init__(self, order_no):
+        self.order_no = order_no
+        self.status = None
+        self._event = threading.Event()
+
+    def wake(self, status):
+        self.status = status
+        self._event.set()
+
+    def wait(self, timeout):
+        """等待状态变更，返回新状态，超时返回 None"""
+        if not self._event.wait(timeout):
+            return None
+        self._event.clear()
+        return self.status
+
+
+_waiters = defaultdict(set)
+_lock = threading.Lock()
+_listener = None
+_listener_pid = None
+
+
+def register(order_no):
+    """登记等待（先登记再读库，读库后的变更不会丢失）"""
+    _start_listener()
+    waiter = Waiter(order_no)
+    with _lock:
+        _waiters[order_no].add(waiter)
+    return waiter
+
+
+def unregister(waiter):
+    with _lock:
+        waiters = _waiters.get(waiter.order_no)
+        if waiters is not None:
+            waiters.discard(waiter)
+            if not waiters:
+                del _waiters[waiter.order_no]
+
+
+def wake(order_no, status):
+    """唤醒本进程内等待该订单的请求，返回唤醒数"""
+    with _lock:
+        waiters = list(_waiters.get(order_no, ()))
+    for waiter in waiters:
+        waiter.wake(status)
+    return len(waiters)
+
+
+def waiting_count():
+    """本进程内等待中的请求数"""
+    with _lock:
+        return sum(len(waiters) for waiters in _waiters.values())
+
+
+def publish(changes):
+    """广播支付记录状态变更 [(订单号, 状态)]，一批一条消息；应在事务提交后调用"""
+    changes = list(changes)
+    if not changes:
+        return
+    if not settings.USE_REDIS:
+        for order_no, status in changes:
+            wake(order_no, status)
+        return
+    from django_redis import get_redis_connection
+    try:
+        get_redis_connection('default').publish(CHANNEL, json.dumps(changes))
+    except Exception as e:
+        # 等待中的请求超时后读库兜底
+        logger.warning(f"支付状态广播失败: {e}")
+
+
+def publish_on_commit(changes):
+    """当前事务提交后广播"""
+    changes = list(changes)
+    if changes:
+        transaction.on_commit(lambda: publish(changes))
+
+
+def _listen():
+    from django_redis import get_redis_connection
+
+    while True:
+        pubsub = None
+        try:
+            pubsub = get_redis_connection('default').pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CHANNEL)
+            while True:
+                # 带超时取消息，不受连接的 SOCKET_TIMEOUT 影响
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    for order_no, status in json.loads(message['data']):
+                        wake(order_no, status)
+        except Exception as e:
+            logger.warning(f"支付状态订阅中断，稍后重连: {e}")
+            time.sleep(1)
+        finally:
+            if pubsub is not None:
+                pubsub.close()
+
+
+def _start_listener():
+    """启动本进程的订阅线程（仅 USE_REDIS；fork 出的子进程重新启动）"""
+    global _listener, _listener_pid
+    if not settings.USE_REDIS or _listener_pid == os.getpid():
+        return
+    with _lock:
+        if _listener_pid != os.getpid():
+            _listener = threading.Thread(target=_listen, name='payment-status', daemon=True)
+            _listener.start()
+            _listener_pid = os.getpid()
+
+
+@receiver(post_save, sender=PaymentRecord)
+def _payment_record_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'status' not in update_fields):
+        return
+    publish_on_commit([(instance.order_no, instance.status)])
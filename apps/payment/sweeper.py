@@ -0,0 +1,170 @@
+"""
+待支付订单清理与网关对账
+
+待支付订单分两段处理：
+
+1. 创建超过 PAYMENT_ORDER_EXPIRE_HOURS 的：不再查询网关，按主键分批置为已过期；
+2. 创建超过 PAYMENT_ORDER_TTL_MINUTES 的（状态不确定：用户可能已付款但通知丢失）：
+   经限流的网关客户端多线程查询，已支付的按通知流程同样调用 apply_payment 落账（幂等），
+   已关闭或网关无此订单的置为已过期，仍在等待支付的留到下一轮。
+
+过期按批执行：每批一个短事务，SKIP LOCKED 锁定一批待支付记录，一条 UPDATE 置为过期，
+释放名额保留、取消待支付报名并按课程归还名额，随后重算这批凭证；网关查询不在事务内进行。
+过期后网关再推送支付成功通知时仍会正常落账。
+
+对账受网关限流约束：每个进程对每个网关的查询不超过 PAYMENT_GATEWAY_QPS 次/秒，workers 只用于掩盖网络延迟。
+默认 20 次/秒时，同一网关积压 10 万笔状态不确定的订单约需 83 分钟（10万 / 20 / 60），
+多个网关的订单并行查询。提高 QPS 前应确认网关签约的接口频率上限；多开进程会叠加频率，不能用来提速。
+积压不会无限增长：超过 PAYMENT_ORDER_EXPIRE_HOURS 的订单直接过期，不再查询。
+
+重新下单前由 close_stale_order 单独确认旧订单未付款（见 create_payment）。
+"""
+
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from apps.classes.seats import release_payment_holds
+from apps.finance.ledger import sync_payment_records
+from apps.payment.gateways import METHOD_GATEWAYS, get_client
+from apps.payment.models import PaymentRecord
+from apps.payment.settlement import PaymentMismatch, apply_payment
+from apps.payment.status import publish_on_commit
+
+logger = logging.getLogger(__name__)
+
+
+def expire_payments(ids, now=None):
+    """将仍为待支付的记录置为已过期并释放名额，返回 (过期数, {course_id: 释放名额数})"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        rows = list(PaymentRecord.objects.select_for_update(skip_locked=True)
+                    .filter(pk__in=ids, status='pending').values_list('pk', 'order_no'))
+        if not rows:
+            return 0, {}
+        ids = [pk for pk, _ in rows]
+        PaymentRecord.objects.filter(pk__in=ids).update(status='expired', updated_at=now)
+        freed = release_payment_holds(ids, now=now)
+        sync_payment_records(ids)
+        publish_on_commit((order_no, 'expired') for _, order_no in rows)
+    return len(ids), freed
+
+
+def _pending_batches(created_before, created_after=None, batch_size=1000):
+    """按主键分批读取待支付订单 (pk, 订单号, 支付方式)"""
+    last_pk = 0
+    while True:
+        queryset = PaymentRecord.objects.filter(status='pending', created_at__lt=created_before, pk__gt=last_pk)
+        if created_after is not None:
+            queryset = queryset.filter(created_at__gte=created_after)
+        batch = list(queryset.order_by('pk').values_list('pk', 'order_no', 'payment_method')[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1][0]
+
+
+def expire_abandoned(before=None, batch_size=1000):
+    """创建早于 before 的待支付订单直接置为已过期，返回 (过期数, {course_id: 释放名额数})"""
+    before = before or timezone.now() - timedelta(hours=settings.PAYMENT_ORDER_EXPIRE_HOURS)
+    expired, freed = 0, Counter()
+    for batch in _pending_batches(before, batch_size=batch_size):
+        count, batch_freed = expire_payments([pk for pk, _, _ in batch])
+        expired += count
+        freed.update(batch_freed)
+    return expired, dict(freed)
+
+
+def _query(order):
+    pk, order_no, payment_method = order
+    gateway = METHOD_GATEWAYS.get(payment_method)
+    if gateway is None:
+        return order, None
+    try:
+        return order, get_client(gateway).query(order_no)
+    except Exception as e:
+        logger.warning(f"网关查询失败: 订单号={order_no}, {e}")
+        return order, None
+    finally:
+        close_old_connections()
+
+
+def _settle(order_no, result):
+    try:
+        return apply_payment(order_no, result.transaction_id, result.amount, result.paid_at)
+    except PaymentMismatch as e:
+        logger.error(f"网关查询结果与订单不符，需人工处理: {e}")
+    except Exception as e:
+        logger.warning(f"网关查询已支付但落账失败: 订单号={order_no}, {e}")
+    finally:
+        close_old_connections()
+    return False
+
+
+def close_stale_order(record):
+    """
+    重新下单前确认超过有效期的待支付订单未付款，返回处理结果：
+
+    paid    网关已支付（已落账）或已由通知落账，不应重新下单；
+    pending 网关仍在等待支付，旧订单继续有效，不应重新下单；
+    error   查询失败，状态不确定，不应重新下单；
+    closed  网关已关闭或无此订单，本地置为已过期（名额保留与报名不动，随即改用新订单）。
+    """
+    gateway = METHOD_GATEWAYS.get(record.payment_method)
+    if gateway is not None:
+        try:
+            result = get_client(gateway).query(record.order_no)
+        except Exception as e:
+            logger.warning(f"网关查询失败: 订单号={record.order_no}, {e}")
+            return 'error'
+        if result.status == 'paid':
+            _settle(record.order_no, result)
+            return 'paid'
+        if result.status == 'pending':
+            return 'pending'
+    with transaction.atomic():
+        status = (PaymentRecord.objects.select_for_update().filter(pk=record.pk)
+                  .values_list('status', flat=True).first())
+        if status == 'pending':
+            PaymentRecord.objects.filter(pk=record.pk).update(status='expired', updated_at=timezone.now())
+            sync_payment_records([record.pk])
+            publish_on_commit([(record.order_no, 'expired')])
+    return 'paid' if status == 'paid' else 'closed'
+
+
+def reconcile_pending(before=None, after=None, batch_size=1000, workers=8):
+    """
+    向网关查询创建时间在 [after, before) 的待支付订单并按结果处理
+
+    返回 {'paid': 补落账数, 'expired': 过期数, 'pending': 仍待支付数, 'error': 查询失败数, 'freed': {...}}
+    """
+    now = timezone.now()
+    before = before or now - timedelta(minutes=settings.PAYMENT_ORDER_TTL_MINUTES)
+    after = after or now - timedelta(hours=settings.PAYMENT_ORDER_EXPIRE_HOURS)
+    stats = Counter()
+    freed = Counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='payment-sweep') as pool:
+        for batch in _pending_batches(before, after, batch_size=batch_size):
+            closed = []
+            paid = []
+            for (pk, order_no, _), result in pool.map(_query, batch):
+                if result is None:
+                    stats['error'] += 1
+                elif result.status == 'paid':
+                    paid.append((order_no, result))
+                elif result.status in ('closed', 'not_found'):
+                    closed.append(pk)
+                else:
+                    stats['pending'] += 1
+            stats['paid'] += sum(pool.map(lambda item: _settle(*item), paid))
+            if closed:
+                count, batch_freed = expire_payments(closed)
+                stats['expired'] += count
+                freed.update(batch_freed)
+    return {'paid': stats['paid'], 'expired': stats['expired'], 'pending': stats['pending'],
+            'error': stats['error'], 'freed': dict(freed)}
@@ -0,0 +1,232 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.classes.models import ClassType, Course, DanceType, Enrollment
+from apps.finance.models import LedgerLine, Payment
+from apps.payment import gateways
+from apps.payment.gateways import GatewayError, HuPiPayClient, RefundRejected, StubGatewayClient, set_client
+from apps.payment.models import PaymentNotification, PaymentRecord, RefundRequest
+from apps.payment.notify import Notification, process_notification, receive
+from apps.payment.refunds import cancel_refunds, process_refunds, request_refunds, resubmit_refunds
+from apps.payment.settlement import apply_payment
+from apps.students.models import ClassCreditEntry, Student
+from apps.teachers.models import Teacher
+from apps.users.models import User
+
+
+def create_course():
+    dance_type = DanceType.objects.create(name='爵士')
+    class_type = ClassType.objects.create(name='爵士初级', dance_type=dance_type, level='beginner',
+                                          age_range='8-12岁')
+    teacher = Teacher.objects.create(user=User.objects.create(username='teacher'), teacher_no='T001',
+                                     real_name='教师', specialty='爵士', join_date=date(2020, 1, 1))
+    return Course.objects.create(class_type=class_type, name='爵士初级1班', term='第1期', teacher=teacher,
+                                 start_date=date(2026, 9, 1), end_date=date(2026, 12, 31))
+
+
+def create_order(course, username, payment_method='alipay_web'):
+    """待支付的报名与订单"""
+    student = Student.objects.create(user=User.objects.create(username=username), student_no=username,
+                                     real_name='学员')
+    record = PaymentRecord.objects.create(student=student, amount=Decimal('200.00'),
+                                          payment_method=payment_method)
+    enrollment = Enrollment.objects.create(student=student, course=course, amount=Decimal('200.00'),
+                                           payment_record=record)
+    PaymentRecord.objects.filter(pk=record.pk).update(enrollment=enrollment)
+    return record, enrollment
+
+
+class PaymentNotifyIdempotencyTests(TestCase):
+    """支付通知去重与落账幂等"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = create_course()
+
+    def setUp(self):
+        cache.clear()
+        self.record, self.enrollment = create_order(self.course, 'S001')
+
+    def _notification(self):
+        return Notification('alipay', self.record.order_no, 'paid', 'T202609010001', Decimal('200.00'))
+
+    def _receive(self):
+        # 不执行提交后的线程池任务，落账在测试中同步调用
+        with self.captureOnCommitCallbacks(execute=False):
+            return receive(self._notification())
+
+    def test_duplicate_notification_is_recorded_once(self):
+        self.assertTrue(self._receive())
+        self.assertFalse(self._receive())
+        # 缓存失效后由唯一约束兜底
+        cache.clear()
+        self.assertFalse(self._receive())
+        self.assertEqual(PaymentNotification.objects.filter(order_no=self.record.order_no).count(), 1)
+
+    def test_duplicate_notification_does_not_settle_twice(self):
+        self._receive()
+        notification = PaymentNotification.objects.get(order_no=self.record.order_no)
+        self.assertEqual(process_notification(notification.pk), 'done')
+        self.assertIsNone(process_notification(notification.pk))
+
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.status, 'paid')
+        updated_at = self.record.updated_at
+        lines = list(LedgerLine.objects.filter(entry__order_no=self.record.order_no)
+                     .order_by('pk').values_list('pk', flat=True))
+        self.assertTrue(lines)
+
+        cache.clear()
+        self.assertFalse(self._receive())
+        self.assertFalse(apply_payment(self.record.order_no, 'T202609010001', Decimal('200.00')))
+
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.updated_at, updated_at)
+        self.assertEqual(list(LedgerLine.objects.filter(entry__order_no=self.record.order_no)
+                              .order_by('pk').values_list('pk', flat=True)), lines)
+        self.assertEqual(ClassCreditEntry.objects.filter(payment_record=self.record).count(), 1)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.status, 'paid')
+
+    def test_amount_mismatch_is_not_settled(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            receive(Notification('alipay', self.record.order_no, 'paid', 'T202609010001', Decimal('1.00')))
+        notification = PaymentNotification.objects.get(order_no=self.record.order_no)
+        self.assertEqual(process_notification(notification.pk), 'failed')
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.status, 'pending')
+
+
+class RefundStateTests(TestCase):
+    """退款申请状态机：成功、重试、失败恢复报名、重新提交与撤销"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = create_course()
+
+    def setUp(self):
+        self.refund_errors = {}
+        for gateway in ('alipay', 'wechat', 'hupipay'):
+            self.addCleanup(set_client, gateway, gateways._clients.get(gateway))
+            set_client(gateway, StubGatewayClient(gateway, refund_errors=self.refund_errors, rate=1e9))
+        self.record, self.enrollment = create_order(self.course, 'S001')
+        PaymentRecord.objects.filter(pk=self.record.pk).update(status='paid', paid_at=timezone.now())
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(status='paid')
+        Course.objects.filter(pk=self.course.pk).update(enrolled_count=1)
+        self.payment = Payment.objects.create(student=self.enrollment.student, enrollment=self.enrollment,
+                                              amount=Decimal('200.00'), actual_amount=Decimal('200.00'),
+                                              payment_method='cash', status='paid')
+        self.assertEqual(request_refunds([self.enrollment.pk]), 1)
+        self.request = RefundRequest.objects.get(enrollment=self.enrollment)
+
+    def assertStatuses(self, request, enrollment, record, payment):
+        self.request.refresh_from_db()
+        self.enrollment.refresh_from_db()
+        self.record.refresh_from_db()
+        self.payment.refresh_from_db()
+        self.assertEqual((self.request.status, self.enrollment.status, self.record.status, self.payment.status),
+                         (request, enrollment, record, payment))
+
+    def test_request_marks_enrollment_refunding(self):
+        self.assertStatuses('queued', 'refunding', 'paid', 'refunding')
+        self.assertEqual(self.request.amount, Decimal('400.00'))
+        # 已在退款中的报名不再重复申请
+        self.assertEqual(request_refunds([self.enrollment.pk]), 0)
+
+    def test_succeeded(self):
+        result = process_refunds(workers=1)
+        self.assertEqual((result['succeeded'], result['retry'], result['failed']), (1, 0, 0))
+        self.assertStatuses('succeeded', 'refunded', 'refunded', 'refunded')
+        self.assertEqual(self.request.gateway_refund_id, f'STUB{self.request.refund_no}')
+        self.assertEqual(self.payment.refund_amount, Decimal('200.00'))
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 0)
+        # 已完成的申请不再认领
+        self.assertEqual(process_refunds(workers=1)['succeeded'], 0)
+
+    def test_transient_error_is_retried(self):
+        self.refund_errors[self.record.order_no] = GatewayError('timeout')
+        result = process_refunds(workers=1)
+        self.assertEqual((result['succeeded'], result['retry'], result['failed']), (0, 1, 0))
+        self.assertStatuses('retry', 'refunding', 'paid', 'refunding')
+        self.assertGreater(self.request.next_retry_at, timezone.now())
+        self.assertEqual(self.request.last_error, 'timeout')
+        # 未到重试时间不认领
+        self.assertEqual(process_refunds(workers=1)['retry'], 0)
+
+        self.refund_errors.clear()
+        RefundRequest.objects.filter(pk=self.request.pk).update(next_retry_at=timezone.now())
+        self.assertEqual(process_refunds(workers=1)['succeeded'], 1)
+        self.assertStatuses('succeeded', 'refunded', 'refunded', 'refunded')
+        self.assertEqual(self.request.attempts, 2)
+
+    @override_settings(REFUND_RETRY_BASE=0, REFUND_MAX_ATTEMPTS=3)
+    def test_retries_exhausted_restore_enrollment(self):
+        self.refund_errors[self.record.order_no] = GatewayError('timeout')
+        result = process_refunds(workers=1)
+        self.assertEqual((result['retry'], result['failed']), (2, 1))
+        self.assertStatuses('failed', 'paid', 'paid', 'paid')
+        self.assertEqual(self.request.attempts, 3)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 1)
+
+    def test_rejected_fails_and_can_be_resubmitted(self):
+        self.refund_errors[self.record.order_no] = RefundRejected('交易不存在')
+        result = process_refunds(workers=1)
+        self.assertEqual((result['retry'], result['failed']), (0, 1))
+        self.assertStatuses('failed', 'paid', 'paid', 'paid')
+        self.assertEqual(self.request.attempts, 1)
+
+        self.refund_errors.clear()
+        self.assertEqual(resubmit_refunds([self.request.pk]), 1)
+        self.assertStatuses('queued', 'refunding', 'paid', 'refunding')
+        self.assertEqual(self.request.attempts, 0)
+        self.assertEqual(process_refunds(workers=1)['succeeded'], 1)
+        self.assertStatuses('succeeded', 'refunded', 'refunded', 'refunded')
+        self.assertEqual(resubmit_refunds([self.request.pk]), 0)
+
+    def test_cancel_restores_enrollment(self):
+        self.assertEqual(cancel_refunds([self.request.pk]), 1)
+        self.assertStatuses('cancelled', 'paid', 'paid', 'paid')
+        self.assertEqual(cancel_refunds([self.request.pk]), 0)
+        self.assertEqual(process_refunds(workers=1)['succeeded'], 0)
+
+    def test_cancel_failed_request(self):
+        self.refund_errors[self.record.order_no] = RefundRejected('交易不存在')
+        process_refunds(workers=1)
+        self.assertEqual(cancel_refunds([self.request.pk]), 1)
+        self.assertStatuses('cancelled', 'paid', 'paid', 'paid')
+        self.assertEqual(resubmit_refunds([self.request.pk]), 0)
+
+    def test_succeeded_cannot_be_cancelled(self):
+        process_refunds(workers=1)
+        self.assertEqual(cancel_refunds([self.request.pk]), 0)
+        self.assertStatuses('succeeded', 'refunded', 'refunded', 'refunded')
+
+
+class HuPiPayRefundErrorTests(TestCase):
+    """虎皮椒退款应答：只有业务拒绝码不重试"""
+
+    def _refund(self, errcode):
+        client = HuPiPayClient()
+        with mock.patch.object(HuPiPayClient, 'call', return_value={'errcode': errcode, 'errmsg': 'error'}):
+            return client.refund('PAY001', 'RF001', Decimal('200.00'), Decimal('200.00'))
+
+    def test_rejected(self):
+        for errcode in gateways.HUPIPAY_REJECTED:
+            with self.assertRaises(RefundRejected):
+                self._refund(errcode)
+
+    def test_other_errors_are_retryable(self):
+        for errcode in ('500', 'None'):
+            with self.assertRaises(GatewayError) as cm:
+                self._refund(errcode)
+            self.assertNotIsInstance(cm.exception, RefundRejected)
+
+    def test_succeeded(self):
+        self.assertEqual(self._refund(0), 'RF001')
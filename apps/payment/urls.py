@@ -6,8 +6,10 @@ urlpatterns = [
     # 支付创建和管理
     path('create/', views.create_payment, name='create'),
     path('list/', views.payment_list, name='list'),
+    path('export/', views.payment_export, name='export'),
     path('success/', views.payment_success, name='success'),
     path('failure/', views.payment_failure, name='failure'),
+    path('status/<str:order_no>/', views.payment_status, name='status'),
     # 支付回调
     path('alipay/notify/', views.alipay_notify, name='alipay_notify'),
     path('alipay/return/', views.alipay_return, name='alipay_return'),
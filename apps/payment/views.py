@@ -1,19 +1,61 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.paginator import Paginator
+from django.db import connection
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.conf import settings
 import json
+from datetime import timedelta
 import logging
-from datetime import datetime
-import uuid
+import time
 from .models import PaymentRecord, AlipayConfig, WeChatPayConfig, HuPiPayConfig
 from apps.classes.models import Enrollment
+from apps.classes.seats import SeatUnavailable, place_hold
+from apps.finance.pricing import PricingError, quote_enrollment
+from apps.payment.exports import export_csv, export_xlsx, filter_payments
+from apps.payment.notify import InvalidNotification, parse_alipay, parse_hupipay, parse_wechat, receive
+from apps.payment.status import FINAL_STATUSES, register, unregister
+from apps.payment.sweeper import close_stale_order
 from apps.students.models import Student
 
 logger = logging.getLogger(__name__)
 
+PAYMENT_LIST_PAGE_SIZE = 50
+
+# 会话中记录本浏览器创建的订单号（最近若干个）
+SESSION_ORDERS_KEY = 'payment_orders'
+SESSION_ORDERS_LIMIT = 20
+
+
+def _form_context(payment_record, enrollment):
+    return {
+        'payment_record': payment_record,
+        'enrollment': enrollment,
+        'order_no': payment_record.order_no,
+        'amount': payment_record.amount,
+        'student_name': enrollment.student.real_name,
+        'course_name': enrollment.course.name,
+    }
+
+
+def _remember_order(request, order_no):
+    """记录本会话创建的订单，支付结果页和状态推送只对订单所属会话开放"""
+    orders = [value for value in request.session.get(SESSION_ORDERS_KEY, []) if value != order_no]
+    request.session[SESSION_ORDERS_KEY] = (orders + [order_no])[-SESSION_ORDERS_LIMIT:]
+
+
+def _owns_order(request, order_no, student_user_id):
+    """订单号可按时间枚举，仅创建订单的会话、学员本人与后台人员可查看"""
+    if order_no in request.session.get(SESSION_ORDERS_KEY, ()):
+        return True
+    user = request.user
+    return user.is_authenticated and (user.is_staff or user.pk == student_user_id)
+
 
 def create_payment(request):
     """创建支付记录"""
@@ -25,7 +67,7 @@ def create_payment(request):
             return JsonResponse({'status': 'error', 'message': '报名ID不能为空'})
         
         try:
-            enrollment = Enrollment.objects.get(pk=enrollment_id)
+            enrollment = Enrollment.objects.select_related('student', 'course').get(pk=enrollment_id)
         except Enrollment.DoesNotExist:
             return JsonResponse({'status': 'error', 'message': '报名记录不存在'})
         
@@ -33,28 +75,33 @@ def create_payment(request):
         if enrollment.status == 'paid':
             return JsonResponse({'status': 'error', 'message': '该报名已经支付'})
         
-        # 检查是否已有支付记录
-        if enrollment.payment_record and enrollment.payment_record.status == 'pending':
-            payment_record = enrollment.payment_record
-        else:
-            # 创建新的支付记录
-            order_no = f"PAY{datetime.now().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:8].upper()}"
-            
-            # 计算收费金额
-            if enrollment.amount > 0:
-                amount = enrollment.amount
-            elif enrollment.price_policy:
-                amount = enrollment.price_policy.price
-            else:
-                # 默认按课程最大人数和需要的课次计算，此处省略
+        # 复用未过有效期的待支付记录；超过有效期的先向网关确认未付款并关闭，才重新下单，避免重复扣款
+        stale_before = timezone.now() - timedelta(minutes=settings.PAYMENT_ORDER_TTL_MINUTES)
+        payment_record = enrollment.payment_record
+        if payment_record and payment_record.status == 'pending' and payment_record.created_at <= stale_before:
+            result = close_stale_order(payment_record)
+            if result == 'paid':
+                return JsonResponse({'status': 'error', 'message': '该报名已经支付'})
+            if result == 'error':
+                return JsonResponse({'status': 'error', 'message': '订单状态确认中，请稍后再试'})
+            if result == 'closed':
+                payment_record = None
+        elif payment_record and payment_record.status != 'pending':
+            payment_record = None
+        if payment_record is None:
+            # 创建新的支付记录，金额由报价引擎计算（报名单独约定的金额优先）
+            try:
+                amount = quote_enrollment(enrollment)
+            except PricingError:
                 amount = 0
             
             if amount <= 0:
                 return JsonResponse({'status': 'error', 'message': '无效的收费金额'})
             
+            # 订单号由 Snowflake 生成器在进程内生成
             payment_record = PaymentRecord.objects.create(
                 student=enrollment.student,
-                order_no=order_no,
+                enrollment=enrollment,
                 amount=amount,
                 payment_method=payment_method,
                 status='pending',
@@ -62,40 +109,72 @@ def create_payment(request):
             
             # 更新enrollment的支付记录
             enrollment.payment_record = payment_record
-            enrollment.save()
+            enrollment.save(update_fields=['payment_record'])
         
-        # 返回支付页面，包含订单信息
-        context = {
-            'payment_record': payment_record,
-            'enrollment': enrollment,
-            'order_no': payment_record.order_no,
-            'amount': payment_record.amount,
-            'student_name': enrollment.student.real_name,
-            'course_name': enrollment.course.name,
-        }
+        # 支付期间限时保留名额，超时未支付由清理任务释放
+        try:
+            place_hold(enrollment, payment_record)
+        except SeatUnavailable as e:
+            return JsonResponse({'status': 'error', 'message': str(e)})
+        _remember_order(request, payment_record.order_no)
         
-        return render(request, 'payment/payment_form.html', context)
+        # 返回支付页面，包含订单信息
+        return render(request, 'payment/payment_form.html', _form_context(payment_record, enrollment))
     except Exception as e:
         logger.error(f"创建支付记录失败: {e}")
         return JsonResponse({'status': 'error', 'message': '创建支付记录失败'})
 
 
+@staff_member_required
 def payment_list(request):
-    """支付记录列表"""
-    payments = PaymentRecord.objects.all()
-    context = {'payments': payments}
+    """支付记录列表（分页、筛选）"""
+    try:
+        payments = filter_payments(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('参数错误')
+    page = Paginator(payments, PAYMENT_LIST_PAGE_SIZE).get_page(request.GET.get('page'))
+    query = request.GET.copy()
+    query.pop('page', None)
+    context = {
+        'page': page,
+        'payments': page.object_list,
+        'filters': request.GET,
+        'query': query.urlencode(),
+        'status_choices': PaymentRecord.STATUS_CHOICES,
+        'method_choices': PaymentRecord.PAYMENT_METHOD_CHOICES,
+    }
     return render(request, 'payment/payment_list.html', context)
 
 
+@staff_member_required
+def payment_export(request):
+    """支付记录导出：?format=csv|xlsx，筛选条件同列表"""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in ('csv', 'xlsx'):
+        return HttpResponseBadRequest('参数错误')
+    try:
+        payments = filter_payments(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('参数错误')
+    filename = f"payments-{timezone.localdate():%Y%m%d}"
+    if export_format == 'xlsx':
+        return export_xlsx(payments, filename)
+    return export_csv(payments, filename)
+
+
 def payment_success(request):
     """支付成功流程"""
     order_no = request.GET.get('order_no', '')
     try:
-        payment_record = PaymentRecord.objects.get(order_no=order_no)
-        # 更新报名计划是否为已支付
-        enrollment = Enrollment.objects.get(payment_record=payment_record)
-        enrollment.status = 'paid'
-        enrollment.save()
+        payment_record = PaymentRecord.objects.select_related('student').get(order_no=order_no)
+        if not _owns_order(request, order_no, payment_record.student.user_id):
+            raise PaymentRecord.DoesNotExist
+        # 支付状态以验签后的异步通知为准：通知未到时回到支付页等待状态推送
+        enrollment = Enrollment.objects.select_related('student', 'course').get(payment_record=payment_record)
+        if payment_record.status == 'pending':
+            return render(request, 'payment/payment_form.html', _form_context(payment_record, enrollment))
+        if payment_record.status != 'paid':
+            return redirect('payment:failure')
         
         context = {'payment_record': payment_record, 'enrollment': enrollment}
         return render(request, 'payment/payment_success.html', context)
@@ -108,25 +187,117 @@ def payment_failure(request):
     return render(request, 'payment/payment_failure.html')
 
 
+def _current_status(order_no):
+    return PaymentRecord.objects.filter(order_no=order_no).values_list('status', flat=True).first()
+
+
+def _recheck_status(order_no):
+    """等待期间读库复查（其他进程的变更未开启 Redis 时不会唤醒本进程），读完释放连接"""
+    try:
+        return _current_status(order_no)
+    finally:
+        connection.close()
+
+
+def _status_and_owner(order_no):
+    """(状态, 学员的用户ID)，订单不存在时为 (None, None)"""
+    return PaymentRecord.objects.filter(order_no=order_no).values_list(
+        'status', 'student__user_id').first() or (None, None)
+
+
+def _status_event(order_no, status):
+    return f"event: status\ndata: {json.dumps({'order_no': order_no, 'status': status})}\n\n"
+
+
+def _status_events(waiter, status):
+    """SSE：先推送当前状态，之后每次变更推送一次，结束状态或超过时长后关闭（浏览器按 retry 重连）"""
+    try:
+        yield f'retry: {settings.PAYMENT_STATUS_RETRY_MS}\n'
+        yield _status_event(waiter.order_no, status)
+        # 等待期间不占用数据库连接
+        connection.close()
+        now = time.monotonic()
+        deadline = now + settings.PAYMENT_STATUS_STREAM_SECONDS
+        next_ping = now + settings.PAYMENT_STATUS_HEARTBEAT
+        while status not in FINAL_STATUSES:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            changed = waiter.wait(min(settings.PAYMENT_STATUS_RECHECK, next_ping - now, deadline - now))
+            if changed is None:
+                changed = _recheck_status(waiter.order_no)
+            if changed is not None and changed != status:
+                status = changed
+                yield _status_event(waiter.order_no, status)
+            elif time.monotonic() >= next_ping:
+                # 心跳，防止代理断开空闲连接
+                yield ': ping\n\n'
+            else:
+                continue
+            next_ping = time.monotonic() + settings.PAYMENT_STATUS_HEARTBEAT
+    finally:
+        unregister(waiter)
+
+
+def payment_status(request, order_no):
+    """
+    支付状态（按订单号等待变更，不逐秒查库）
+
+    Accept: text/event-stream（EventSource）时以 SSE 推送；
+    否则为 JSON 长轮询：?since=已知状态&timeout=秒，状态与 since 不同时立即返回，否则等到变更或超时。
+    只对订单所属的会话、学员本人与后台人员开放，其他请求按订单不存在处理。
+    """
+    streaming = 'text/event-stream' in request.headers.get('Accept', '')
+    since = request.GET.get('since', 'pending')
+    try:
+        timeout = min(float(request.GET.get('timeout', settings.PAYMENT_STATUS_WAIT)), settings.PAYMENT_STATUS_WAIT)
+    except ValueError:
+        return HttpResponseBadRequest('参数错误')
+    
+    # 先登记再读库，读库之后的变更不会漏掉
+    waiter = register(order_no)
+    try:
+        status, student_user_id = _status_and_owner(order_no)
+        owned = status is not None and _owns_order(request, order_no, student_user_id)
+    except Exception:
+        unregister(waiter)
+        raise
+    if not owned:
+        unregister(waiter)
+        return JsonResponse({'status': 'error', 'message': '订单不存在'}, status=404)
+    
+    if streaming:
+        response = StreamingHttpResponse(_status_events(waiter, status), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    try:
+        deadline = time.monotonic() + timeout
+        connection.close()
+        while status == since and status not in FINAL_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # 未被唤醒时读库复查（广播丢失、其他进程的变更）
+            status = waiter.wait(min(settings.PAYMENT_STATUS_RECHECK, remaining)) or _recheck_status(order_no)
+    finally:
+        unregister(waiter)
+    return JsonResponse({'order_no': order_no, 'status': status})
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def alipay_notify(request):
     """支付宝异步通知"""
     try:
-        # 获取支付宝POST过来的数据
-        data = request.POST.dict()
-        
-        # 验证签名（这里需要实现具体的验证逻辑）
-        # 如果验证通过，更新支付记录状态
-        order_no = data.get('out_trade_no')
-        trade_status = data.get('trade_status')
-        
-        # TODO: 实现具体的支付宝验签逻辑和订单状态更新
-        
-        logger.info(f"支付宝异步通知: 订单号={order_no}, 状态={trade_status}")
-        
-        # 返回成功响应
+        notification = parse_alipay(request.POST.dict())
+        if notification is not None:
+            receive(notification)
         return HttpResponse("success")
+    except InvalidNotification as e:
+        logger.warning(f"支付宝异步通知验签失败: {e}")
+        return HttpResponse("fail")
     except Exception as e:
         logger.error(f"支付宝异步通知处理失败: {e}")
         return HttpResponse("fail")
@@ -145,11 +316,15 @@ def alipay_return(request):
         
         logger.info(f"支付宝同步返回: 订单号={order_no}")
         
-        # 重定向到支付成功页面
-        return redirect('/payment/success/')
+        # 重定向到支付成功页面（未收到异步通知时在支付页等待状态推送）
+        return redirect(f"{reverse('payment:success')}?order_no={order_no}")
     except Exception as e:
         logger.error(f"支付宝同步返回处理失败: {e}")
-        return redirect('/payment/failure/')
+        return redirect('payment:failure')
+
+
+WECHAT_SUCCESS = '<xml><return_code><![CDATA[SUCCESS]]></return_code><return_msg><![CDATA[OK]]></return_msg></xml>'
+WECHAT_FAIL = '<xml><return_code><![CDATA[FAIL]]></return_code><return_msg><![CDATA[ERROR]]></return_msg></xml>'
 
 
 @csrf_exempt
@@ -157,24 +332,15 @@ def alipay_return(request):
 def wechat_notify(request):
     """微信支付异步通知"""
     try:
-        # 获取微信支付POST过来的数据
-        data = request.body.decode('utf-8')
-        
-        # 解析XML数据（这里需要实现具体的解析逻辑）
-        # 验证签名（这里需要实现具体的验证逻辑）
-        # 如果验证通过，更新支付记录状态
-        
-        # TODO: 实现具体的微信支付验签逻辑和订单状态更新
-        
-        logger.info("微信支付异步通知")
-        
-        # 返回成功响应（XML格式）
-        return HttpResponse('<xml><return_code><![CDATA[SUCCESS]]></return_code><return_msg><![CDATA[OK]]></return_msg></xml>', 
-                          content_type='text/xml')
+        notification = parse_wechat(request.body)
+        receive(notification)
+        return HttpResponse(WECHAT_SUCCESS, content_type='text/xml')
+    except InvalidNotification as e:
+        logger.warning(f"微信支付异步通知验签失败: {e}")
+        return HttpResponse(WECHAT_FAIL, content_type='text/xml')
     except Exception as e:
         logger.error(f"微信支付异步通知处理失败: {e}")
-        return HttpResponse('<xml><return_code><![CDATA[FAIL]]></return_code><return_msg><![CDATA[ERROR]]></return_msg></xml>', 
-                          content_type='text/xml')
+        return HttpResponse(WECHAT_FAIL, content_type='text/xml')
 
 
 @csrf_exempt
@@ -182,20 +348,18 @@ def wechat_notify(request):
 def hupipay_notify(request):
     """虎皮椒支付异步通知"""
     try:
-        # 获取虎皮椒POST过来的数据
-        data = json.loads(request.body.decode('utf-8'))
-        
-        # 验证签名（这里需要实现具体的验证逻辑）
-        # 如果验证通过，更新支付记录状态
-        order_no = data.get('out_trade_no')
-        status = data.get('status')
-        
-        # TODO: 实现具体的虎皮椒验签逻辑和订单状态更新
-        
-        logger.info(f"虎皮椒异步通知: 订单号={order_no}, 状态={status}")
-        
-        # 返回成功响应
+        # 虎皮椒以表单提交通知，兼容JSON
+        if request.content_type == 'application/json':
+            data = json.loads(request.body.decode('utf-8'))
+        else:
+            data = request.POST.dict()
+        notification = parse_hupipay(data)
+        if notification is not None:
+            receive(notification)
         return JsonResponse({'status': 'success'})
+    except InvalidNotification as e:
+        logger.warning(f"虎皮椒异步通知验签失败: {e}")
+        return JsonResponse({'status': 'fail'})
     except Exception as e:
         logger.error(f"虎皮椒异步通知处理失败: {e}")
         return JsonResponse({'status': 'fail'})
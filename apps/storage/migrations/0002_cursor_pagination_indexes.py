@@ -0,0 +1,27 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RenameIndex(
+            model_name='mediafile',
+            new_name='storage_med_file_ty_31be32_idx',
+            old_name='storage_med_file_ty_123456_idx',
+        ),
+        migrations.RenameIndex(
+            model_name='mediafile',
+            new_name='storage_med_storage_0ff624_idx',
+            old_name='storage_med_storage_654321_idx',
+        ),
+        migrations.AddIndex(
+            model_name='mediafile',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='storage_med_uploade_76ed4f_idx'),
+        ),
+    ]
@@ -102,6 +102,8 @@ class MediaFile(models.Model):
         indexes = [
             models.Index(fields=['file_type', '-uploaded_at']),
             models.Index(fields=['storage_config', '-uploaded_at']),
+            # 游标分页：ORDER BY uploaded_at DESC, id DESC
+            models.Index(fields=['-uploaded_at', '-id']),
         ]
     
     def __str__(self):
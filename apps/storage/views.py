@@ -10,6 +10,7 @@ import os
 from .models import StorageConfig, MediaFile
 from .serializers import StorageConfigSerializer, MediaFileSerializer, MediaFileUploadSerializer
 from .storage_backends import get_storage_backend
+from water_cube_studio.pagination import HybridPagination
 
 
 class StorageConfigViewSet(viewsets.ModelViewSet):
@@ -49,6 +50,8 @@ class MediaFileViewSet(viewsets.ModelViewSet):
     search_fields = ['file_name', 'storage_path']
     ordering_fields = ['uploaded_at', 'file_size']
     ordering = ['-uploaded_at']
+    pagination_class = HybridPagination
+    cursor_ordering = ('-uploaded_at', '-id')
     
     def get_serializer_class(self):
         """根据操作获取不同的序列化器"""
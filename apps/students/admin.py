@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Student
+from .credits import adjust_credits
+from .models import ClassCreditEntry, ClassCreditSnapshot, Student
 
 
 @admin.register(Student)
@@ -10,7 +11,8 @@ class StudentAdmin(admin.ModelAdmin):
     list_filter = ['status', 'enrollment_date']
     search_fields = ['student_no', 'real_name', 'user__phone', 'user__email']
     list_editable = ['status']
-    readonly_fields = ['created_at', 'updated_at', 'total_spent']
+    # 课时与消费由课时流水维护，调整请新增课时流水
+    readonly_fields = ['created_at', 'updated_at', 'total_classes', 'remaining_classes', 'total_spent']
     
     fieldsets = (
         ('基本信息', {
@@ -27,3 +29,34 @@ class StudentAdmin(admin.ModelAdmin):
             'fields': ('health_info', 'special_notes')
         }),
     )
+
+
+@admin.register(ClassCreditEntry)
+class ClassCreditEntryAdmin(admin.ModelAdmin):
+    """课时流水（只能新增人工调整）"""
+    list_display = ['id', 'student', 'entry_type', 'classes', 'amount', 'attendance_id',
+                    'payment_record', 'created_at']
+    list_filter = ['entry_type', 'created_at']
+    search_fields = ['student__student_no', 'student__real_name']
+    raw_id_fields = ['student', 'enrollment', 'payment_record']
+    fields = ['student', 'classes', 'notes']
+    
+    def save_model(self, request, obj, form, change):
+        if not change:
+            entry = adjust_credits(obj.student_id, obj.classes, obj.notes)
+            obj.pk = entry.pk
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ClassCreditSnapshot)
+class ClassCreditSnapshotAdmin(admin.ModelAdmin):
+    """课时余额快照"""
+    list_display = ['student', 'last_entry_id', 'remaining_classes', 'total_classes', 'total_spent',
+                    'created_at']
+    search_fields = ['student__student_no', 'student__real_name']
+    raw_id_fields = ['student']
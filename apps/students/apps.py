@@ -5,3 +5,7 @@ class StudentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.students'
     verbose_name = '学员管理'
+    
+    def ready(self):
+        # 注册考勤变动的课时记账
+        from apps.students import credits  # noqa: F401
@@ -0,0 +1,262 @@
+"""
+学员课时账
+
+每次课时变动追加一条 ClassCreditEntry 流水：支付成功记购课（+课时、+金额），退款成功扣回购课
+（-课时、-金额），考勤标记为出勤/迟到记上课消耗（-1），状态改回缺勤/请假或考勤删除时记冲正（+1）。
+写流水的同时用 F 表达式原子更新 Student 上的 remaining_classes / total_classes /
+total_spent，读取余额只需读学员行。
+
+写流水前先锁定相关学员行（按主键排序加锁避免死锁），同一学员的流水串行写入，
+考勤的净消耗按流水求和判断，重复处理同一考勤不会重复扣课时。
+
+余额快照 ClassCreditSnapshot 按批次（同一截至流水ID）定期生成；重建余额时
+从最近一次快照加上之后的流水一次分组汇总，按批 CASE WHEN 更新，不逐个学员计算。
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, DecimalField, Max, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.dispatch import receiver
+
+from apps.attendance.models import Attendance
+from apps.attendance.recording import ATTENDED_STATUSES
+from apps.attendance.signals import attendance_changed
+from apps.students.models import ClassCreditEntry, ClassCreditSnapshot, Student
+
+
+# 计入总课时的流水类型
+PURCHASED_TYPES = ('purchase', 'opening', 'refund')
+
+
+def _lock_students(student_ids):
+    list(Student.objects.select_for_update().filter(pk__in=student_ids).order_by('pk')
+         .values_list('pk', flat=True))
+
+
+def _apply_deltas(deltas):
+    """deltas: {student_id: (课时变动, 购课课时, 金额)}，一条UPDATE原子累加"""
+    deltas = {pk: delta for pk, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+
+    def case(index, output_field):
+        return Case(*[When(pk=pk, then=Value(delta[index])) for pk, delta in deltas.items()],
+                    default=Value(0), output_field=output_field)
+
+    Student.objects.filter(pk__in=deltas).update(
+        remaining_classes=F('remaining_classes') + case(0, IntegerField()),
+        total_classes=F('total_classes') + case(1, IntegerField()),
+        total_spent=F('total_spent') + case(2, DecimalField(max_digits=10, decimal_places=2)),
+    )
+
+
+def sync_attendance_credits(attendance_ids):
+    """按考勤当前状态补记上课消耗或冲正，返回新增流水数"""
+    attendance_ids = set(attendance_ids)
+    if not attendance_ids:
+        return 0
+    with transaction.atomic():
+        current = {
+            pk: (student_id, status)
+            for pk, student_id, status in Attendance.objects.filter(pk__in=attendance_ids)
+            .values_list('pk', 'student_id', 'status')
+        }
+        student_ids = {student_id for student_id, _ in current.values()}
+        student_ids.update(ClassCreditEntry.objects.filter(attendance_id__in=attendance_ids)
+                           .values_list('student_id', flat=True).distinct())
+        _lock_students(student_ids)
+        # 加锁后读取已记流水，同一学员的并发处理不会重复记账
+        booked = {
+            (row['attendance_id'], row['student_id']): row['net']
+            for row in ClassCreditEntry.objects.filter(attendance_id__in=attendance_ids)
+            .values('attendance_id', 'student_id').annotate(net=Sum('classes'))
+        }
+
+        targets = {}
+        for pk, (student_id, status) in current.items():
+            targets[(pk, student_id)] = -1 if status in ATTENDED_STATUSES else 0
+        for key in booked:
+            # 考勤已删除或换了学员：原流水全部冲正
+            targets.setdefault(key, 0)
+
+        entries = []
+        deltas = {}
+        for (attendance_id, student_id), target in targets.items():
+            delta = target - (booked.get((attendance_id, student_id)) or 0)
+            if not delta:
+                continue
+            entries.append(ClassCreditEntry(
+                student_id=student_id, attendance_id=attendance_id, classes=delta,
+                entry_type='consume' if delta < 0 else 'reversal',
+            ))
+            remaining, total, spent = deltas.get(student_id, (0, 0, Decimal('0')))
+            deltas[student_id] = (remaining + delta, total, spent)
+        ClassCreditEntry.objects.bulk_create(entries)
+        _apply_deltas(deltas)
+    return len(entries)
+
+
+@receiver(attendance_changed)
+def _on_attendance_changed(sender, attendance_ids, **kwargs):
+    sync_attendance_credits(attendance_ids)
+
+
+def purchased_classes(enrollment):
+    """报名购买的课时：次卡按策略课次，否则按课程总课次"""
+    policy = enrollment.price_policy
+    if policy is not None and policy.sessions:
+        return policy.sessions
+    return enrollment.course.total_sessions
+
+
+def credit_purchase(enrollment, payment_record):
+    """支付成功记购课流水，同一支付记录只记一次；返回新建的流水或None"""
+    classes = purchased_classes(enrollment)
+    amount = payment_record.amount
+    with transaction.atomic():
+        _lock_students([enrollment.student_id])
+        if ClassCreditEntry.objects.filter(payment_record=payment_record, entry_type='purchase').exists():
+            return None
+        entry = ClassCreditEntry.objects.create(
+            student_id=enrollment.student_id, entry_type='purchase', classes=classes, amount=amount,
+            enrollment=enrollment, payment_record=payment_record,
+        )
+        _apply_deltas({enrollment.student_id: (classes, classes, amount)})
+    return entry
+
+
+def debit_refunds(payment_record_ids):
+    """退款成功扣回这些支付记录的购课流水（每条只扣一次），一条UPDATE更新学员余额；返回新建的流水数"""
+    purchases = list(ClassCreditEntry.objects.filter(payment_record_id__in=payment_record_ids,
+                                                     entry_type='purchase')
+                     .values_list('student_id', 'payment_record_id', 'enrollment_id', 'classes', 'amount'))
+    if not purchases:
+        return 0
+    with transaction.atomic():
+        _lock_students({student_id for student_id, *_ in purchases})
+        refunded = set(ClassCreditEntry.objects.filter(payment_record_id__in=payment_record_ids,
+                                                       entry_type='refund')
+                       .values_list('payment_record_id', flat=True))
+        entries = []
+        deltas = {}
+        for student_id, payment_record_id, enrollment_id, classes, amount in purchases:
+            if payment_record_id in refunded:
+                continue
+            entries.append(ClassCreditEntry(student_id=student_id, entry_type='refund', classes=-classes,
+                                            amount=-amount, enrollment_id=enrollment_id,
+                                            payment_record_id=payment_record_id))
+            remaining, total, spent = deltas.get(student_id, (0, 0, Decimal('0')))
+            deltas[student_id] = (remaining - classes, total - classes, spent - amount)
+        ClassCreditEntry.objects.bulk_create(entries, batch_size=1000)
+        _apply_deltas(deltas)
+    return len(entries)
+
+
+def adjust_credits(student_id, classes, notes=None):
+    """人工调整剩余课时"""
+    with transaction.atomic():
+        _lock_students([student_id])
+        entry = ClassCreditEntry.objects.create(student_id=student_id, entry_type='adjust',
+                                                classes=classes, notes=notes)
+        _apply_deltas({student_id: (classes, 0, Decimal('0'))})
+    return entry
+
+
+def _latest_snapshot_cut():
+    return ClassCreditSnapshot.objects.aggregate(cut=Max('last_entry_id'))['cut'] or 0
+
+
+def _ledger_balances(student_ids, since_cut, upto_id=None):
+    """从快照加之后的流水汇总余额：{student_id: (剩余课时, 总课时, 累计消费)}"""
+    balances = {
+        student_id: (remaining, total, spent)
+        for student_id, remaining, total, spent in ClassCreditSnapshot.objects.filter(
+            last_entry_id=since_cut, student_id__in=student_ids
+        ).values_list('student_id', 'remaining_classes', 'total_classes', 'total_spent')
+    } if since_cut else {}
+    tail = ClassCreditEntry.objects.filter(student_id__in=student_ids, pk__gt=since_cut)
+    if upto_id is not None:
+        tail = tail.filter(pk__lte=upto_id)
+    rows = tail.values('student_id').annotate(
+        remaining=Sum('classes'),
+        total=Coalesce(Sum('classes', filter=Q(entry_type__in=PURCHASED_TYPES)), 0),
+        spent=Sum('amount'),
+    )
+    for row in rows:
+        remaining, total, spent = balances.get(row['student_id'], (0, 0, Decimal('0')))
+        balances[row['student_id']] = (remaining + row['remaining'], total + row['total'],
+                                       spent + row['spent'])
+    return balances
+
+
+def _student_batches(batch_size):
+    last_pk = 0
+    while True:
+        batch = list(Student.objects.filter(pk__gt=last_pk).order_by('pk')
+                     .values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
+
+
+def rebuild_balances(batch_size=1000, dry_run=False):
+    """
+    按流水重建所有学员的课时余额
+
+    每批学员：加锁、一次分组汇总（最近快照 + 之后的流水）、一条 CASE WHEN 更新。
+    返回 [(student_id, 原值, 重建值)]，值为 (剩余课时, 总课时, 累计消费)。
+    """
+    cut = _latest_snapshot_cut()
+    drifted = []
+    for ids in _student_batches(batch_size):
+        with transaction.atomic():
+            _lock_students(ids)
+            current = {
+                pk: (remaining, total, spent)
+                for pk, remaining, total, spent in Student.objects.filter(pk__in=ids)
+                .values_list('pk', 'remaining_classes', 'total_classes', 'total_spent')
+            }
+            expected = _ledger_balances(ids, cut)
+            changes = {}
+            for pk, values in current.items():
+                target = expected.get(pk, (0, 0, Decimal('0')))
+                if tuple(values) != tuple(target):
+                    changes[pk] = target
+                    drifted.append((pk, values, target))
+            if changes and not dry_run:
+                def case(index, output_field):
+                    return Case(*[When(pk=pk, then=Value(target[index])) for pk, target in changes.items()],
+                                output_field=output_field)
+
+                Student.objects.filter(pk__in=changes).update(
+                    remaining_classes=case(0, IntegerField()),
+                    total_classes=case(1, IntegerField()),
+                    total_spent=case(2, DecimalField(max_digits=10, decimal_places=2)),
+                )
+    return drifted
+
+
+def take_snapshots(batch_size=1000):
+    """生成一批余额快照（截至当前最大流水ID），返回 (截至流水ID, 快照数)"""
+    upto_id = ClassCreditEntry.objects.aggregate(upto=Max('pk'))['upto'] or 0
+    since_cut = _latest_snapshot_cut()
+    if upto_id <= since_cut:
+        return since_cut, 0
+    snapshots = []
+    for ids in _student_batches(batch_size):
+        with transaction.atomic():
+            # 等待持有这些学员锁的流水写入提交，截至ID之前的流水不会再出现
+            _lock_students(ids)
+            balances = _ledger_balances(ids, since_cut, upto_id)
+        snapshots.extend(
+            ClassCreditSnapshot(student_id=pk, last_entry_id=upto_id, remaining_classes=remaining,
+                                total_classes=total, total_spent=spent)
+            for pk, (remaining, total, spent) in balances.items()
+        )
+    # 一批快照整体写入，重建时不会读到不完整的快照
+    with transaction.atomic():
+        ClassCreditSnapshot.objects.bulk_create(snapshots, batch_size=batch_size)
+    return upto_id, len(snapshots)
@@ -0,0 +1,41 @@
+"""
+学员课时余额重建
+
+按课时流水重算每个学员的剩余课时、总课时和累计消费，只修正有偏差的学员；
+--snapshot 在重建后生成一批余额快照，之后的重建只需汇总快照之后的流水。
+
+    python manage.py rebuild_credit_balances --dry-run
+    python manage.py rebuild_credit_balances --snapshot
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.students.credits import rebuild_balances, take_snapshots
+
+
+class Command(BaseCommand):
+    help = '按课时流水重建学员课时余额'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='只报告偏差，不修正')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批处理的学员数')
+        parser.add_argument('--snapshot', action='store_true', help='重建后生成余额快照')
+        parser.add_argument('--verbose-drift', action='store_true', help='逐条输出偏差明细')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        drifted = rebuild_balances(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        elapsed = time.perf_counter() - started
+        if options['verbose_drift']:
+            for student_id, values, expected in drifted:
+                self.stdout.write(f'学员#{student_id}: 剩余/总课时/消费 {values} → {expected}')
+        action = '发现' if options['dry_run'] else '已修正'
+        self.stdout.write(f'{action}余额偏差学员 {len(drifted)} 人，耗时 {elapsed:.2f}s')
+
+        if options['snapshot'] and not options['dry_run']:
+            started = time.perf_counter()
+            cut, count = take_snapshots(batch_size=options['batch_size'])
+            self.stdout.write(f'生成余额快照 {count} 条，截至流水#{cut}，'
+                              f'耗时 {time.perf_counter() - started:.2f}s')
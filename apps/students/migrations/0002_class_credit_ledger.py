@@ -0,0 +1,57 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0005_cursor_pagination_indexes'),
+        ('attendance', '0003_cursor_pagination_indexes'),
+        ('payment', '0001_initial'),
+        ('students', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassCreditSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_entry_id', models.BigIntegerField(verbose_name='截至流水ID')),
+                ('remaining_classes', models.IntegerField(verbose_name='剩余课时')),
+                ('total_classes', models.IntegerField(verbose_name='总课时')),
+                ('total_spent', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='累计消费')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_snapshots', to='students.student', verbose_name='学员')),
+            ],
+            options={
+                'verbose_name': '课时余额快照',
+                'verbose_name_plural': '课时余额快照',
+                'db_table': 'class_credit_snapshots',
+                'unique_together': {('last_entry_id', 'student')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ClassCreditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('opening', '期初余额'), ('purchase', '购课'), ('consume', '上课消耗'), ('reversal', '消耗冲正'), ('adjust', '人工调整')], max_length=20, verbose_name='类型')),
+                ('classes', models.IntegerField(help_text='增加为正，消耗为负', verbose_name='课时变动')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='金额')),
+                ('notes', models.CharField(blank=True, max_length=200, null=True, verbose_name='备注')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('attendance', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='attendance.attendance', verbose_name='考勤记录')),
+                ('enrollment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='classes.enrollment', verbose_name='报名记录')),
+                ('payment_record', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='payment.paymentrecord', verbose_name='支付记录')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='credit_entries', to='students.student', verbose_name='学员')),
+            ],
+            options={
+                'verbose_name': '课时流水',
+                'verbose_name_plural': '课时流水',
+                'db_table': 'class_credit_entries',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['student', 'id'], name='class_credi_student_97df90_idx')],
+            },
+        ),
+    ]
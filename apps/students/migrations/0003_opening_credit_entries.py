@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_opening_entries(apps, schema_editor):
+    """把已有的课时计数记为期初流水，重建余额时与原值一致"""
+    Student = apps.get_model('students', 'Student')
+    ClassCreditEntry = apps.get_model('students', 'ClassCreditEntry')
+    entries = []
+    rows = (Student.objects.exclude(total_classes=0, remaining_classes=0, total_spent=0)
+            .values_list('pk', 'total_classes', 'remaining_classes', 'total_spent'))
+    for pk, total, remaining, spent in rows.iterator(chunk_size=2000):
+        entries.append(ClassCreditEntry(student_id=pk, entry_type='opening', classes=total,
+                                        amount=spent, notes='期初余额'))
+        if remaining != total:
+            entries.append(ClassCreditEntry(student_id=pk, entry_type='adjust', classes=remaining - total,
+                                            notes='期初已消耗课时'))
+    ClassCreditEntry.objects.bulk_create(entries, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0002_class_credit_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_opening_entries, migrations.RunPython.noop),
+    ]
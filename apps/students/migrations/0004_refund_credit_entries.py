@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0003_opening_credit_entries'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='classcreditentry',
+            name='entry_type',
+            field=models.CharField(choices=[('opening', '期初余额'), ('purchase', '购课'), ('consume', '上课消耗'), ('reversal', '消耗冲正'), ('adjust', '人工调整'), ('refund', '退款扣回')], max_length=20, verbose_name='类型'),
+        ),
+    ]
@@ -40,3 +40,66 @@ class Student(models.Model):
     
     def __str__(self):
         return f"{self.real_name} ({self.student_no})"
+
+
+class ClassCreditEntry(models.Model):
+    """课时流水（只追加）"""
+    
+    ENTRY_TYPE_CHOICES = (
+        ('opening', '期初余额'),
+        ('purchase', '购课'),
+        ('consume', '上课消耗'),
+        ('reversal', '消耗冲正'),
+        ('adjust', '人工调整'),
+        ('refund', '退款扣回'),
+    )
+    
+    student = models.ForeignKey(Student, on_delete=models.PROTECT, related_name='credit_entries',
+                                verbose_name='学员')
+    entry_type = models.CharField('类型', max_length=20, choices=ENTRY_TYPE_CHOICES)
+    classes = models.IntegerField('课时变动', help_text='增加为正，消耗为负')
+    amount = models.DecimalField('金额', max_digits=10, decimal_places=2, default=0)
+    # 考勤记录删除后流水仍保留其ID，用于冲正
+    attendance = models.ForeignKey('attendance.Attendance', on_delete=models.DO_NOTHING, db_constraint=False,
+                                   null=True, blank=True, related_name='+', verbose_name='考勤记录')
+    enrollment = models.ForeignKey('classes.Enrollment', on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='+', verbose_name='报名记录')
+    payment_record = models.ForeignKey('payment.PaymentRecord', on_delete=models.SET_NULL, null=True,
+                                       blank=True, related_name='+', verbose_name='支付记录')
+    notes = models.CharField('备注', max_length=200, null=True, blank=True)
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = '课时流水'
+        verbose_name_plural = verbose_name
+        db_table = 'class_credit_entries'
+        ordering = ['-id']
+        app_label = 'students'
+        indexes = [
+            models.Index(fields=['student', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id} {self.get_entry_type_display()} {self.classes:+d}"
+
+
+class ClassCreditSnapshot(models.Model):
+    """课时余额快照，记录截至某条流水的累计值"""
+    
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='credit_snapshots',
+                                verbose_name='学员')
+    last_entry_id = models.BigIntegerField('截至流水ID')
+    remaining_classes = models.IntegerField('剩余课时')
+    total_classes = models.IntegerField('总课时')
+    total_spent = models.DecimalField('累计消费', max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = '课时余额快照'
+        verbose_name_plural = verbose_name
+        db_table = 'class_credit_snapshots'
+        unique_together = ['last_entry_id', 'student']
+        app_label = 'students'
+    
+    def __str__(self):
+        return f"{self.student_id} @{self.last_entry_id}: {self.remaining_classes}"
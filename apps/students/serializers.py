@@ -1,12 +1,16 @@
 from rest_framework import serializers
 from apps.students.models import Student
 from apps.users.serializers import UserSerializer
+from water_cube_studio.fieldsets import DynamicFieldsMixin
 
 
-class StudentSerializer(serializers.ModelSerializer):
+class StudentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user_info = UserSerializer(source='user', read_only=True)
+    # 指定 fields 时，嵌套的用户信息需通过 ?expand=user_info 显式展开
+    expandable_fields = ('user_info',)
     
     class Meta:
         model = Student
         fields = '__all__'
-        read_only_fields = ['student_no', 'total_spent', 'created_at', 'updated_at']
+        read_only_fields = ['student_no', 'total_classes', 'remaining_classes', 'total_spent',
+                            'created_at', 'updated_at']
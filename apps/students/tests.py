@@ -0,0 +1,105 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.attendance.models import Attendance
+from apps.classes.models import ClassRoom, ClassSchedule, ClassType, Course, DanceType, Enrollment
+from apps.payment.models import PaymentRecord
+from apps.students.credits import credit_purchase, debit_refunds, sync_attendance_credits
+from apps.students.models import ClassCreditEntry, Student
+from apps.teachers.models import Teacher
+from apps.users.models import User
+
+
+class ClassCreditLedgerTests(TestCase):
+    """课时账：上课消耗与冲正、购课与退款扣回的幂等"""
+
+    @classmethod
+    def setUpTestData(cls):
+        dance_type = DanceType.objects.create(name='爵士')
+        class_type = ClassType.objects.create(name='爵士初级', dance_type=dance_type, level='beginner',
+                                              age_range='8-12岁')
+        teacher = Teacher.objects.create(user=User.objects.create(username='teacher'), teacher_no='T001',
+                                         real_name='教师', specialty='爵士', join_date=date(2020, 1, 1))
+        classroom = ClassRoom.objects.create(name='1号教室', capacity=20, location='一楼')
+        cls.course = Course.objects.create(class_type=class_type, name='爵士初级1班', term='第1期',
+                                           teacher=teacher, start_date=date(2026, 9, 1),
+                                           end_date=date(2026, 12, 31), total_sessions=2)
+        start_time = timezone.make_aware(datetime(2026, 9, 7, 19, 0))
+        cls.schedules = [
+            ClassSchedule.objects.create(course=cls.course, session_no=n, classroom=classroom, teacher=teacher,
+                                         start_time=start_time + timedelta(days=7 * n),
+                                         end_time=start_time + timedelta(days=7 * n, hours=1))
+            for n in (1, 2)
+        ]
+
+    def setUp(self):
+        self.student = Student.objects.create(user=User.objects.create(username='student'), student_no='S001',
+                                              real_name='学员')
+        self.record = PaymentRecord.objects.create(student=self.student, amount=Decimal('200.00'),
+                                                   payment_method='alipay_web', status='paid')
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course, status='paid',
+                                                    amount=Decimal('200.00'), payment_record=self.record)
+
+    def _balance(self):
+        self.student.refresh_from_db()
+        return self.student.remaining_classes, self.student.total_classes, self.student.total_spent
+
+    def _consumed(self, attendance_id):
+        return sum(ClassCreditEntry.objects.filter(attendance_id=attendance_id).values_list('classes', flat=True))
+
+    def test_purchase_is_credited_once(self):
+        self.assertIsNotNone(credit_purchase(self.enrollment, self.record))
+        self.assertIsNone(credit_purchase(self.enrollment, self.record))
+        self.assertEqual(self._balance(), (2, 2, Decimal('200.00')))
+
+    def test_consume_and_reverse_are_idempotent(self):
+        credit_purchase(self.enrollment, self.record)
+        attendance = Attendance.objects.create(schedule=self.schedules[0], student=self.student, status='present')
+        self.assertEqual(sync_attendance_credits([attendance.pk]), 0)
+        self.assertEqual(self._balance()[0], 1)
+
+        for status in ('late', 'absent', 'leave', 'present', 'absent'):
+            attendance.status = status
+            attendance.save()
+            # 重复处理同一考勤不再记流水
+            self.assertEqual(sync_attendance_credits([attendance.pk]), 0)
+            expected = 1 if status in ('present', 'late') else 2
+            self.assertEqual(self._balance()[0], expected)
+            self.assertEqual(self._consumed(attendance.pk), expected - 2)
+
+    def test_reversal_never_credits_beyond_consumption(self):
+        credit_purchase(self.enrollment, self.record)
+        attendance = Attendance.objects.create(schedule=self.schedules[0], student=self.student, status='absent')
+        attendance.status = 'leave'
+        attendance.save()
+        attendance_id = attendance.pk
+        attendance.delete()
+        sync_attendance_credits([attendance_id])
+        self.assertFalse(ClassCreditEntry.objects.filter(attendance_id=attendance_id).exists())
+        self.assertEqual(self._balance()[0], 2)
+
+    def test_deleted_attendance_is_reversed_once(self):
+        credit_purchase(self.enrollment, self.record)
+        attendance = Attendance.objects.create(schedule=self.schedules[0], student=self.student, status='present')
+        attendance_id = attendance.pk
+        attendance.delete()
+        self.assertEqual(sync_attendance_credits([attendance_id]), 0)
+        self.assertEqual(self._consumed(attendance_id), 0)
+        self.assertEqual(self._balance()[0], 2)
+
+    def test_balance_never_goes_negative_on_repeated_consumption(self):
+        credit_purchase(self.enrollment, self.record)
+        attendances = [Attendance.objects.create(schedule=schedule, student=self.student, status='present')
+                       for schedule in self.schedules]
+        for _ in range(3):
+            sync_attendance_credits([attendance.pk for attendance in attendances])
+        self.assertEqual(self._balance()[0], 0)
+
+    def test_refund_is_debited_once(self):
+        credit_purchase(self.enrollment, self.record)
+        self.assertEqual(debit_refunds([self.record.pk]), 1)
+        self.assertEqual(debit_refunds([self.record.pk]), 0)
+        self.assertEqual(self._balance(), (0, 0, Decimal('0.00')))
@@ -1,10 +1,11 @@
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from apps.students.models import Student
+from water_cube_studio.fieldsets import SparseFieldsMixin
 from .serializers import StudentSerializer
 
 
-class StudentViewSet(viewsets.ModelViewSet):
+class StudentViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """学员视图集"""
     queryset = Student.objects.select_related('user').all()
     serializer_class = StudentSerializer
@@ -0,0 +1,132 @@
+"""
+稀疏字段集
+
+列表/详情接口支持 ?fields=id,name 只返回指定字段，?expand=user_info 展开序列化器
+expandable_fields 中声明的嵌套对象；未指定 fields 时输出与原来一致。
+
+列表请求的字段全部是平铺字段（模型列、外键ID、经外键取到的列如 course.name）时，
+直接从 queryset.values() 取行并用对应序列化器字段的 to_representation 转换，
+不构建模型实例，输出格式与完整序列化一致。
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PKOnlyObject, RelatedField
+from rest_framework.response import Response
+
+
+def parse_fields(value):
+    """解析逗号分隔的字段列表，空值返回None"""
+    if not value:
+        return None
+    return [item.strip() for item in value.split(',') if item.strip()] or None
+
+
+class DynamicFieldsMixin:
+    """序列化器：按 fields / expand 参数裁剪输出字段"""
+    expandable_fields = ()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested_fields = fields
+        if fields is None:
+            return
+        allowed = set(fields) | (set(expand or ()) & set(self.expandable_fields))
+        for name in list(self.fields):
+            if name not in allowed:
+                self.fields.pop(name)
+
+
+def _column_lookup(model, source):
+    """把 source（如 course.name）解析为 values() 查找路径，不是平铺列时返回None"""
+    parts = source.split('.')
+    for index, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        if index < len(parts) - 1:
+            if not (field.is_relation and field.concrete and (field.many_to_one or field.one_to_one)):
+                return None
+            model = field.related_model
+        elif field.is_relation or not field.concrete or isinstance(field, models.FileField):
+            return None
+    return '__'.join(parts)
+
+
+def flat_lookups(serializer):
+    """
+    序列化器字段全部可由 values() 取得时返回 [(字段名, 查找路径, 是否外键)]，否则返回None
+
+    方法字段、嵌套序列化器、属性、多对多和文件字段都不算平铺字段。
+    """
+    model = serializer.Meta.model
+    lookups = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, (serializers.BaseSerializer, ManyRelatedField)) or field.source == '*':
+            return None
+        if isinstance(field, RelatedField):
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if not (model_field.concrete and (model_field.many_to_one or model_field.one_to_one)):
+                return None
+            lookups.append((name, model_field.attname, True))
+            continue
+        lookup = _column_lookup(model, field.source)
+        if lookup is None:
+            return None
+        lookups.append((name, lookup, False))
+    return lookups
+
+
+def serialize_rows(serializer, rows, lookups):
+    """把 values() 行转换为与序列化器一致的输出"""
+    converters = [
+        (name, lookup, is_pk, serializer.fields[name].to_representation)
+        for name, lookup, is_pk in lookups
+    ]
+    data = []
+    for row in rows:
+        item = {}
+        for name, lookup, is_pk, to_representation in converters:
+            value = row[lookup]
+            if value is None:
+                item[name] = None
+            elif is_pk:
+                item[name] = to_representation(PKOnlyObject(pk=value))
+            else:
+                item[name] = to_representation(value)
+        data.append(item)
+    return data
+
+
+class SparseFieldsMixin:
+    """视图集：透传 fields / expand 参数，列表只请求平铺字段时走 values() 快速路径"""
+
+    def get_serializer(self, *args, **kwargs):
+        request = getattr(self, 'request', None)
+        if request is not None and request.method == 'GET':
+            kwargs.setdefault('fields', parse_fields(request.query_params.get('fields')))
+            kwargs.setdefault('expand', parse_fields(request.query_params.get('expand')))
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        lookups = flat_lookups(serializer) if getattr(serializer, 'requested_fields', None) else None
+        if not lookups:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        columns = {lookup for _, lookup, _ in lookups}
+        # 游标分页需要从行里读取排序字段
+        columns.update(name.lstrip('-') for name in getattr(self, 'cursor_ordering', ()))
+        rows = queryset.values(*columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serialize_rows(serializer, page, lookups))
+        return Response(serialize_rows(serializer, rows, lookups))
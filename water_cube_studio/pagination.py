@@ -0,0 +1,43 @@
+"""
+API分页
+
+默认沿用页码分页；请求带 cursor 参数或 pagination=cursor 时改用游标（keyset）分页：
+按视图的 cursor_ordering 字段定位上一页的末尾，以 WHERE 条件代替 OFFSET 扫描，
+也不再执行 COUNT(*)，深翻页的耗时不随数据量增长。
+"""
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+    """游标分页，排序取视图的 cursor_ordering（需有对应的组合索引）"""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None) or self.ordering
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+
+
+class HybridPagination(PageNumberPagination):
+    """页码分页，按请求参数切换到游标分页"""
+    cursor_class = KeysetPagination
+
+    def __init__(self):
+        self._cursor = None
+
+    def use_cursor(self, request):
+        return (self.cursor_class.cursor_query_param in request.query_params
+                or request.query_params.get('pagination') == 'cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self._cursor = self.cursor_class()
+            return self._cursor.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self._cursor is not None:
+            return self._cursor.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -205,6 +205,88 @@ else:
     # 使用数据库存储Session
     SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 
+# 站点地址 - 用于邮件等站外通知中的链接
+SITE_URL = config('SITE_URL', default='http://localhost:8000')
+
+# 报名名额保留 - 待支付报名占位的有效期（分钟），过期由 release_seat_holds 释放
+SEAT_HOLD_TTL_MINUTES = config('SEAT_HOLD_TTL_MINUTES', default=30, cast=int)
+
+# 自动排课 - 每周可排课的时段（0表示周一），供 solve_timetable 使用
+TIMETABLE_SLOTS = {
+    0: ['18:00', '19:30'],
+    1: ['18:00', '19:30'],
+    2: ['18:00', '19:30'],
+    3: ['18:00', '19:30'],
+    4: ['18:00', '19:30'],
+    5: ['09:00', '10:30', '14:00', '15:30', '17:00', '18:30'],
+    6: ['09:00', '10:30', '14:00', '15:30', '17:00', '18:30'],
+}
+# 在线自动排课接口的求解时限（秒）与课节数上限，超过上限的期次使用 solve_timetable 命令
+TIMETABLE_API_TIME_LIMIT = config('TIMETABLE_API_TIME_LIMIT', default=10, cast=float)
+TIMETABLE_API_MAX_MEETINGS = config('TIMETABLE_API_MAX_MEETINGS', default=200, cast=int)
+
+# 补课匹配 - 进程内课次占用索引的缓存时间（秒）
+MAKEUP_INDEX_TTL = config('MAKEUP_INDEX_TTL', default=300, cast=int)
+
+# 扫码签到 - 签到先写入缓冲（USE_REDIS 时为Redis列表，否则为进程内队列），由 flush_checkins 批量落库
+CHECKIN_BATCH_SIZE = config('CHECKIN_BATCH_SIZE', default=500, cast=int)
+CHECKIN_FLUSH_INTERVAL = config('CHECKIN_FLUSH_INTERVAL', default=1.0, cast=float)
+# 开课后超过该分钟数签到记为迟到
+CHECKIN_LATE_MINUTES = config('CHECKIN_LATE_MINUTES', default=10, cast=int)
+
+# 留存分析 - 分析结果的缓存时间（秒），可由 compute_analytics 定时预热
+ANALYTICS_CACHE_TTL = config('ANALYTICS_CACHE_TTL', default=3600, cast=int)
+
+# 支付通知 - 验签入表后即应答网关，落账在进程内线程池异步执行，失败由 process_payment_notifications 按指数退避重试
+PAYMENT_NOTIFY_WORKERS = config('PAYMENT_NOTIFY_WORKERS', default=4, cast=int)
+PAYMENT_NOTIFY_MAX_ATTEMPTS = config('PAYMENT_NOTIFY_MAX_ATTEMPTS', default=8, cast=int)
+# 首次重试间隔（秒），之后逐次翻倍
+PAYMENT_NOTIFY_RETRY_BASE = config('PAYMENT_NOTIFY_RETRY_BASE', default=30, cast=int)
+# 已接收通知在缓存中的去重时间（秒）
+PAYMENT_NOTIFY_DEDUPE_TTL = config('PAYMENT_NOTIFY_DEDUPE_TTL', default=86400, cast=int)
+
+# 订单号生成 - Snowflake 机器号（0-1023），仅单进程运行时直接指定；开启Redis时从Redis领取租约（租期秒数）；
+# 否则为 主机号（0-31，每台主机/容器不同）× 32 + 本机进程槽位，槽位以锁目录下的文件锁领取。
+# 均未配置时拒绝生成订单号；DEBUG（单机开发）时主机号默认为0
+ORDER_NO_WORKER_ID = config('ORDER_NO_WORKER_ID', default=None,
+                            cast=lambda value: int(value) if value not in (None, '') else None)
+ORDER_NO_HOST_ID = config('ORDER_NO_HOST_ID', default=0 if DEBUG else None,
+                          cast=lambda value: int(value) if value not in (None, '') else None)
+ORDER_NO_LOCK_DIR = config('ORDER_NO_LOCK_DIR', default='')
+ORDER_NO_WORKER_LEASE = config('ORDER_NO_WORKER_LEASE', default=60, cast=int)
+
+# 待支付订单清理 - 超过有效期（分钟）的待支付订单向网关查询状态，已支付的补落账，已关闭的置为过期；
+# 超过最长等待时间（小时）的直接置为过期，不再查询
+PAYMENT_ORDER_TTL_MINUTES = config('PAYMENT_ORDER_TTL_MINUTES', default=30, cast=int)
+PAYMENT_ORDER_EXPIRE_HOURS = config('PAYMENT_ORDER_EXPIRE_HOURS', default=24, cast=int)
+# 支付网关查询 - 每个网关的请求频率上限（次/秒）、连接池大小与超时（秒）；STUB 为本地桩客户端，不发网络请求
+PAYMENT_GATEWAY_QPS = config('PAYMENT_GATEWAY_QPS', default=20, cast=float)
+PAYMENT_GATEWAY_POOL_SIZE = config('PAYMENT_GATEWAY_POOL_SIZE', default=10, cast=int)
+PAYMENT_GATEWAY_TIMEOUT = config('PAYMENT_GATEWAY_TIMEOUT', default=5, cast=float)
+PAYMENT_GATEWAY_STUB = config('PAYMENT_GATEWAY_STUB', default=False, cast=bool)
+# 支付网关配置 - 进程内缓存的配置与密钥跨进程失效的检查间隔（秒，每次读一次配置表指纹）
+PAYMENT_GATEWAY_CONFIG_CHECK_INTERVAL = config('PAYMENT_GATEWAY_CONFIG_CHECK_INTERVAL', default=5, cast=float)
+
+# 支付状态推送 - 长轮询最长等待（秒）；SSE 连接最长保持时间（秒，需小于反向代理读超时）、心跳间隔（秒）
+# 与断线重连间隔（毫秒）
+PAYMENT_STATUS_WAIT = config('PAYMENT_STATUS_WAIT', default=25, cast=float)
+PAYMENT_STATUS_STREAM_SECONDS = config('PAYMENT_STATUS_STREAM_SECONDS', default=55, cast=float)
+PAYMENT_STATUS_HEARTBEAT = config('PAYMENT_STATUS_HEARTBEAT', default=15, cast=float)
+PAYMENT_STATUS_RETRY_MS = config('PAYMENT_STATUS_RETRY_MS', default=3000, cast=int)
+# 支付状态推送 - 等待期间读库复查间隔（秒）；未开启 Redis 时其他 worker 的变更只能靠复查发现，默认缩短
+PAYMENT_STATUS_RECHECK = config('PAYMENT_STATUS_RECHECK', default=15 if USE_REDIS else 3, cast=float)
+
+# 批量退款 - 网关提交并发线程数、最多提交次数、首次重试间隔（秒，之后逐次翻倍）；
+# 提交中超过该分钟数仍未落账的申请（进程中途退出）重新认领
+REFUND_WORKERS = config('REFUND_WORKERS', default=8, cast=int)
+REFUND_MAX_ATTEMPTS = config('REFUND_MAX_ATTEMPTS', default=5, cast=int)
+REFUND_RETRY_BASE = config('REFUND_RETRY_BASE', default=60, cast=int)
+REFUND_SUBMIT_TIMEOUT_MINUTES = config('REFUND_SUBMIT_TIMEOUT_MINUTES', default=10, cast=int)
+
+# 报价引擎 - 多课程折扣（课程数:折扣，逗号分隔），规则表跨进程失效的检查间隔（秒，每次读一次策略表指纹）
+PRICING_MULTI_COURSE_DISCOUNTS = config('PRICING_MULTI_COURSE_DISCOUNTS', default='2:0.95,3:0.90')
+PRICING_RULES_CHECK_INTERVAL = config('PRICING_RULES_CHECK_INTERVAL', default=5, cast=float)
+
 # CKEditor
 CKEDITOR_UPLOAD_PATH = 'uploads/'
 CKEDITOR_CONFIGS = {
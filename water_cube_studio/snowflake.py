@@ -0,0 +1,238 @@
+"""
+订单号生成（Snowflake）
+
+64位ID = 41位毫秒时间戳（自 2024-01-01 起） | 10位机器号 | 12位毫秒内序号，
+进程内生成，不访问数据库；同一进程内严格递增，不同进程按时间大致有序。
+订单号为 前缀 + 19位定长十进制ID，字典序即数值序，写入唯一索引时总是追加在B树右端。
+
+机器号按以下顺序确定（每个进程一次，fork 后的子进程重新确定）：
+1. ORDER_NO_WORKER_ID 配置（仅用于单进程运行，多个进程共用会生成重复ID）；
+2. USE_REDIS 时在 Redis 中领取租约：从计数器给出的位置起逐个以 SET NX EX 探测空闲机器号，
+   后台线程每 1/3 租期续期，进程退出时释放，进程被强杀时租约到期自动回收（最多1024个同时存活的进程）。
+   租约过期且机器号已被其他进程领取、或超过租期未能续期（Redis 不可用）时，下次生成前重新领取；
+3. ORDER_NO_HOST_ID 配置：机器号 = 主机号（0-31）× 32 + 本机进程槽位（0-31）。槽位以
+   ORDER_NO_LOCK_DIR 下的文件锁领取，进程退出时自动释放；每台主机（容器）的主机号须各不相同；
+4. 均未配置时拒绝生成（系统检查 snowflake.E001 报错）；DEBUG 环境下 ORDER_NO_HOST_ID 默认为0。
+
+时钟回拨时沿用上次的时间戳继续分配序号，序号用尽时借用下一毫秒，不会生成重复或倒序的ID。
+"""
+
+import atexit
+import fcntl
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+EPOCH_MS = 1704067200000  # 2024-01-01 00:00:00 UTC
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+REDIS_WORKER_KEY = 'snowflake:worker'
+SLOT_BITS = 5
+MAX_HOST_ID = (1 << (WORKER_BITS - SLOT_BITS)) - 1
+MAX_SLOT = (1 << SLOT_BITS) - 1
+
+# 本进程持有的槽位锁文件（保持打开即保持占用）
+_slot_files = []
+
+# 租约仍由本进程持有时续期 / 删除
+_EXTEND_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class WorkerLease:
+    """Redis 中的机器号租约"""
+
+    def __init__(self, redis, ttl):
+        self.redis = redis
+        self.ttl = ttl
+        self.pid = os.getpid()
+        self.token = f'{socket.gethostname()}:{self.pid}:{uuid.uuid4().hex}'
+        self._extend = redis.register_script(_EXTEND_SCRIPT)
+        self._release = redis.register_script(_RELEASE_SCRIPT)
+        self._stopped = threading.Event()
+        self.lost = False
+        self.worker_id = self._acquire()
+        self.key = self._key(self.worker_id)
+        self.renewed_at = time.monotonic()
+        threading.Thread(target=self._renew, name='snowflake-lease', daemon=True).start()
+        atexit.register(self.release)
+
+    @staticmethod
+    def _key(worker_id):
+        return f'{REDIS_WORKER_KEY}:{worker_id}'
+
+    def _acquire(self):
+        # 从计数器给出的位置起探测，同时启动的进程不会都从0号开始争抢
+        start = self.redis.incr(REDIS_WORKER_KEY)
+        for offset in range(MAX_WORKER_ID + 1):
+            worker_id = (start + offset) & MAX_WORKER_ID
+            if self.redis.set(self._key(worker_id), self.token, nx=True, ex=self.ttl):
+                return worker_id
+        raise ImproperlyConfigured(f'同时生成订单号的进程超过 {MAX_WORKER_ID + 1} 个')
+
+    @property
+    def valid(self):
+        """租约仍可使用：未被其他进程领取，且距上次续期成功未超过租期"""
+        return not self.lost and time.monotonic() - self.renewed_at < self.ttl
+
+    def renew(self):
+        """续期一次，租约已过期时重新占用原机器号；返回是否仍持有"""
+        if self._extend(keys=[self.key], args=[self.token, self.ttl]) \
+                or self.redis.set(self.key, self.token, nx=True, ex=self.ttl):
+            self.renewed_at = time.monotonic()
+            return True
+        self.lost = True
+        logger.error(f'订单号机器号 {self.worker_id} 的租约已被其他进程领取，重新领取')
+        return False
+
+    def _renew(self):
+        while not self._stopped.wait(self.ttl / 3):
+            try:
+                if not self.renew():
+                    return
+            except Exception as e:
+                # 超过租期仍未续期成功时 valid 为假，生成前重新领取
+                logger.warning(f'订单号机器号租约续期失败: {e}')
+
+    def release(self):
+        """停止续期并释放租约（fork 出的子进程不释放父进程的租约）"""
+        self._stopped.set()
+        if self.pid != os.getpid() or self.lost:
+            return
+        self.lost = True
+        try:
+            self._release(keys=[self.key], args=[self.token])
+        except Exception as e:
+            logger.warning(f'订单号机器号租约释放失败: {e}')
+
+
+def _host_id():
+    """配置的主机号，未配置时返回None"""
+    configured = getattr(settings, 'ORDER_NO_HOST_ID', None)
+    return None if configured is None else int(configured) & MAX_HOST_ID
+
+
+def _claim_slot(host_id):
+    """以非阻塞文件锁领取本机空闲的进程槽位"""
+    directory = getattr(settings, 'ORDER_NO_LOCK_DIR', None) or tempfile.gettempdir()
+    for slot in range(MAX_SLOT + 1):
+        handle = open(os.path.join(directory, f'snowflake-{host_id}-{slot}.lock'), 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # 其他进程（含 fork 前的父进程）持有
+            handle.close()
+            continue
+        _slot_files.append(handle)
+        return slot
+    raise ImproperlyConfigured(f'本机生成订单号的进程超过 {MAX_SLOT + 1} 个')
+
+
+def _resolve_worker_id():
+    """返回 (机器号, Redis 租约或None)"""
+    configured = getattr(settings, 'ORDER_NO_WORKER_ID', None)
+    if configured is not None:
+        return int(configured) & MAX_WORKER_ID, None
+    if settings.USE_REDIS:
+        from django_redis import get_redis_connection
+        lease = WorkerLease(get_redis_connection('default'), settings.ORDER_NO_WORKER_LEASE)
+        return lease.worker_id, lease
+    host_id = _host_id()
+    if host_id is None:
+        raise ImproperlyConfigured('订单号机器号未配置：请开启 USE_REDIS，或为每台主机设置不同的 ORDER_NO_HOST_ID')
+    return (host_id << SLOT_BITS) | _claim_slot(host_id), None
+
+
+@checks.register()
+def check_worker_id(app_configs, **kwargs):
+    """多主机部署时机器号来源必须配置"""
+    if (getattr(settings, 'ORDER_NO_WORKER_ID', None) is not None or settings.USE_REDIS
+            or _host_id() is not None):
+        return []
+    return [checks.Error(
+        '未配置订单号机器号，多台主机会生成重复的订单号',
+        hint='开启 USE_REDIS，或为每台主机（容器）设置不同的 ORDER_NO_HOST_ID（0-31）',
+        id='snowflake.E001',
+    )]
+
+
+class SnowflakeGenerator:
+    """进程内 Snowflake ID 生成器（线程安全）"""
+
+    def __init__(self, worker_id=None):
+        self._lock = threading.Lock()
+        self._fixed_worker_id = worker_id
+        self._pid = None
+        self._lease = None
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _reset(self):
+        # 领取失败时下次生成重新领取，不沿用旧机器号
+        self._pid = None
+        if self._lease is not None:
+            self._lease.release()
+            self._lease = None
+        if self._fixed_worker_id is None:
+            self.worker_id, self._lease = _resolve_worker_id()
+        else:
+            self.worker_id = self._fixed_worker_id & MAX_WORKER_ID
+        self._pid = os.getpid()
+
+    def next_id(self):
+        with self._lock:
+            if self._pid != os.getpid() or (self._lease is not None and not self._lease.valid):
+                self._reset()
+            now = time.time_ns() // 1000000 - EPOCH_MS
+            if now > self._last_ms:
+                self._last_ms, self._sequence = now, 0
+            else:
+                # 同一毫秒或时钟回拨：沿用上次时间戳，序号用尽时借用下一毫秒
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    self._last_ms += 1
+            return (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) \
+                | self._sequence
+
+
+_generator = SnowflakeGenerator()
+
+
+def next_id():
+    """生成一个ID"""
+    return _generator.next_id()
+
+
+def next_order_no(prefix=''):
+    """生成订单号：前缀 + 19位定长ID"""
+    return f'{prefix}{_generator.next_id():019d}'
+
+
+def parse_id(value):
+    """拆解ID，返回 (生成时间毫秒时间戳, 机器号, 序号)"""
+    value = int(value)
+    return ((value >> (WORKER_BITS + SEQUENCE_BITS)) + EPOCH_MS,
+            (value >> SEQUENCE_BITS) & MAX_WORKER_ID,
+            value & MAX_SEQUENCE)